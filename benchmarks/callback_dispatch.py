@@ -0,0 +1,220 @@
+"""
+Микробенчмарк выбора обработчика для callback-запросов.
+
+Сравнивает прежнюю схему (семь CallbackQueryHandler с пересекающимися
+регулярными выражениями и цепочки if/elif со split("_") внутри
+обработчиков) с табличным маршрутизатором handlers/callback_router.
+Замеряется только путь от апдейта до найденного обработчика
+с разобранными аргументами: сами обработчики не вызываются.
+
+Запуск:
+    python -m benchmarks.callback_dispatch
+    python -m benchmarks.callback_dispatch --calls 200000 --output result.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'poetry_bot_bench')
+
+# Окружение для config.py должно быть готово до импорта обработчиков
+os.makedirs(BENCH_DIR, exist_ok=True)
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('LOG_FILE', os.path.join(BENCH_DIR, 'bench.log'))
+os.environ['DB_NAME'] = os.path.join(BENCH_DIR, 'dispatch.db')
+
+from telegram import CallbackQuery, Update, User  # noqa: E402
+from telegram.ext import CallbackQueryHandler, CommandHandler  # noqa: E402
+
+from handlers.callback_router import callback_router  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Доли кнопок в потоке вечера: пользователи в меню и подаче заявок,
+# админ листает и модерирует заявки. Каждая запись — одно действие:
+# кнопка в прежней схеме, кнопка в текущей и доля. Листание очереди
+# (nav_) заменили карточка заявки (card_) и пропуск (skip_), удаление
+# всех заявок — закрытие вечера, а страница черного списка несет
+# еще и ID на своей границе
+CALLBACK_MIX = (
+    ('main_menu', 'main_menu', 10), ('apply', 'apply', 8), ('rules', 'rules', 6), ('about', 'about', 4),
+    ('second_block_yes', 'second_block_yes', 4), ('second_block_no', 'second_block_no', 4),
+    ('cancel_application', 'cancel_application', 2),
+    ('nav_{0}', 'card_{0}_0', 12), ('nav_{0}', 'skip_{0}', 8), ('approve_{0}', 'approve_{0}', 10),
+    ('reject_{0}', 'reject_{0}', 8),
+    ('admin_menu', 'admin_menu', 5), ('admin_pending_applications', 'admin_pending_applications', 5),
+    ('admin_blacklist', 'admin_blacklist', 2), ('blacklist_view', 'blacklist_view', 2),
+    ('blacklist_page_{0}', 'blacklist_page_{0}_{0}', 2), ('admin_rules', 'admin_rules', 1),
+    ('confirm_delete_all', 'confirm_close_event', 1), ('noop', 'noop', 1),
+)
+
+
+async def _dummy(update, context):
+    pass
+
+
+def legacy_handlers() -> list:
+    """Обработчики группы 0 в прежнем порядке регистрации main.setup_handlers"""
+    return [
+        CommandHandler('start', _dummy),
+        CallbackQueryHandler(_dummy, pattern="^(main_menu|apply|about|rules|admin_menu)$"),
+        CallbackQueryHandler(_dummy, pattern="^(second_block_yes|second_block_no|cancel_application)$"),
+        CallbackQueryHandler(_dummy, pattern="^admin_"),
+        CallbackQueryHandler(_dummy, pattern="^(approve_|reject_|nav_)"),
+        CallbackQueryHandler(_dummy, pattern="^(blacklist_add|blacklist_remove|blacklist_view)$"),
+        CallbackQueryHandler(_dummy, pattern="^(nav_|approve_|reject_|confirm_delete_all)$"),
+        CallbackQueryHandler(_dummy, pattern="^(admin_rules|admin_about|cancel_edit)$"),
+    ]
+
+
+def legacy_parse(handler_index: int, callback_data: str):
+    """Прежний разбор внутри обработчиков: цепочки if/elif и split("_")"""
+    if handler_index == 1:
+        for name in ('main_menu', 'apply', 'about', 'rules', 'admin_menu'):
+            if callback_data == name:
+                return name, ()
+    elif handler_index == 2:
+        return callback_data, ()
+    elif handler_index in (3, 4, 5, 6):
+        if callback_data.startswith("nav_"):
+            return 'nav', (int(callback_data.split("_")[1]),)
+        elif callback_data.startswith("blacklist_page_"):
+            return 'blacklist_page', (int(callback_data.split("_")[2]),)
+        elif callback_data.startswith("approve_"):
+            return 'approve', (int(callback_data.split("_")[1]),)
+        elif callback_data.startswith("reject_"):
+            return 'reject', (int(callback_data.split("_")[1]),)
+        for name in (
+            'confirm_delete_all', 'cancel_delete_all', 'admin_menu', 'admin_pending_applications',
+            'admin_approved_poems', 'admin_second_block', 'admin_delete_all', 'admin_blacklist',
+            'admin_broadcast',
+        ):
+            if callback_data == name:
+                return name, ()
+        if callback_data in ["blacklist_add", "blacklist_remove", "blacklist_view"]:
+            return callback_data, ()
+        if callback_data in ["admin_rules", "admin_about"]:
+            return callback_data, ()
+        if callback_data == "noop":
+            return callback_data, ()
+    elif handler_index == 7:
+        return callback_data, ()
+    return None
+
+
+def legacy_dispatch(handlers: list, update: Update):
+    """Поиск обработчика так же, как Application.process_update, плюс разбор"""
+    for index, handler in enumerate(handlers):
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return legacy_parse(index, update.callback_query.data)
+    return None
+
+
+def router_dispatch(handlers: list, update: Update):
+    """Новая схема: один CallbackQueryHandler и поиск в таблице"""
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return callback_router.resolve(update.callback_query.data)
+    return None
+
+
+def make_updates(calls: int, seed: int = 42):
+    """Потоки callback-апдейтов по долям CALLBACK_MIX: для прежней и для текущей схемы"""
+    rng = random.Random(seed)
+    actions = [(legacy, current) for legacy, current, _ in CALLBACK_MIX]
+    weights = [weight for _, _, weight in CALLBACK_MIX]
+    user = User(id=1, first_name='Админ', is_bot=False)
+
+    def update(update_id: int, data: str) -> Update:
+        query = CallbackQuery(id=str(update_id), from_user=user, chat_instance='bench', data=data)
+        return Update(update_id, callback_query=query)
+
+    legacy_updates, current_updates = [], []
+    for update_id, (legacy, current) in enumerate(rng.choices(actions, weights, k=calls)):
+        number = rng.randint(0, 5000)
+        legacy_updates.append(update(update_id, legacy.format(number)))
+        current_updates.append(update(update_id, current.format(number)))
+    return legacy_updates, current_updates
+
+
+def _timed(dispatch, handlers: list, updates: list, repeat: int) -> dict:
+    """Время на один callback в микросекундах, медиана по повторам"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for update in updates:
+            dispatch(handlers, update)
+        samples.append((time.perf_counter() - started) * 1_000_000 / len(updates))
+    return {
+        'calls': len(updates),
+        'repeat': repeat,
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+    }
+
+
+def check_equivalence(legacy_updates: list, current_updates: list) -> list:
+    """
+    Кнопки текущей схемы, которые маршрутизатор не находит или разбирает
+    не так, как прежняя схема то же действие. Кнопки, которые прежняя
+    схема не находила (noop), сравниваются только по наличию маршрута.
+    """
+    legacy, routed = legacy_handlers(), [CommandHandler('start', _dummy), CallbackQueryHandler(_dummy)]
+    mismatches = set()
+    for old_update, new_update in zip(legacy_updates, current_updates):
+        old = legacy_dispatch(legacy, old_update)
+        new = router_dispatch(routed, new_update)
+        if new is None or (old is not None and new[1][:len(old[1])] != old[1]):
+            mismatches.add(new_update.callback_query.data.rstrip('0123456789_'))
+    return sorted(mismatches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк выбора обработчика callback-запросов')
+    parser.add_argument('--calls', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='файл для JSON-результата (по умолчанию stdout)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    legacy_updates, current_updates = make_updates(args.calls)
+
+    legacy = _timed(legacy_dispatch, legacy_handlers(), legacy_updates, args.repeat)
+    routed = _timed(
+        router_dispatch, [CommandHandler('start', _dummy), CallbackQueryHandler(_dummy)], current_updates, args.repeat
+    )
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': {
+            'legacy': legacy,
+            'router': routed,
+            'speedup': round(legacy['median_us'] / routed['median_us'], 2),
+        },
+        # Должно быть пусто: иначе замеряются промахи маршрутизации
+        'differences': check_equivalence(legacy_updates[:5000], current_updates[:5000]),
+    }
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Проверка конкурентной обработки апдейтов на перемешанном потоке.
+
+Генерирует флоу подачи заявки для многих пользователей (/start → apply →
+текст стихотворения → выбор второго блока) и сценарий админа (добавление
+в черный список), перемешивает их между собой с сохранением порядка внутри
+каждого пользователя и прогоняет через полный стек обработчиков с фейковым
+Bot API. Проверяет, что порядок апдейтов каждого пользователя сохранен,
+каждая заявка создана со своим текстом и выбором, а состояние админа
+отработало, и что выгрузка user_data в базу не теряет данные при повторном
+вытеснении. Печатает время при последовательной и конкурентной обработке.
+
+Запуск:
+    python -m benchmarks.concurrency_check --users 200 --concurrency 16 --api-latency 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+# Проверяется порядок обработки, а не темп отправки: лимиты фейкового API сняты
+os.environ.setdefault('OUTBOUND_GLOBAL_RATE', '0')
+os.environ.setdefault('OUTBOUND_CHAT_INTERVAL', '0')
+
+from benchmarks.replay import REPLAY_DIR, ReplayRequest  # noqa: E402 — готовит окружение
+
+# Проверка очищает таблицы: только своя временная база, не DB_NAME из .env
+os.environ['DB_NAME'] = os.path.join(REPLAY_DIR, 'concurrency.db')
+
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+from config import ADMIN_ID, DB_NAME  # noqa: E402
+
+BASE_USER_ID = 5_000_000
+
+
+def _message(update_id: int, user_id: int, text: str, message_id: int) -> dict:
+    message = {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'Имя{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def _callback(update_id: int, user_id: int, data: str, message_id: int) -> dict:
+    return {'update_id': update_id, 'callback_query': {
+        'id': f'{update_id}',
+        'chat_instance': 'check',
+        'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'Имя{user_id}'},
+        'message': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'text': '…',
+        },
+    }}
+
+
+def build_stream(users: int, seed: int = 1):
+    """Перемешанный поток апдейтов; порядок внутри пользователя сохраняется"""
+    rng = random.Random(seed)
+    flows = {}
+    for n in range(users):
+        user_id = BASE_USER_ID + n
+        choice = rng.choice(('second_block_yes', 'second_block_no'))
+        flows[user_id] = [
+            ('message', '/start'),
+            ('callback', 'apply'),
+            ('message', f'Стихотворение пользователя {user_id}: ветер над морем'),
+            ('callback', choice),
+        ]
+    # Отдельный пользователь без флоу: бан не должен мешать проверке заявок
+    banned_user = BASE_USER_ID - 1
+    flows[ADMIN_ID] = [
+        ('callback', 'admin_blacklist'),
+        ('callback', 'blacklist_add'),
+        ('message', str(banned_user)),
+    ]
+
+    stream = []
+    positions = {user_id: 0 for user_id in flows}
+    while positions:
+        user_id = rng.choice(list(positions))
+        kind, payload = flows[user_id][positions[user_id]]
+        update_id = len(stream) + 1
+        if kind == 'message':
+            stream.append(_message(update_id, user_id, payload, update_id))
+        else:
+            stream.append(_callback(update_id, user_id, payload, update_id))
+        positions[user_id] += 1
+        if positions[user_id] == len(flows[user_id]):
+            del positions[user_id]
+    return stream, flows, banned_user
+
+
+async def run(stream, concurrency: int, latency: float):
+    """Прогон потока; возвращает время и порядок начала обработки по пользователям"""
+    from main import create_application
+
+    seen = defaultdict(list)
+
+    async def track(update: Update, context):
+        seen[update.effective_user.id].append(update.update_id)
+
+    application = create_application(
+        request=ReplayRequest(latency),
+        get_updates_request=ReplayRequest(),
+        concurrent_updates=concurrency
+    )
+    application.add_handler(TypeHandler(Update, track), group=-100)
+
+    async with application:
+        await application.post_init(application)
+        await application.start()
+        started = time.perf_counter()
+        for data in stream:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.update_queue.join()
+        # Очередь пуста, когда задачи созданы; ждем, пока они доработают
+        while application.update_processor.in_flight:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        await application.stop()
+    return elapsed, seen
+
+
+async def check_offload(db, user_id: int) -> list:
+    """
+    Выгрузка user_data в базу и повторный проход вытеснения: строки
+    недописанной заявки должны остаться в базе до следующего апдейта
+    """
+    from main import create_application
+    from utils.memory_manager import UserDataEvictor
+
+    def saved_keys() -> int:
+        return db.conn.execute('SELECT COUNT(*) FROM user_data WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    application = create_application(request=ReplayRequest(), get_updates_request=ReplayRequest())
+    # Все считаются давно молчащими, бюджет нулевой: выгружается каждый
+    evictor = UserDataEvictor(idle_ttl=-1, abandoned_ttl=3600, memory_budget=0)
+    errors = []
+    async with application:
+        await application.post_init(application)
+        for update_id, (kind, payload) in enumerate((('message', '/start'), ('callback', 'apply')), 1):
+            build = _message if kind == 'message' else _callback
+            await application.process_update(Update.de_json(build(update_id, user_id, payload, update_id), application.bot))
+        await application.update_persistence()
+        before = saved_keys()
+        if not before:
+            errors.append('данные начатой заявки не сохранены в базе')
+
+        await evictor.evict(application)
+        if evictor.offloaded != 1 or saved_keys() != before:
+            errors.append(f'выгрузка: выгружено {evictor.offloaded}, строк {saved_keys()} из {before}')
+        await evictor.evict(application)
+        await application.update_persistence()
+        if saved_keys() != before:
+            errors.append(f'после повторного вытеснения в базе {saved_keys()} строк user_data из {before}')
+        if user_id in application.user_data:
+            errors.append('пустая запись выгруженного пользователя осталась в памяти')
+    return errors
+
+
+def verify(db, flows, seen, banned_user) -> list:
+    """Список найденных нарушений"""
+    errors = []
+    for user_id, flow in flows.items():
+        if len(seen.get(user_id, ())) != len(flow):
+            errors.append(f'у пользователя {user_id} обработано {len(seen.get(user_id, ()))} из {len(flow)} апдейтов')
+    for user_id, updates in seen.items():
+        if updates != sorted(updates):
+            errors.append(f'нарушен порядок апдейтов пользователя {user_id}: {updates}')
+
+    for user_id, flow in flows.items():
+        if user_id == ADMIN_ID:
+            continue
+        rows = db.conn.execute(
+            'SELECT poem_text, second_block FROM applications WHERE user_id = ?', (user_id,)
+        ).fetchall()
+        if len(rows) != 1:
+            errors.append(f'у пользователя {user_id} заявок: {len(rows)}')
+            continue
+        if rows[0]['poem_text'] != flow[2][1]:
+            errors.append(f'у пользователя {user_id} чужой текст заявки')
+        if bool(rows[0]['second_block']) != (flow[3][1] == 'second_block_yes'):
+            errors.append(f'у пользователя {user_id} неверный выбор второго блока')
+
+    if not db.is_user_blacklisted(banned_user):
+        errors.append('сценарий админа не добавил пользователя в черный список')
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка конкурентной обработки апдейтов')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--api-latency', type=float, default=30.0, help='задержка ответа Bot API, мс')
+    args = parser.parse_args(argv)
+
+    from models import db
+
+    if os.path.dirname(os.path.realpath(DB_NAME)) != os.path.realpath(REPLAY_DIR):
+        sys.exit(f'Отказ: проверка очищает таблицы, а база {DB_NAME} лежит вне {REPLAY_DIR}')
+
+    stream, flows, banned_user = build_stream(args.users)
+    report = {'updates': len(stream), 'runs': {}}
+    failed = False
+
+    for concurrency in sorted({1, args.concurrency}):
+        for table in ('applications', 'users', 'blacklist'):
+            db.conn.execute(f'DELETE FROM {table}')
+        db.conn.execute('DROP TABLE IF EXISTS user_data')
+        db.conn.commit()
+        db.reset_caches()
+        db.add_user(banned_user, None, f'Имя{banned_user}', None)
+
+        elapsed, seen = asyncio.run(run(stream, concurrency, args.api_latency / 1000))
+        errors = verify(db, flows, seen, banned_user)
+        failed = failed or bool(errors)
+        report['runs'][concurrency] = {
+            'seconds': round(elapsed, 3),
+            'updates_per_second': round(len(stream) / elapsed, 1),
+            'errors': errors[:20],
+        }
+
+    report['offload_errors'] = asyncio.run(check_offload(db, BASE_USER_ID + args.users))
+    failed = failed or bool(report['offload_errors'])
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
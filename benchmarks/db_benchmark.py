@@ -0,0 +1,255 @@
+"""
+Микробенчмарк методов Database на объёмах реального мероприятия.
+
+Заполняет отдельный SQLite-файл (по умолчанию 100k пользователей,
+500k заявок в разных статусах, 5k записей черного списка), замеряет
+каждый метод Database и функции получателей рассылки из utils/broadcast
+и выводит результат в JSON.
+
+Запуск:
+    python -m benchmarks.db_benchmark --output result.json
+    python -m benchmarks.db_benchmark --compare benchmarks/baseline_db.json
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'poetry_bot_bench')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline_db.json')
+
+# Окружение для config.py должно быть готово до импорта моделей
+os.makedirs(BENCH_DIR, exist_ok=True)
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('LOG_FILE', os.path.join(BENCH_DIR, 'bench.log'))
+os.environ['DB_NAME'] = os.path.join(BENCH_DIR, 'scratch.db')
+
+import models  # noqa: E402
+from models import Database  # noqa: E402
+from models.database import archive_path  # noqa: E402
+import utils.broadcast as broadcast  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+STATUSES = (('pending', 0.1), ('approved', 0.3), ('rejected', 0.6))
+WORDS = (
+    'ветер', 'море', 'ночь', 'свет', 'город', 'осень', 'тишина', 'память',
+    'дорога', 'небо', 'снег', 'окно', 'сердце', 'голос', 'река', 'время',
+    'звезда', 'дом', 'дождь', 'утро', 'тень', 'песня', 'сад', 'берег'
+)
+
+
+def _poem(rng: random.Random) -> str:
+    """Случайное «стихотворение» реалистичной длины"""
+    lines = []
+    for _ in range(rng.randint(4, 16)):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 7))))
+    return '\n'.join(lines)
+
+
+def seed_database(path: str, users: int, applications: int, blacklist: int, seed: int = 42):
+    """Заполнение файла базы синтетическими данными"""
+    for name in (path, archive_path(path)):
+        if os.path.exists(name):
+            os.remove(name)
+
+    rng = random.Random(seed)
+    db = Database(path)
+    cursor = db.conn.cursor()
+    start = datetime.datetime(2024, 1, 1)
+
+    cursor.executemany(
+        'INSERT INTO users (user_id, username, first_name, last_name, created_at) VALUES (?, ?, ?, ?, ?)',
+        (
+            (
+                100000 + i,
+                f'poet_{i}' if rng.random() < 0.7 else None,
+                f'Имя{i}',
+                f'Фамилия{i}' if rng.random() < 0.5 else None,
+                (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            )
+            for i in range(users)
+        )
+    )
+
+    statuses = [name for name, _ in STATUSES]
+    weights = [weight for _, weight in STATUSES]
+    cursor.executemany(
+        'INSERT INTO applications (user_id, poem_text, second_block, status, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (
+            (
+                100000 + rng.randrange(users),
+                _poem(rng),
+                rng.random() < 0.3,
+                rng.choices(statuses, weights)[0],
+                created,
+                created,
+            )
+            for created in (
+                (start + datetime.timedelta(seconds=i * 60)).strftime('%Y-%m-%d %H:%M:%S')
+                for i in range(applications)
+            )
+        )
+    )
+
+    cursor.executemany(
+        'INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)',
+        ((100000 + user_id,) for user_id in rng.sample(range(users), min(blacklist, users)))
+    )
+    db.conn.commit()
+    return db
+
+
+def schema_fingerprint(db: Database) -> str:
+    """Отпечаток схемы (таблицы, индексы, триггеры основной базы и архива)"""
+    statements = sorted(
+        row[0] for schema in ('main', 'archive')
+        for row in db.conn.execute(f'SELECT sql FROM {schema}.sqlite_master WHERE sql IS NOT NULL')
+    )
+    return hashlib.sha1('\n'.join(statements).encode('utf-8')).hexdigest()[:12]
+
+
+def _timed(func, calls) -> dict:
+    """Замер последовательности вызовов, результат в миллисекундах"""
+    samples = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'total_ms': round(sum(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'min_ms': round(samples[0], 3),
+    }
+
+
+def run_benchmarks(db: Database, users: int, repeat: int, point_calls: int, seed: int = 42) -> dict:
+    """Замер всех методов на заполненной базе"""
+    rng = random.Random(seed)
+    user_ids = [100000 + rng.randrange(users) for _ in range(point_calls)]
+    max_application_id = db.conn.execute('SELECT MAX(application_id) FROM applications').fetchone()[0]
+
+    # Функции рассылки работают с общим экземпляром базы
+    models.db.bind(db)
+
+    results = {}
+    results['get_user_application'] = _timed(db.get_user_application, [(uid,) for uid in user_ids])
+    results['get_pending_applications'] = _timed(db.get_pending_applications, [()] * repeat)
+    results['get_approved_applications'] = _timed(db.get_approved_applications, [()] * repeat)
+    results['get_second_block_speakers'] = _timed(db.get_second_block_speakers, [()] * repeat)
+    results['get_blacklist'] = _timed(db.get_blacklist, [()] * repeat)
+    results['create_application'] = _timed(
+        db.create_application,
+        [(uid, _poem(rng), rng.random() < 0.3) for uid in user_ids]
+    )
+    results['update_application_status'] = _timed(
+        db.update_application_status,
+        [(rng.randint(1, max_application_id), rng.choice(('approved', 'rejected'))) for _ in range(point_calls)]
+    )
+    # Модераторы по очереди берут следующую заявку (аренда 10 минут)
+    results['claim_next_application'] = _timed(
+        db.claim_next_application, [(1 + i % 5, 600) for i in range(point_calls)]
+    )
+    results['get_broadcast_recipients_count'] = _timed(broadcast.get_broadcast_recipients_count, [()] * repeat)
+    results['get_broadcast_recipients_preview'] = _timed(broadcast.get_broadcast_recipients_preview, [(10,)] * repeat)
+
+    # Разрушающий замер — последним
+    results['close_event'] = _timed(db.close_event, [()])
+    return results
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """
+    Текстовая таблица сравнения медиан с базовой линией. Методы, которых
+    нет в базовой линии, не сравниваются и перечисляются отдельно. Если
+    базовая линия снята на другой схеме (триггеры, колонки, индексы),
+    об этом предупреждает первая строка: ее стоит перезаписать.
+    """
+    lines = []
+    base_schema = baseline.get('meta', {}).get('schema')
+    if base_schema != current['meta']['schema']:
+        lines.append(
+            f"ВНИМАНИЕ: базовая линия снята на другой схеме ({base_schema or 'не указана'} "
+            f"вместо {current['meta']['schema']}), перезапишите ее: --output {DEFAULT_BASELINE}"
+        )
+    lines.append(f"{'метод':<36}{'база, мс':>12}{'сейчас, мс':>12}{'x':>8}")
+    missing = []
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            missing.append(name)
+            continue
+        ratio = stats['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        lines.append(f"{name:<36}{base['median_ms']:>12.3f}{stats['median_ms']:>12.3f}{ratio:>8.2f}")
+    if missing:
+        lines.append(f"Нет в базовой линии, не сравниваются: {', '.join(missing)}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк методов Database')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--applications', type=int, default=500_000)
+    parser.add_argument('--blacklist', type=int, default=5_000)
+    parser.add_argument('--repeat', type=int, default=3, help='повторов для тяжелых выборок')
+    parser.add_argument('--point-calls', type=int, default=500, help='вызовов для точечных запросов')
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'))
+    parser.add_argument('--output', help='файл для JSON-результата (по умолчанию stdout)')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='JSON базовой линии для сравнения')
+    args = parser.parse_args(argv)
+
+    # Логи методов не должны попадать в вывод замеров
+    logging.basicConfig(level=logging.WARNING)
+
+    seed_started = time.perf_counter()
+    db = seed_database(args.db, args.users, args.applications, args.blacklist)
+    seed_seconds = time.perf_counter() - seed_started
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'users': args.users,
+            'applications': args.applications,
+            'blacklist': args.blacklist,
+            'repeat': args.repeat,
+            'point_calls': args.point_calls,
+            'seed_seconds': round(seed_seconds, 2),
+            'schema': schema_fingerprint(db),
+        },
+        'results': run_benchmarks(db, args.users, args.repeat, args.point_calls),
+    }
+    db.conn.close()
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Воспроизведение записанных апдейтов через полный стек обработчиков.
+
+Файл пишет utils.update_recorder.UpdateRecorder (UPDATES_RECORD_FILE в .env).
+Апдейты подаются в Application в исходном темпе, ускоренно (--speed N)
+или без пауз (--speed 0). База — отдельный временный файл, Bot API
+заменен фейковым транспортом, который отвечает без сети.
+
+С --post апдейты вместо этого отправляются POST-запросами на webhook
+запущенного бота (BOT_MODE=webhook) с заголовком секретного токена.
+
+Запуск:
+    python -m benchmarks.replay updates.jsonl --speed 10
+    python -m benchmarks.replay updates.jsonl --speed 0 --profile replay.prof
+    python -m benchmarks.replay updates.jsonl --post http://127.0.0.1:8443/telegram --secret TOKEN
+"""
+import argparse
+import asyncio
+import cProfile
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPLAY_DIR = os.path.join(tempfile.gettempdir(), 'poetry_bot_replay')
+REPLAY_TOKEN = '123456:REPLAY'
+
+# Окружение для config.py должно быть готово до импорта обработчиков.
+# ADMIN_ID совпадает с utils.update_recorder.ADMIN_PSEUDO_ID
+os.makedirs(REPLAY_DIR, exist_ok=True)
+os.environ['BOT_TOKEN'] = REPLAY_TOKEN
+os.environ['ADMIN_ID'] = '1'
+os.environ['UPDATES_RECORD_FILE'] = ''
+# База всегда своя: DB_NAME из .env указывает на рабочую базу бота
+os.environ['DB_NAME'] = os.path.join(REPLAY_DIR, 'replay.db')
+# Архив — рядом с временной базой, а не ARCHIVE_DB_NAME из .env
+os.environ['ARCHIVE_DB_NAME'] = ''
+os.environ.setdefault('LOG_FILE', os.path.join(REPLAY_DIR, 'replay.log'))
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest, RequestData  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayRequest(BaseRequest):
+    """Фейковый транспорт Bot API: отвечает успехом без обращения к сети"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(10**6)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _result(self, endpoint: str, params: dict):
+        if endpoint == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'Replay', 'username': 'replay_bot'}
+        if endpoint == 'getUpdates':
+            return []
+        if endpoint in ('sendMessage', 'editMessageText', 'sendDocument'):
+            chat_id = int(params.get('chat_id', 0))
+            message = {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            return message
+        return True
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, params)}).encode()
+
+
+def read_records(path: str, limit: int = None):
+    """Чтение записей JSONL"""
+    with open(path, encoding='utf-8') as f:
+        for count, line in enumerate(f):
+            if limit is not None and count >= limit:
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+async def _paced(records, speed: float):
+    """Выдача записей с паузами исходной записи, ускоренными в speed раз"""
+    started = time.perf_counter()
+    first_ts = None
+    for record in records:
+        if first_ts is None:
+            first_ts = record['ts']
+        if speed > 0:
+            # Ждем момента, в который апдейт пришел в оригинальной записи
+            delay = (record['ts'] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield record
+
+
+async def post_to_webhook(path: str, url: str, secret: str, speed: float, limit: int = None) -> dict:
+    """Отправка записанных апдейтов на webhook запущенного бота"""
+    import httpx
+
+    statuses = Counter()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(headers={'X-Telegram-Bot-Api-Secret-Token': secret}) as client:
+        async for record in _paced(read_records(path, limit), speed):
+            response = await client.post(url, json=record['update'])
+            statuses[response.status_code] += 1
+    elapsed = time.perf_counter() - started
+
+    count = sum(statuses.values())
+    return {
+        'updates': count,
+        'seconds': round(elapsed, 3),
+        'updates_per_second': round(count / elapsed, 1) if elapsed else None,
+        'statuses': dict(statuses),
+    }
+
+
+async def replay(path: str, speed: float, latency: float, limit: int = None) -> dict:
+    """Подача записанных апдейтов в приложение с фейковым Bot API"""
+    from main import create_application
+
+    request = ReplayRequest(latency)
+    application = create_application(request=request, get_updates_request=ReplayRequest())
+
+    count = 0
+    async with application:
+        await application.post_init(application)
+        await application.start()
+        started = time.perf_counter()
+
+        async for record in _paced(read_records(path, limit), speed):
+            await application.update_queue.put(Update.de_json(record['update'], application.bot))
+            count += 1
+
+        await application.update_queue.join()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    return {
+        'updates': count,
+        'seconds': round(elapsed, 3),
+        'updates_per_second': round(count / elapsed, 1) if elapsed else None,
+        'api_calls': dict(request.calls),
+    }
+
+
+def remove_scratch_file(path: str):
+    """Удалить временный файл воспроизведения; файлы вне REPLAY_DIR не трогаются"""
+    path = os.path.realpath(path)
+    if os.path.dirname(path) != os.path.realpath(REPLAY_DIR):
+        raise RuntimeError(f"Отказ удалять {path}: файл вне {REPLAY_DIR}")
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных апдейтов')
+    parser.add_argument('file', help='JSONL-файл, записанный UpdateRecorder')
+    parser.add_argument('--speed', type=float, default=1.0, help='ускорение (0 — без пауз)')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа Bot API, мс')
+    parser.add_argument('--limit', type=int, help='воспроизвести только первые N апдейтов')
+    parser.add_argument('--keep-db', action='store_true', help='не очищать базу перед запуском')
+    parser.add_argument('--profile', help='сохранить профиль cProfile в файл')
+    parser.add_argument('--post', metavar='URL', help='отправить апдейты на webhook по этому адресу')
+    parser.add_argument('--secret', default='', help='секретный токен webhook для --post')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.post:
+        summary = asyncio.run(post_to_webhook(args.file, args.post, args.secret, args.speed, args.limit))
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+
+    if not args.keep_db:
+        from models.database import archive_path
+        remove_scratch_file(os.environ['DB_NAME'])
+        remove_scratch_file(archive_path(os.environ['DB_NAME']))
+
+    coroutine = replay(args.file, args.speed, args.api_latency / 1000, args.limit)
+    if args.profile:
+        profiler = cProfile.Profile()
+        summary = profiler.runcall(asyncio.run, coroutine)
+        profiler.dump_stats(args.profile)
+    else:
+        summary = asyncio.run(coroutine)
+
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
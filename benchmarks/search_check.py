@@ -0,0 +1,101 @@
+"""
+Проверка поиска по стихам на отдельной временной базе.
+
+Подает заявки со словами с «ё» и проверяет, что поиск находит их
+при вводе и с «ё», и с «е», в любом регистре, и отмечает совпадения
+во фрагменте — сначала в открытом вечере, затем в архиве после его
+закрытия. Печатает найденные нарушения и завершается с кодом 1,
+если они есть.
+
+Запуск:
+    python -m benchmarks.search_check
+"""
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'poetry_bot_bench')
+
+# Окружение для config.py должно быть готово до импорта моделей
+os.makedirs(BENCH_DIR, exist_ok=True)
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ.setdefault('LOG_FILE', os.path.join(BENCH_DIR, 'bench.log'))
+os.environ['DB_NAME'] = os.path.join(BENCH_DIR, 'search.db')
+os.environ['ARCHIVE_DB_NAME'] = ''
+
+from models import Database  # noqa: E402
+from models.database import archive_path  # noqa: E402
+from utils.poem_search import build_match, mark_matches  # noqa: E402
+
+POEMS = {
+    'yo': 'Зелёная ёлка в лесу\nЕё украсили к празднику',
+    'plain': 'Зеленая трава у дома',
+}
+# Запрос -> заявки, которые он должен найти
+EXPECTED = {
+    'ёлка': {'yo'},
+    'елка': {'yo'},
+    'ЁЛКА': {'yo'},
+    'Елк': {'yo'},
+    'зелёная': {'yo', 'plain'},
+    'зеленая': {'yo', 'plain'},
+    'её': {'yo'},
+    'трава': {'plain'},
+}
+
+
+def open_scratch_db() -> Database:
+    path = os.environ['DB_NAME']
+    for file in (path, archive_path(path)):
+        if os.path.exists(file):
+            os.remove(file)
+    return Database(path)
+
+
+def check_live(db: Database, ids: dict) -> list:
+    """Поиск по заявкам открытого вечера"""
+    errors = []
+    for query, expected in EXPECTED.items():
+        rows, total = db.search_poems(build_match(query), limit=10)
+        found = {name for name, application_id in ids.items()
+                 if application_id in {row['application_id'] for row in rows}}
+        if found != expected or total != len(expected):
+            errors.append(f"«{query}»: найдено {sorted(found)}, ожидалось {sorted(expected)}")
+        elif any('\x02' not in row['snippet'] for row in rows):
+            errors.append(f"«{query}»: совпадение не отмечено во фрагменте")
+    return errors
+
+
+def check_archive(db: Database, ids: dict) -> list:
+    """Поиск по архиву после закрытия вечера"""
+    errors = []
+    for query, expected in EXPECTED.items():
+        rows, total = db.search_archived_poems(build_match(query), limit=10)
+        found = {name for name, application_id in ids.items()
+                 if application_id in {row['application_id'] for row in rows}}
+        if found != expected or total != len(expected):
+            errors.append(f"архив, «{query}»: найдено {sorted(found)}, ожидалось {sorted(expected)}")
+        elif any('\x02' not in mark_matches(row['poem_text'], query) for row in rows):
+            errors.append(f"архив, «{query}»: совпадение не отмечено во фрагменте")
+    return errors
+
+
+def main():
+    db = open_scratch_db()
+    ids = {}
+    for user_id, (name, poem) in enumerate(POEMS.items(), 1):
+        db.add_user(user_id, None, f'Имя{user_id}', None)
+        ids[name] = db.create_application(user_id, poem)
+
+    errors = check_live(db, ids)
+    db.close_event()
+    errors += check_archive(db, ids)
+    for error in errors:
+        print(error)
+    print('ok' if not errors else f'нарушений: {len(errors)}')
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
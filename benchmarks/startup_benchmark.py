@@ -0,0 +1,167 @@
+"""
+Бенчмарк запуска бота: импорт, сборка приложения, открытие хранилищ
+и время до первого обработанного апдейта.
+
+Каждый замер идет в отдельном процессе, чтобы импорт был холодным.
+Дочерний процесс импортирует main, собирает приложение с фейковым
+Bot API (benchmarks.replay.ReplayRequest), выполняет post_init, подает
+один апдейт /start и печатает отметки StartupProfiler в JSON.
+База заполняется заранее (контент и черный список), как на проде.
+
+Запуск:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --runs 10 --output result.json --compare
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.join(tempfile.gettempdir(), 'poetry_bot_bench')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline_startup.json')
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Окружение для config.py; ADMIN_ID совпадает с benchmarks.replay
+ENV = {
+    'BOT_TOKEN': '123456:REPLAY',
+    'ADMIN_ID': '1',
+    'BOT_MODE': 'polling',
+    'UPDATES_RECORD_FILE': '',
+    'DB_NAME': os.path.join(BENCH_DIR, 'startup.db'),
+    'LOG_FILE': os.path.join(BENCH_DIR, 'startup.log'),
+    'LOG_LEVEL': 'WARNING',
+}
+
+START_UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': 100001, 'type': 'private'},
+        'from': {'id': 100001, 'is_bot': False, 'first_name': 'Поэт'},
+        'text': '/start',
+        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+    },
+}
+
+
+def child():
+    """Один холодный запуск; отметки печатаются в stdout"""
+    import main
+
+    import asyncio
+    import logging
+
+    from telegram import Update
+    from benchmarks.replay import ReplayRequest
+
+    logging.basicConfig(level=logging.WARNING)
+
+    async def run():
+        application = main.create_application(request=ReplayRequest(), get_updates_request=ReplayRequest())
+        async with application:
+            await application.post_init(application)
+            await application.start()
+            await application.update_queue.put(Update.de_json(START_UPDATE, application.bot))
+            await application.update_queue.join()
+            main.startup_profiler.mark('first_update_done')
+            await application.stop()
+
+    asyncio.run(run())
+    print(json.dumps(main.startup_profiler.report()))
+
+
+def seed_database(blacklist: int):
+    """База с контентом и черным списком, чтобы прогрев кэшей что-то читал"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    if os.path.exists(ENV['DB_NAME']):
+        os.remove(ENV['DB_NAME'])
+    # Схему создаст сам бот; здесь только заполнение
+    subprocess.run(
+        [sys.executable, '-c', 'from models import db; db.initialize()'],
+        cwd=ROOT_DIR, env={**os.environ, **ENV}, check=True
+    )
+    conn = sqlite3.connect(ENV['DB_NAME'])
+    conn.executemany('INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)', ((200000 + i,) for i in range(blacklist)))
+    conn.commit()
+    conn.close()
+
+
+def measure(runs: int) -> dict:
+    """Медианы отметок по нескольким холодным запускам, мс"""
+    samples = {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup_benchmark', '--child'],
+            cwd=ROOT_DIR, env={**os.environ, **ENV}, check=True, capture_output=True, text=True
+        )
+        process_ms = (time.perf_counter() - started) * 1000
+        marks = json.loads(result.stdout.strip().splitlines()[-1])
+        marks['process_total'] = round(process_ms, 1)
+        for name, value in marks.items():
+            samples.setdefault(name, []).append(value)
+
+    return {
+        name: {'median_ms': round(statistics.median(values), 1), 'min_ms': round(min(values), 1)}
+        for name, values in samples.items()
+    }
+
+
+def compare(current: dict, baseline: dict) -> str:
+    """Текстовая таблица сравнения медиан с базовой линией"""
+    lines = [f"{'этап':<24}{'база, мс':>12}{'сейчас, мс':>12}"]
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        base_ms = f"{base['median_ms']:>12.1f}" if base else f"{'-':>12}"
+        lines.append(f"{name:<24}{base_ms}{stats['median_ms']:>12.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк запуска бота')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--blacklist', type=int, default=5_000)
+    parser.add_argument('--output', help='файл для JSON-результата (по умолчанию stdout)')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help='JSON базовой линии для сравнения')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return
+
+    seed_database(args.blacklist)
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'runs': args.runs,
+            'blacklist': args.blacklist,
+        },
+        'results': measure(args.runs),
+    }
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
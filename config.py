@@ -12,14 +12,156 @@ ADMIN_ID = int(os.getenv('ADMIN_ID', '0'))
 if not ADMIN_ID:
     raise ValueError("ADMIN_ID не найден в переменных окружения")
 
+# Модераторы заявок (ID через запятую); организатор модерирует всегда
+try:
+    MODERATOR_IDS = frozenset(
+        {ADMIN_ID} | {int(part) for part in os.getenv('MODERATOR_IDS', '').split(',') if part.strip()}
+    )
+except ValueError:
+    raise ValueError("MODERATOR_IDS должен быть списком числовых ID через запятую")
+# Сколько секунд заявка закреплена за модератором, открывшим ее
+CLAIM_LEASE_SECONDS = int(os.getenv('CLAIM_LEASE_SECONDS', '600'))
+# Интервал отчета об очереди модерации в лог, секунды
+MODERATION_REPORT_INTERVAL = int(os.getenv('MODERATION_REPORT_INTERVAL', '300'))
+
 # Настройки базы данных
 DB_NAME = os.getenv('DB_NAME', '/app/data/poetry_bot.db')
 
+# Архив прошедших вечеров: отдельный файл базы, подключаемый через ATTACH
+# (по умолчанию рядом с основной, <имя>_archive.db); тексты стихов в архиве
+# можно хранить сжатыми
+ARCHIVE_DB_NAME = os.getenv('ARCHIVE_DB_NAME', '')
+ARCHIVE_COMPRESS = os.getenv('ARCHIVE_COMPRESS', 'true').lower() in ('1', 'true', 'yes')
+
+# Резервные копии: каталог, интервал (секунды, 0 — только вручную), сколько
+# копий хранить; копирование идет порциями страниц с паузой между ними,
+# чтобы не задерживать обработчики
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(os.path.dirname(DB_NAME), 'backups'))
+BACKUP_INTERVAL = int(os.getenv('BACKUP_INTERVAL', '21600'))
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+if BACKUP_KEEP < 1:
+    raise ValueError("BACKUP_KEEP должен быть не меньше 1")
+BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_STEP_PAUSE = float(os.getenv('BACKUP_STEP_PAUSE', '0.02'))
+
 # Настройки логирования
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 LOG_FILE = os.getenv('LOG_FILE', '/app/bot.log')
 LOG_ROTATION_DAYS = int(os.getenv('LOG_ROTATION_DAYS', '7'))
 
-# Создание директорий
-os.makedirs(os.path.dirname(DB_NAME), exist_ok=True)
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+if BOT_MODE not in ('polling', 'webhook'):
+    raise ValueError(f"Неизвестный BOT_MODE: {BOT_MODE}")
+
+# Настройки webhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+if BOT_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET_TOKEN):
+    raise ValueError("Для BOT_MODE=webhook нужны WEBHOOK_URL и WEBHOOK_SECRET_TOKEN")
+
+# Максимальный размер очереди входящих апдейтов
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+
+# Сколько апдейтов обрабатывается одновременно (1 — строго по очереди)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
+
+# Защита от флуда: токенов в секунду и размер ведра на пользователя
+FLOOD_RATE = float(os.getenv('FLOOD_RATE', '1.0'))
+FLOOD_BURST = float(os.getenv('FLOOD_BURST', '10'))
+# Порог необработанных апдейтов, после которого включается режим перегрузки
+OVERLOAD_BACKLOG = int(os.getenv('OVERLOAD_BACKLOG', '200'))
+# Интервал отчета о допуске апдейтов, секунды
+FLOOD_REPORT_INTERVAL = int(os.getenv('FLOOD_REPORT_INTERVAL', '300'))
+
+# Состояния ввода админа: время жизни, хранилище (memory или sqlite), период очистки
+STATE_TIMEOUT = int(os.getenv('STATE_TIMEOUT', '300'))
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+STATE_SWEEP_INTERVAL = int(os.getenv('STATE_SWEEP_INTERVAL', '60'))
+
+# Как часто user_data сохраняется в базу, секунды
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))
+
+# Вытеснение user_data: простой до удаления кэшей, срок жизни брошенной заявки,
+# бюджет памяти в байтах и период проверки (секунды)
+USER_DATA_IDLE_TTL = int(os.getenv('USER_DATA_IDLE_TTL', '1800'))
+ABANDONED_FLOW_TTL = int(os.getenv('ABANDONED_FLOW_TTL', '21600'))
+USER_DATA_MEMORY_BUDGET = int(os.getenv('USER_DATA_MEMORY_BUDGET', str(64 * 1024 * 1024)))
+USER_DATA_EVICTION_INTERVAL = int(os.getenv('USER_DATA_EVICTION_INTERVAL', '300'))
+
+# HTTP-клиент Bot API: размер пула исходящих вызовов и сколько соединений
+# из него недоступно рассылке (резерв для ответов пользователям)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+HTTP_INTERACTIVE_RESERVE = int(os.getenv('HTTP_INTERACTIVE_RESERVE', '8'))
+# Keep-alive простаивающих соединений и таймауты, секунды
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+HTTP_WRITE_TIMEOUT = float(os.getenv('HTTP_WRITE_TIMEOUT', '10'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '5'))
+# 1.1 или 2 (для HTTP/2 нужен python-telegram-bot[http2])
+HTTP_VERSION = os.getenv('HTTP_VERSION', '1.1')
+if HTTP_VERSION not in ('1.1', '2', '2.0'):
+    raise ValueError(f"Неизвестный HTTP_VERSION: {HTTP_VERSION}")
+if HTTP_INTERACTIVE_RESERVE >= HTTP_POOL_SIZE:
+    raise ValueError("HTTP_INTERACTIVE_RESERVE должен быть меньше HTTP_POOL_SIZE")
+HTTP_POOL_REPORT_INTERVAL = int(os.getenv('HTTP_POOL_REPORT_INTERVAL', '300'))
+
+# Планировщик исходящих сообщений: сообщений в секунду на весь бот,
+# пауза между сообщениями в один чат (секунды), повторы после RetryAfter;
+# 0 снимает соответствующее ограничение
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '25'))
+OUTBOUND_CHAT_INTERVAL = float(os.getenv('OUTBOUND_CHAT_INTERVAL', '1.0'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '2'))
+OUTBOUND_REPORT_INTERVAL = int(os.getenv('OUTBOUND_REPORT_INTERVAL', '300'))
+
+# Предельное время одного вызова Bot API в параллельных группах, секунды
+API_CALL_TIMEOUT = float(os.getenv('API_CALL_TIMEOUT', '15'))
+
+# Сколько последних отредактированных сообщений помнить, чтобы не
+# отправлять в Telegram повторное редактирование тем же содержимым
+EDIT_CACHE_SIZE = int(os.getenv('EDIT_CACHE_SIZE', '10000'))
+
+# Похожие стихи: порог сходства (доля общих 5-грамм, 0..1) для пометки
+# в карточке; старые заявки индексируются порциями раз в интервал, секунды
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', '0.6'))
+if not 0 < DUPLICATE_THRESHOLD <= 1:
+    raise ValueError("DUPLICATE_THRESHOLD должен быть в диапазоне (0, 1]")
+DUPLICATE_BACKFILL_BATCH = int(os.getenv('DUPLICATE_BACKFILL_BATCH', '200'))
+DUPLICATE_BACKFILL_INTERVAL = int(os.getenv('DUPLICATE_BACKFILL_INTERVAL', '10'))
+
+# Поиск по стихам: размер порции и интервал (секунды) дозаполнения
+# индекса заявками, поданными до его создания
+POEM_SEARCH_BACKFILL_BATCH = int(os.getenv('POEM_SEARCH_BACKFILL_BATCH', '500'))
+POEM_SEARCH_BACKFILL_INTERVAL = int(os.getenv('POEM_SEARCH_BACKFILL_INTERVAL', '5'))
+
+# Поиск пользователей: порция и интервал (секунды) дозаполнения индекса
+USER_DIRECTORY_BACKFILL_BATCH = int(os.getenv('USER_DIRECTORY_BACKFILL_BATCH', '5000'))
+USER_DIRECTORY_BACKFILL_INTERVAL = int(os.getenv('USER_DIRECTORY_BACKFILL_INTERVAL', '5'))
+
+# Объем стихов: темп чтения вслух (слов в минуту) для оценки времени,
+# предел выступления из правил (минуты), порция и интервал (секунды)
+# дозаполнения старых заявок
+READING_WORDS_PER_MINUTE = int(os.getenv('READING_WORDS_PER_MINUTE', '100'))
+if READING_WORDS_PER_MINUTE <= 0:
+    raise ValueError("READING_WORDS_PER_MINUTE должен быть положительным")
+READING_LIMIT_MINUTES = float(os.getenv('READING_LIMIT_MINUTES', '5'))
+POEM_METRICS_BACKFILL_BATCH = int(os.getenv('POEM_METRICS_BACKFILL_BATCH', '500'))
+POEM_METRICS_BACKFILL_INTERVAL = int(os.getenv('POEM_METRICS_BACKFILL_INTERVAL', '5'))
+
+# Наибольший размер файла для импорта черного списка, байты
+BLACKLIST_IMPORT_MAX_BYTES = int(os.getenv('BLACKLIST_IMPORT_MAX_BYTES', str(2 * 1024 * 1024)))
+if BLACKLIST_IMPORT_MAX_BYTES <= 0:
+    raise ValueError("BLACKLIST_IMPORT_MAX_BYTES должен быть положительным")
+
+# Сколько отрисованных карточек заявок держать в памяти
+CARD_CACHE_SIZE = int(os.getenv('CARD_CACHE_SIZE', '256'))
+
+# Запись входящих апдейтов в JSONL (пусто — запись выключена)
+UPDATES_RECORD_FILE = os.getenv('UPDATES_RECORD_FILE', '')
+# Соль псевдонимизации; без нее псевдонимы меняются при каждом запуске
+UPDATES_RECORD_SALT = os.getenv('UPDATES_RECORD_SALT') or None
@@ -1,31 +1,27 @@
 from .user_handlers import (
     start, 
-    handle_main_menu_callbacks, 
     handle_application_text, 
     handle_second_block_choice
 )
 from .admin_handlers import (
-    handle_admin_callbacks,
     handle_broadcast_message,
     handle_blacklist_message
 )
-from .content_edit_handlers import (
-    handle_content_edit_callback,
-    handle_content_text_input
-)
+from .content_edit_handlers import handle_content_text_input
 from .message_router import route_message
-from .state_manager import state_manager
+from .state_manager import state_manager, AdminState
+from .callback_router import CallbackRouter, callback_router
 
 __all__ = [
     'start',
-    'handle_main_menu_callbacks',
     'handle_application_text', 
     'handle_second_block_choice',
-    'handle_admin_callbacks',
     'handle_broadcast_message',
     'handle_blacklist_message',
-    'handle_content_edit_callback',
     'handle_content_text_input',
     'route_message',
-    'state_manager'
+    'state_manager',
+    'AdminState',
+    'CallbackRouter',
+    'callback_router'
 ]
@@ -1,152 +1,48 @@
+import asyncio
+import html
+import io
 import logging
-import time
-from typing import Dict, Any, Optional
+import os
+from typing import Dict, Optional
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
-from models import Database
+from models import db
 from keyboards.admin_keyboards import (
     get_admin_menu, 
     get_blacklist_menu, 
     get_application_moderation_keyboard, 
-    get_confirmation_keyboard
+    get_confirmation_keyboard,
+    get_blacklist_pagination_keyboard
 )
-from config import ADMIN_ID
+from config import ADMIN_ID, MODERATOR_IDS, BLACKLIST_IMPORT_MAX_BYTES
+from keyboards.user_keyboards import get_back_to_menu
 from utils.broadcast import send_broadcast, get_broadcast_recipients_count, get_broadcast_recipients_preview
-from utils.file_export import export_approved_poems_to_file, export_second_block_speakers_to_file
-from .state_manager import state_manager  # оставляем старый state_manager для совместимости
+from utils.file_export import (
+    export_approved_poems_to_file, export_second_block_speakers_to_file, export_blacklist_to_file
+)
+from utils.memory_manager import user_data_evictor
+from utils.concurrency import gather_calls
+from utils.http_pools import bulk_traffic
+from utils.outbound_scheduler import PRIORITY_MODERATION
+from utils.render_cache import edit_cache, is_not_modified
+from utils.application_cards import card_cache
+from utils.moderation_queue import moderation_queue
+from utils.duplicate_index import duplicate_index
+from utils.user_directory import find_users, describe_user
+from utils.program_length import render_program_length
+from utils.backups import backup_manager
+from utils.blacklist_import import MAX_EXAMPLES, parse_entries, import_blacklist
+from .state_manager import state_manager, AdminState
 
 logger = logging.getLogger(__name__)
-db = Database()
 
 class AdminConfig:
     """Конфигурация админ-панели"""
     MAX_APPLICATIONS_PER_PAGE = 10
     BROADCAST_CHUNK_SIZE = 30
-    STATE_TIMEOUT = 300  # 5 минут
     MAX_BLACKLIST_DISPLAY = 50
 
-class AdminStateManager:
-    """Менеджер состояний администратора"""
-    
-    def __init__(self):
-        self._states = {}
-    
-    def set_state(self, user_id: int, state: str, data: Optional[Dict] = None):
-        """Установить состояние с временной меткой"""
-        self._states[user_id] = {
-            'state': state,
-            'data': data or {},
-            'timestamp': time.time()
-        }
-    
-    def get_state(self, user_id: int) -> Optional[Dict]:
-        """Получить состояние с проверкой таймаута"""
-        if user_id not in self._states:
-            return None
-            
-        state_data = self._states[user_id]
-        if time.time() - state_data['timestamp'] > AdminConfig.STATE_TIMEOUT:
-            del self._states[user_id]
-            return None
-            
-        return state_data
-    
-    def clear_state(self, user_id: int):
-        """Очистить состояние"""
-        if user_id in self._states:
-            del self._states[user_id]
-    
-    def cleanup_expired(self):
-        """Очистить просроченные состояния"""
-        current_time = time.time()
-        expired_users = [
-            user_id for user_id, state_data in self._states.items()
-            if current_time - state_data['timestamp'] > AdminConfig.STATE_TIMEOUT
-        ]
-        for user_id in expired_users:
-            del self._states[user_id]
-
-# Инициализация менеджера состояний
-admin_state_manager = AdminStateManager()
-
-async def handle_admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Главный обработчик callback-запросов админ-меню"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    if not await _validate_admin_access(user_id, query):
-        return
-    
-    callback_data = query.data
-    logger.info(f"Админ callback: {callback_data}")
-
-    # Обработка навигации по заявкам
-    if callback_data.startswith("nav_"):
-        index = int(callback_data.split("_")[1])
-        await navigate_applications(query, index, context)
-    
-    # Обработка пагинации черного списка
-    elif callback_data.startswith("blacklist_page_"):
-        page = int(callback_data.split("_")[2])
-        await show_blacklist_details(query, page)
-    
-    # Обработка принятия/отклонения заявок
-    elif callback_data.startswith("approve_"):
-        application_id = int(callback_data.split("_")[1])
-        await handle_application_action(query, application_id, 'approve', context)
-    
-    elif callback_data.startswith("reject_"):
-        application_id = int(callback_data.split("_")[1])
-        await handle_application_action(query, application_id, 'reject', context)
-    
-    # Обработка подтверждения удаления
-    elif callback_data == "confirm_delete_all":
-        await delete_all_applications(query, context)
-    
-    elif callback_data == "cancel_delete_all":
-        await show_admin_menu(query)
-    
-    # Основное админ-меню
-    elif callback_data == "admin_menu":
-        await show_admin_menu(query)
-    
-    elif callback_data == "admin_pending_applications":
-        await show_pending_applications(query, context)
-    
-    elif callback_data == "admin_approved_poems":
-        await export_approved_poems(query, context)
-    
-    elif callback_data == "admin_second_block":
-        await export_second_block_speakers(query, context)
-    
-    elif callback_data == "admin_delete_all":
-        await confirm_delete_all_applications(query)
-    
-    elif callback_data == "admin_blacklist":
-        await show_blacklist_menu(query)
-    
-    elif callback_data == "admin_broadcast":
-        await handle_admin_broadcast_callback(query)
-    
-    # Черный список
-    elif callback_data in ["blacklist_add", "blacklist_remove", "blacklist_view"]:
-        await handle_blacklist_actions(query, callback_data, context)
-    
-    # Редактирование контента
-    elif callback_data in ["admin_rules", "admin_about"]:
-        from handlers.content_edit_handlers import handle_content_edit_callback
-        await handle_content_edit_callback(update, context)
-    
-    # Пустой callback (для кнопок-заглушек)
-    elif callback_data == "noop":
-        await query.answer()
-    
-    else:
-        logger.warning(f"Неизвестный callback: {callback_data}")
-        await query.answer("❌ Неизвестная команда")
-
 async def _validate_admin_access(user_id: int, query) -> bool:
     """Проверка прав доступа администратора"""
     if user_id != ADMIN_ID:
@@ -159,10 +55,22 @@ async def _validate_admin_access(user_id: int, query) -> bool:
     return True
 
 async def safe_edit_message_text(query, text: str, **kwargs):
-    """Безопасное редактирование сообщения с обработкой исключений"""
+    """
+    Безопасное редактирование сообщения с обработкой исключений.
+
+    Если сообщение уже показывает тот же текст и клавиатуру, запрос
+    в Telegram не отправляется. Новое сообщение вместо редактирования
+    отправляется только при настоящей ошибке, а не на "message is not modified".
+    """
+    message = query.message
+    key = edit_cache.key(message.chat_id, message.message_id) if message else None
+    if edit_cache.is_current(key, edit_cache.fingerprint(text, **kwargs)):
+        return
     try:
         await query.edit_message_text(text, **kwargs)
     except Exception as e:
+        if is_not_modified(e):
+            return
         logger.warning(f"Не удалось отредактировать сообщение: {e}")
         # Пытаемся отправить новое сообщение
         try:
@@ -172,6 +80,8 @@ async def safe_edit_message_text(query, text: str, **kwargs):
 
 async def show_admin_menu(query):
     """Показать меню администратора"""
+    # Возврат в меню отменяет незавершенный ввод
+    state_manager.clear_state(query.from_user.id)
     await safe_edit_message_text(
         query,
         "⚙️ <b>Меню организатора:</b>",
@@ -179,76 +89,74 @@ async def show_admin_menu(query):
         reply_markup=get_admin_menu()
     )
 
-async def show_pending_applications(query, context: ContextTypes.DEFAULT_TYPE):
-    """Показать заявки на модерацию"""
-    pending_applications = db.get_pending_applications()
+def _moderation_exit_markup(user_id: int):
+    """Куда вернуться из очереди: организатор — в админ-меню, модератор — в главное"""
+    return get_admin_menu() if user_id == ADMIN_ID else get_back_to_menu()
+
+async def _validate_moderator_access(user_id: int, query) -> bool:
+    """Проверка прав модератора заявок"""
+    if user_id not in MODERATOR_IDS:
+        await safe_edit_message_text(query, "⛔ У вас нет прав доступа.", reply_markup=get_back_to_menu())
+        return False
+    return True
+
+async def show_pending_applications(query, context: ContextTypes.DEFAULT_TYPE, skip: Optional[int] = None):
+    """Взять из очереди следующую заявку и показать ее модератору"""
+    user_id = query.from_user.id
+    application = moderation_queue.claim_next(user_id, skip=skip)
     
-    if not pending_applications:
+    if application is None:
+        counts = db.get_pending_queue_counts()
+        text = (
+            f"⏳ <b>Все заявки ({counts['pending']}) сейчас у других модераторов.</b>\n\nЗагляните позже."
+            if counts['pending'] else "📭 <b>Нет заявок на рассмотрение.</b>"
+        )
         await safe_edit_message_text(
             query,
-            "📭 <b>Нет заявок на рассмотрение.</b>",
+            text,
             parse_mode='HTML',
-            reply_markup=get_admin_menu()
+            reply_markup=_moderation_exit_markup(user_id)
         )
         return
     
-    # Сохраняем список заявок в context для навигации
-    user_id = query.from_user.id
-    context.user_data['admin_applications'] = pending_applications
-    context.user_data['admin_applications_timestamp'] = time.time()
-    
-    # Показываем первую заявку
-    await show_application_detail(query, 0, context)
+    await _show_claimed_application(query, application, 0)
 
-async def show_application_detail(query, index: int, context: ContextTypes.DEFAULT_TYPE):
-    """Показать детали заявки по индексу"""
+async def show_application_detail(query, application_id: int, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
+    """Показать страницу закрепленной за модератором заявки"""
     user_id = query.from_user.id
-    applications = context.user_data.get('admin_applications', [])
-    timestamp = context.user_data.get('admin_applications_timestamp', 0)
-    
-    # Проверяем актуальность данных (10 минут)
-    if time.time() - timestamp > 600:
-        applications = db.get_pending_applications()
-        context.user_data['admin_applications'] = applications
-        context.user_data['admin_applications_timestamp'] = time.time()
-    
-    if not applications or index >= len(applications):
-        await safe_edit_message_text(
-            query,
-            "❌ Заявка не найдена.", 
-            reply_markup=get_admin_menu()
-        )
+    if not moderation_queue.holds(application_id, user_id):
+        # Аренда истекла и заявку взял другой модератор — показываем следующую
+        await show_pending_applications(query, context)
         return
     
-    application = applications[index]
-    
-    # Формируем текст заявки
-    application_text = (
-        f"📨 <b>Заявка #{application['application_id']}</b>\n\n"
-        f"👤 <b>Автор:</b> {application['first_name']} {application['last_name'] or ''}\n"
-        f"📛 <b>Username:</b> @{application['username'] or 'нет'}\n"
-        f"🆔 <b>ID:</b> {application['user_id']}\n"
-        f"🎭 <b>Второй блок:</b> {'✅ Да' if application['second_block'] else '❌ Нет'}\n"
-        f"📅 <b>Дата:</b> {application['created_at']}\n\n"
-        f"📝 <b>Стихотворение:</b>\n{application['poem_text']}"
-    )
+    await _show_claimed_application(query, db.get_application_by_id(application_id), page)
+
+async def _show_claimed_application(query, application, page: int):
+    """Карточка заявки с кнопками модерации"""
+    # Карточка отрисовывается один раз на версию заявки и список похожих
+    duplicates = duplicate_index.similar_to(application['application_id'])
+    pages = card_cache.pages(application, duplicates)
+    page = min(page, len(pages) - 1)
     
     keyboard = get_application_moderation_keyboard(
-        application['application_id'], 
-        index, 
-        len(applications)
+        application['application_id'],
+        db.get_pending_queue_counts()['pending'],
+        page,
+        len(pages),
+        back_to='admin_menu' if query.from_user.id == ADMIN_ID else 'main_menu'
     )
     
     await safe_edit_message_text(
         query,
-        application_text,
+        pages[page],
         parse_mode='HTML',
         reply_markup=keyboard
     )
 
-async def navigate_applications(query, index: int, context: ContextTypes.DEFAULT_TYPE):
-    """Навигация по заявкам"""
-    await show_application_detail(query, index, context)
+async def skip_application(query, application_id: int, context: ContextTypes.DEFAULT_TYPE):
+    """Вернуть заявку в очередь и взять следующую"""
+    moderation_queue.release(application_id, query.from_user.id)
+    await show_pending_applications(query, context, skip=application_id)
 
 async def handle_application_action(query, application_id: int, action: str, context: ContextTypes.DEFAULT_TYPE):
     """Универсальный обработчик действий с заявками"""
@@ -280,17 +188,21 @@ async def handle_application_action(query, application_id: int, action: str, con
         
         config = action_config[action]
         
-        # Обновляем статус заявки
-        db.update_application_status(application_id, config['status'])
+        # Решение принимается, только если заявка все еще за этим модератором
+        if not moderation_queue.decide(application_id, query.from_user.id, config['status']):
+            await gather_calls(
+                answer=query.answer("⚠️ Заявку уже обработал или взял другой модератор"),
+                refresh=show_pending_applications(query, context)
+            )
+            return
         logger.info(f"Заявка {application_id} {config['log_action']}")
         
-        # Уведомляем пользователя
-        await _notify_user_about_application(application, config['user_msg'], context)
-        
-        await query.answer(config['admin_msg'])
-        
-        # Обновляем список заявок
-        await _refresh_applications_list(query, application_id, context)
+        # Уведомление пользователя, ответ на нажатие и следующая заявка независимы
+        await gather_calls(
+            notify=_notify_user_about_application(application, config['user_msg'], context),
+            answer=query.answer(config['admin_msg']),
+            refresh=show_pending_applications(query, context)
+        )
         
     except Exception as e:
         logger.error(f"Ошибка при обработке заявки {application_id}: {e}", exc_info=True)
@@ -302,40 +214,13 @@ async def _notify_user_about_application(application: Dict, message: str, contex
         await context.bot.send_message(
             chat_id=application['user_id'],
             text=message,
-            parse_mode='HTML'
+            parse_mode='HTML',
+            rate_limit_args={'priority': PRIORITY_MODERATION}
         )
         logger.info(f"Пользователь {application['user_id']} уведомлен")
     except Exception as e:
         logger.error(f"Не удалось уведомить пользователя {application['user_id']}: {e}")
 
-async def _refresh_applications_list(query, processed_application_id: int, context: ContextTypes.DEFAULT_TYPE):
-    """Обновить список заявок после обработки"""
-    user_id = query.from_user.id
-    applications = context.user_data.get('admin_applications', [])
-    
-    if applications:
-        # Удаляем обработанную заявку из списка
-        context.user_data['admin_applications'] = [
-            app for app in applications 
-            if app['application_id'] != processed_application_id
-        ]
-        
-        applications = context.user_data['admin_applications']
-        logger.info(f"Обновлен список заявок для пользователя {user_id}. Осталось: {len(applications)}")
-        
-        if applications:
-            await show_application_detail(query, 0, context)
-        else:
-            await safe_edit_message_text(
-                query,
-                "✅ <b>Все заявки обработаны!</b>",
-                parse_mode='HTML',
-                reply_markup=get_admin_menu()
-            )
-    else:
-        # Если список пуст, возвращаем в меню
-        await show_admin_menu(query)
-
 async def export_approved_poems(query, context: ContextTypes.DEFAULT_TYPE):
     """Экспорт принятых стихотворений"""
     try:
@@ -374,51 +259,184 @@ async def export_second_block_speakers(query, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Ошибка при экспорте списка второго блока: {e}")
         await query.answer("❌ Ошибка при экспорте")
 
-async def confirm_delete_all_applications(query):
-    """Подтверждение удаления всех заявок"""
+# Дней в графике подач на экране статистики
+STATISTICS_DAYS = 7
+
+async def show_statistics(query):
+    """Статистика по счетчикам, которые ведут триггеры базы"""
+    counters = db.get_counters()
+    applications = {
+        status: counters.get(f'applications:{status}', 0) for status in ('pending', 'approved', 'rejected')
+    }
+    event = db.get_current_event()
+    lines = [
+        f"📊 <b>Статистика вечера #{event['event_id']}</b> (открыт {str(event['opened_at'])[:10]})\n",
+        f"👤 Пользователей: {counters.get('users', 0)}",
+        f"🚫 В черном списке: {counters.get('blacklist', 0)}\n",
+        f"📨 Заявок: {sum(applications.values())}",
+        f"⏳ ждут решения: {applications['pending']}",
+        f"✅ приняты: {applications['approved']}",
+        f"❌ отклонены: {applications['rejected']}\n",
+        f"🎭 Во втором блоке: принято {counters.get('second_block:approved', 0)}, "
+        f"ждут решения {counters.get('second_block:pending', 0)}",
+    ]
+    
+    days = db.get_daily_submissions(STATISTICS_DAYS)
+    if days:
+        peak = max(row['submitted'] for row in days)
+        lines.append(f"\n<b>Подано за {STATISTICS_DAYS} дней:</b>")
+        for row in days:
+            bar = '▇' * max(1, round(row['submitted'] / peak * 10))
+            lines.append(f"<code>{row['day'][5:]}</code> {bar} {row['submitted']}")
+    
+    await safe_edit_message_text(
+        query,
+        '\n'.join(lines),
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]])
+    )
+
+async def show_program_length(query):
+    """Сводка длительности программы по сохраненному объему стихов"""
+    await safe_edit_message_text(
+        query,
+        render_program_length(),
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]])
+    )
+
+async def run_backup_now(query):
+    """Резервная копия базы и архива по кнопке, без остановки бота"""
+    back = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]])
+    if backup_manager.running:
+        await safe_edit_message_text(query, "⏳ Резервная копия уже создается, попробуйте позже.", reply_markup=back)
+        return
+    
+    await safe_edit_message_text(query, "💾 <b>Создаю резервную копию…</b>", parse_mode='HTML')
+    try:
+        result = await backup_manager.backup()
+    except Exception as e:
+        logger.error(f"Ошибка при создании резервной копии: {e}")
+        await safe_edit_message_text(
+            query, f"❌ <b>Не удалось создать копию:</b> {html.escape(str(e))}", parse_mode='HTML', reply_markup=back
+        )
+        return
+    if result is None:
+        await safe_edit_message_text(query, "⏳ Резервная копия уже создается, попробуйте позже.", reply_markup=back)
+        return
+    
+    files = '\n'.join(f"• <code>{html.escape(os.path.basename(path))}</code>" for path in result.files)
+    await safe_edit_message_text(
+        query,
+        f"✅ <b>Резервная копия готова</b> за {result.seconds:.1f} с\n\n"
+        f"{files}\n\n"
+        f"Страниц: {result.pages}, сжато: {result.size // 1024} КБ\n"
+        f"Целостность проверена. Хранятся {backup_manager.keep} последних копий "
+        f"в <code>{html.escape(backup_manager.directory)}</code>",
+        parse_mode='HTML',
+        reply_markup=back
+    )
+
+async def confirm_close_event(query):
+    """Подтверждение закрытия вечера"""
+    event = db.get_current_event()
     applications_count = db.get_applications_count()
     
     await safe_edit_message_text(
         query,
-        f"⚠️ <b>ВНИМАНИЕ!</b>\n\n"
-        f"Вы собираетесь удалить <b>ВСЕ</b> заявки ({applications_count} шт.).\n"
-        f"Это действие <b>необратимо</b>!\n\n"
+        f"📦 <b>Закрыть вечер #{event['event_id']}?</b>\n\n"
+        f"Все заявки вечера ({applications_count} шт.) переносятся в архив и "
+        f"пропадают из очереди, списков и выгрузок. В архиве их можно найти "
+        f"через поиск по стихам.\n"
+        f"Новые заявки пойдут в вечер #{event['event_id'] + 1}.\n\n"
         f"Продолжить?",
         parse_mode='HTML',
-        reply_markup=get_confirmation_keyboard("delete_all")
+        reply_markup=get_confirmation_keyboard("close_event")
     )
 
-async def delete_all_applications(query, context: ContextTypes.DEFAULT_TYPE):
-    """Удаление всех заявок"""
+async def close_event(query, context: ContextTypes.DEFAULT_TYPE):
+    """Закрытие вечера: заявки уходят в архив, открывается следующий вечер"""
     try:
-        deleted_count = db.delete_all_applications()
-        
-        # Очищаем данные навигации
-        user_id = query.from_user.id
-        if 'admin_applications' in context.user_data:
-            del context.user_data['admin_applications']
+        result = db.close_event()
         
         await safe_edit_message_text(
             query,
-            f"✅ <b>Удалено {deleted_count} заявок</b>",
+            f"✅ <b>Вечер #{result['event_id']} закрыт</b>\n\n"
+            f"В архив перенесено заявок: {result['archived']}\n"
+            f"Открыт вечер #{result['next_event_id']}",
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
         
-        logger.info(f"Админ {user_id} удалил все заявки ({deleted_count} шт.)")
+        logger.info(f"Админ {query.from_user.id} закрыл вечер #{result['event_id']}")
         
     except Exception as e:
-        logger.error(f"Ошибка при удалении всех заявок: {e}")
+        logger.error(f"Ошибка при закрытии вечера: {e}")
         await safe_edit_message_text(
             query,
-            "❌ <b>Ошибка при удалении заявок</b>",
+            "❌ <b>Ошибка при закрытии вечера</b>",
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
 
+async def show_memory_report(query, context: ContextTypes.DEFAULT_TYPE):
+    """Отчет о памяти, занятой данными пользователей"""
+    report = user_data_evictor.report(context.application)
+    
+    lines = [
+        "🧠 <b>Память бота (user_data):</b>\n",
+        f"Записей: {report['entries']} (непустых: {report['non_empty']})",
+        f"Объем: ~{report['bytes'] // 1024} КБ из {report['budget'] // 1024} КБ",
+        f"Очищено кэшей: {report['evicted_caches']}",
+        f"Очищено брошенных заявок: {report['abandoned_flows']}",
+        f"Выгружено в базу: {report['offloaded']}",
+    ]
+    if report['largest']:
+        lines.append("\n<b>Крупнейшие записи:</b>")
+        for holder in report['largest']:
+            keys = ', '.join(holder['keys']) or '—'
+            lines.append(
+                f"• {holder['user_id']}: ~{holder['bytes'] // 1024} КБ, "
+                f"простой {holder['idle_seconds'] // 60} мин ({keys})"
+            )
+    
+    await safe_edit_message_text(
+        query,
+        '\n'.join(lines),
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]])
+    )
+
+async def show_moderation_stats(query, context: ContextTypes.DEFAULT_TYPE):
+    """Очередь модерации: конкуренция за заявки и работа модераторов"""
+    stats = moderation_queue.stats()
+    
+    lines = [
+        "👥 <b>Очередь модерации:</b>\n",
+        f"Ждут решения: {stats['pending']} (закреплено сейчас: {stats['claimed']})",
+        f"Очередь целиком занята другими: {stats['blocked']} раз",
+        f"Опоздавших решений: {stats['conflicts']}",
+        f"Аренда заявки: {moderation_queue.lease_seconds // 60} мин",
+    ]
+    if stats['moderators']:
+        lines.append("\n<b>Модераторы:</b>")
+        for moderator_id, moderator in stats['moderators'].items():
+            lines.append(
+                f"• {moderator_id}: взято {moderator['claimed']}, принято {moderator['approved']}, "
+                f"отклонено {moderator['rejected']}, ~{moderator['decision_avg_s']} с на заявку"
+            )
+    
+    await safe_edit_message_text(
+        query,
+        '\n'.join(lines),
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]])
+    )
+
 async def show_blacklist_menu(query):
     """Показать меню черного списка"""
-    blacklist_count = len(db.get_blacklist())
+    state_manager.clear_state(query.from_user.id)
+    blacklist_count = db.get_blacklist_count()
     
     await safe_edit_message_text(
         query,
@@ -434,37 +452,87 @@ async def handle_blacklist_actions(query, action: str, context: ContextTypes.DEF
         await safe_edit_message_text(
             query,
             "➕ <b>Добавление в черный список</b>\n\n"
-            "Отправьте ID пользователя для добавления:",
+            "Отправьте ID, @username или часть имени пользователя:",
             parse_mode='HTML',
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🔙 Назад", callback_data="admin_blacklist")]
             ])
         )
-        # Используем оба менеджера состояний для совместимости
-        admin_state_manager.set_state(query.from_user.id, 'awaiting_blacklist_add')
-        state_manager.set_admin_state(query.from_user.id, 'awaiting_blacklist_add')
+        state_manager.set_state(query.from_user.id, AdminState.AWAITING_BLACKLIST_ADD)
         
     elif action == "blacklist_remove":
         await safe_edit_message_text(
             query,
             "➖ <b>Удаление из черного списка</b>\n\n"
-            "Отправьте ID пользователя для удаления:",
+            "Отправьте ID, @username или часть имени пользователя:",
             parse_mode='HTML',
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🔙 Назад", callback_data="admin_blacklist")]
             ])
         )
-        admin_state_manager.set_state(query.from_user.id, 'awaiting_blacklist_remove')
-        state_manager.set_admin_state(query.from_user.id, 'awaiting_blacklist_remove')
+        state_manager.set_state(query.from_user.id, AdminState.AWAITING_BLACKLIST_REMOVE)
         
     elif action == "blacklist_view":
         await show_blacklist_details(query)
+        
+    elif action == "blacklist_import":
+        await safe_edit_message_text(
+            query,
+            "📥 <b>Импорт черного списка</b>\n\n"
+            "Отправьте файл .txt или .csv: по одной записи в строке — ID или @username. "
+            "В CSV читается первый столбец, так что подойдет и выгрузка черного списка. "
+            f"Размер файла — до {BLACKLIST_IMPORT_MAX_BYTES // 1024} КБ.",
+            parse_mode='HTML',
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔙 Назад", callback_data="admin_blacklist")]
+            ])
+        )
+        state_manager.set_state(query.from_user.id, AdminState.AWAITING_BLACKLIST_FILE)
+        
+    elif action == "blacklist_export":
+        await export_blacklist(query, context)
 
-async def show_blacklist_details(query, page: int = 0):
-    """Показать детали черного списка с пагинацией и кнопкой назад"""
-    blacklist = db.get_blacklist()
-    
-    if not blacklist:
+async def export_blacklist(query, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузка черного списка файлом CSV"""
+    try:
+        file = export_blacklist_to_file()
+        if file:
+            await context.bot.send_document(
+                chat_id=query.from_user.id,
+                document=file,
+                filename="черный_список.csv",
+                caption="🚫 <b>Черный список</b>",
+                parse_mode='HTML'
+            )
+        else:
+            await safe_edit_message_text(
+                query,
+                "✅ Черный список пуст",
+                reply_markup=get_blacklist_menu()
+            )
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке черного списка: {e}")
+        await safe_edit_message_text(
+            query,
+            "❌ Ошибка при выгрузке черного списка",
+            reply_markup=get_blacklist_menu()
+        )
+
+async def show_blacklist_details(query, page: int = 0, after: Optional[int] = None, before: Optional[int] = None):
+    """
+    Показать черный список постранично: одна страница — один запрос
+    (keyset по user_id вместе с данными пользователей), размер списка
+    берется из счетчика.
+    """
+    blacklist_count = db.get_blacklist_count()
+    per_page = AdminConfig.MAX_BLACKLIST_DISPLAY
+    entries = db.get_blacklist_page(per_page, after=after, before=before) if blacklist_count else []
+    if not entries and page > 0:
+        # Список сократился, пока его листали: начинаем сначала
+        page = 0
+        entries = db.get_blacklist_page(per_page)
+    
+    if not entries:
         await safe_edit_message_text(
             query,
             "📝 <b>Черный список пуст</b>",
@@ -473,54 +541,29 @@ async def show_blacklist_details(query, page: int = 0):
         )
         return
     
-    # Пагинация
-    start_idx = page * AdminConfig.MAX_BLACKLIST_DISPLAY
-    end_idx = start_idx + AdminConfig.MAX_BLACKLIST_DISPLAY
-    paginated_blacklist = blacklist[start_idx:end_idx]
+    blacklist_text = f"🚫 <b>Черный список:</b> ({blacklist_count} пользователей)\n\n"
     
-    blacklist_text = f"🚫 <b>Черный список:</b> ({len(blacklist)} пользователей)\n\n"
-    
-    for i, user_id in enumerate(paginated_blacklist, start_idx + 1):
-        user = db.get_user(user_id)
-        if user:
-            username = f"@{user['username']}" if user['username'] else "без username"
-            name = f"{user['first_name']} {user['last_name'] or ''}".strip()
-            blacklist_text += f"{i}. {name} ({username}) - ID: {user_id}\n"
+    for i, entry in enumerate(entries, page * per_page + 1):
+        if entry['known']:
+            username = f"@{html.escape(entry['username'])}" if entry['username'] else "без username"
+            name = html.escape(f"{entry['first_name'] or ''} {entry['last_name'] or ''}".strip())
+            blacklist_text += f"{i}. {name} ({username}) - ID: {entry['user_id']}\n"
         else:
-            blacklist_text += f"{i}. Пользователь не найден - ID: {user_id}\n"
+            blacklist_text += f"{i}. Пользователь не найден - ID: {entry['user_id']}\n"
     
     # Добавляем информацию о странице
-    total_pages = max(1, (len(blacklist) + AdminConfig.MAX_BLACKLIST_DISPLAY - 1) // AdminConfig.MAX_BLACKLIST_DISPLAY)
+    total_pages = max(1, (blacklist_count + per_page - 1) // per_page)
+    page = min(page, total_pages - 1)
     if total_pages > 1:
         blacklist_text += f"\n📄 Страница {page + 1} из {total_pages}"
     
-    # Создаем клавиатуру с пагинацией и кнопкой назад
-    keyboard_buttons = []
-    
-    # Кнопки пагинации (только если больше одной страницы)
-    if total_pages > 1:
-        pagination_row = []
-        if page > 0:
-            pagination_row.append(InlineKeyboardButton("◀️ Предыдущая", callback_data=f"blacklist_page_{page-1}"))
-        
-        # Кнопка с текущей страницей (неактивная)
-        pagination_row.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="noop"))
-        
-        if page < total_pages - 1:
-            pagination_row.append(InlineKeyboardButton("Следующая ▶️", callback_data=f"blacklist_page_{page+1}"))
-        
-        keyboard_buttons.append(pagination_row)
-    
-    # Кнопка "Назад" - всегда в отдельном ряду
-    keyboard_buttons.append([InlineKeyboardButton("🔙 Назад в меню ЧС", callback_data="admin_blacklist")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard_buttons)
-    
     await safe_edit_message_text(
         query,
         blacklist_text,
         parse_mode='HTML',
-        reply_markup=reply_markup
+        reply_markup=get_blacklist_pagination_keyboard(
+            page, total_pages, entries[0]['user_id'], entries[-1]['user_id']
+        )
     )
 
 async def handle_admin_broadcast_callback(query):
@@ -539,9 +582,7 @@ async def handle_admin_broadcast_callback(query):
         ])
     )
     
-    # Используем оба менеджера состояний для совместимости
-    admin_state_manager.set_state(query.from_user.id, 'awaiting_broadcast')
-    state_manager.set_admin_state(query.from_user.id, 'awaiting_broadcast')
+    state_manager.set_state(query.from_user.id, AdminState.AWAITING_BROADCAST)
 
 # Функции для обработки сообщений
 async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -552,36 +593,35 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
     if user.id != ADMIN_ID:
         return
     
-    # Проверяем состояние в обоих менеджерах для совместимости
-    state_data = admin_state_manager.get_state(user.id)
-    old_state = state_manager.get_admin_state(user.id)
-    
-    is_broadcast_state = (
-        (state_data and state_data['state'] == 'awaiting_broadcast') or
-        old_state == 'awaiting_broadcast'
-    )
-    
-    if is_broadcast_state:
+    if state_manager.get_state(user.id) == AdminState.AWAITING_BROADCAST:
         logger.info(f"Админ {user.id} начинает рассылку: {message_text[:100]}...")
         
-        # Сбрасываем состояние в обоих менеджерах
-        admin_state_manager.clear_state(user.id)
-        state_manager.clear_admin_state(user.id)
+        state_manager.clear_state(user.id)
         
         # Показываем сообщение о начале рассылки
         processing_msg = await update.message.reply_text("🔄 <b>Начинаем рассылку...</b>", parse_mode='HTML')
         
-        # Выполняем рассылку
-        stats = await send_broadcast(context, message_text)
-        
-        await processing_msg.edit_text(
-            f"✅ <b>Рассылка завершена!</b>\n\n"
-            f"• ✅ Успешно: {stats['success']}\n"
-            f"• ❌ Не удалось: {stats['failed']}\n"
-            f"• 📊 Всего: {stats['total']}",
-            parse_mode='HTML'
+        # Рассылка идет в фоне: апдейты админа обрабатываются по очереди,
+        # и долгая рассылка не должна блокировать его меню
+        context.application.create_task(
+            _run_broadcast(context, message_text, processing_msg),
+            update=update
         )
 
+async def _run_broadcast(context: ContextTypes.DEFAULT_TYPE, message_text: str, processing_msg):
+    """Выполнение рассылки и отчет о результате"""
+    # Рассылка не занимает соединения, зарезервированные для ответов пользователям
+    with bulk_traffic():
+        stats = await send_broadcast(context, message_text)
+    
+    await processing_msg.edit_text(
+        f"✅ <b>Рассылка завершена!</b>\n\n"
+        f"• ✅ Успешно: {stats['success']}\n"
+        f"• ❌ Не удалось: {stats['failed']}\n"
+        f"• 📊 Всего: {stats['total']}",
+        parse_mode='HTML'
+    )
+
 async def handle_blacklist_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик сообщений для черного списка"""
     user = update.effective_user
@@ -590,109 +630,228 @@ async def handle_blacklist_message(update: Update, context: ContextTypes.DEFAULT
     if user.id != ADMIN_ID:
         return
     
-    # Проверяем состояние в обоих менеджерах для совместимости
-    state_data = admin_state_manager.get_state(user.id)
-    old_state = state_manager.get_admin_state(user.id)
+    state = state_manager.get_state(user.id)
+    if state == AdminState.AWAITING_BLACKLIST_ADD:
+        await _handle_blacklist_add(update, message_text)
+    elif state == AdminState.AWAITING_BLACKLIST_REMOVE:
+        await _handle_blacklist_remove(update, message_text)
+
+def _import_report_text(report) -> str:
+    parsed = report.parsed
+    text = (
+        f"📥 <b>Импорт черного списка</b>\n\n"
+        f"Строк в файле: {parsed.lines}\n"
+        f"Записей: {len(parsed.user_ids)} ID, {len(parsed.usernames)} username\n"
+        f"✅ Добавлено: {report.added}\n"
+        f"Уже были в списке: {report.already}\n"
+    )
+    if report.protected:
+        text += f"🛡 Пропущены организатор и модераторы: {report.protected}\n"
+    if parsed.invalid:
+        text += f"⚠️ Нераспознанных строк: {parsed.invalid}\n"
+    unknown = [f"@{name}" for name in report.unknown_usernames]
+    if unknown:
+        shown = ', '.join(unknown[:MAX_EXAMPLES])
+        more = f" и еще {len(unknown) - MAX_EXAMPLES}" if len(unknown) > MAX_EXAMPLES else ''
+        text += f"❓ Нет среди пользователей бота ({len(unknown)}): {html.escape(shown)}{more}\n"
+    return text
+
+async def handle_blacklist_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импорт черного списка из присланного файла"""
+    user = update.effective_user
+    document = update.message.document
     
-    if not state_data and not old_state:
+    if user.id != ADMIN_ID or state_manager.get_state(user.id) != AdminState.AWAITING_BLACKLIST_FILE:
         return
     
-    # Определяем тип действия
-    action = None
-    if state_data:
-        if state_data['state'] == 'awaiting_blacklist_add':
-            action = 'add'
-        elif state_data['state'] == 'awaiting_blacklist_remove':
-            action = 'remove'
-    elif old_state:
-        if old_state == 'awaiting_blacklist_add':
-            action = 'add'
-        elif old_state == 'awaiting_blacklist_remove':
-            action = 'remove'
+    if document.file_size and document.file_size > BLACKLIST_IMPORT_MAX_BYTES:
+        await update.message.reply_text(
+            f"❌ Файл больше {BLACKLIST_IMPORT_MAX_BYTES // 1024} КБ. Разделите его на части.",
+            reply_markup=get_blacklist_menu()
+        )
+        state_manager.clear_state(user.id)
+        return
     
-    if action == 'add':
-        await _handle_blacklist_add(update, message_text)
-    elif action == 'remove':
-        await _handle_blacklist_remove(update, message_text)
+    try:
+        file = await context.bot.get_file(document.file_id)
+        buffer = io.BytesIO()
+        await file.download_to_memory(buffer)
+        buffer.seek(0)
+        
+        # Разбор файла — в отдельном потоке, сверка с базой — в основном
+        lines = io.TextIOWrapper(buffer, encoding='utf-8-sig', errors='replace')
+        parsed = await asyncio.to_thread(parse_entries, lines)
+        report = import_blacklist(parsed, MODERATOR_IDS)
+        logger.info(
+            f"Импорт черного списка: добавлено {report.added}, уже было {report.already}, "
+            f"не найдено {len(report.unknown_usernames)}"
+        )
+        await update.message.reply_text(
+            _import_report_text(report),
+            parse_mode='HTML',
+            reply_markup=get_blacklist_menu()
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при импорте черного списка: {e}")
+        await update.message.reply_text(
+            f"❌ <b>Ошибка:</b> {html.escape(str(e))}",
+            parse_mode='HTML',
+            reply_markup=get_blacklist_menu()
+        )
+    state_manager.clear_state(user.id)
+
+def _is_exact_match(text: str, user) -> bool:
+    """Ввод однозначно указывает на пользователя: его ID или точный @username"""
+    text = text.strip()
+    if text.isdigit():
+        return int(text) == user['user_id']
+    return bool(user['username']) and text.lstrip('@').lower() == user['username'].lower()
+
+def _blacklist_result_text(user, added: bool) -> str:
+    action = "добавлен в черный список" if added else "удален из черного списка"
+    return (
+        f"✅ <b>Пользователь {action}</b>\n\n"
+        f"👤 {html.escape(user['first_name'] or '')} {html.escape(user['last_name'] or '')}\n"
+        f"📛 @{html.escape(user['username'] or 'нет')}\n"
+        f"🆔 ID: {user['user_id']}"
+    )
 
-async def _handle_blacklist_add(update: Update, user_id_str: str):
-    """Обработка добавления в черный список"""
+async def _reply_user_choices(update: Update, users, action: str):
+    """Несколько подходящих пользователей — выбор кнопками"""
+    keyboard = [
+        [InlineKeyboardButton(describe_user(user)[:60], callback_data=f"blacklist_pick_{action}_{user['user_id']}")]
+        for user in users
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="admin_blacklist")])
+    await update.message.reply_text(
+        f"🔎 <b>Найдено пользователей: {len(users)}.</b> Выберите нужного "
+        f"или уточните запрос:",
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+PROTECTED_TEXT = "⛔ <b>Организатора и модераторов нельзя добавить в черный список.</b>"
+
+async def _handle_blacklist_add(update: Update, text: str):
+    """Обработка добавления в черный список: ID, @username или часть имени"""
     try:
-        user_id_to_add = int(user_id_str)
+        # ID добавляется и без записи в users: так можно закрыть доступ заранее
+        if text.strip().isdigit():
+            user_id_to_add = int(text)
+            if user_id_to_add in MODERATOR_IDS:
+                await update.message.reply_text(PROTECTED_TEXT, parse_mode='HTML', reply_markup=get_admin_menu())
+                state_manager.clear_state(update.effective_user.id)
+                return
+            db.add_to_blacklist(user_id_to_add)
+            user = db.get_user(user_id_to_add)
+            await update.message.reply_text(
+                _blacklist_result_text(user, added=True) if user
+                else f"✅ <b>Пользователь {user_id_to_add} добавлен в черный список</b>",
+                parse_mode='HTML',
+                reply_markup=get_admin_menu()
+            )
+            state_manager.clear_state(update.effective_user.id)
+            return
         
-        # Проверяем, существует ли пользователь
-        user = db.get_user(user_id_to_add)
-        if not user:
+        users = find_users(text)
+        if not users:
             await update.message.reply_text(
-                "❌ <b>Пользователь с таким ID не найден.</b>\n\n"
-                "Проверьте ID и попробуйте снова:",
+                "❌ <b>Пользователь не найден.</b>\n\n"
+                "Отправьте ID, @username или часть имени (от 3 букв):",
                 parse_mode='HTML'
             )
             return
         
-        db.add_to_blacklist(user_id_to_add)
+        if len(users) > 1 or not _is_exact_match(text, users[0]):
+            await _reply_user_choices(update, users, 'add')
+            return
         
+        user = users[0]
+        if user['user_id'] in MODERATOR_IDS:
+            await update.message.reply_text(PROTECTED_TEXT, parse_mode='HTML', reply_markup=get_admin_menu())
+            state_manager.clear_state(update.effective_user.id)
+            return
+        db.add_to_blacklist(user['user_id'])
         await update.message.reply_text(
-            f"✅ <b>Пользователь добавлен в черный список</b>\n\n"
-            f"👤 {user['first_name']} {user['last_name'] or ''}\n"
-            f"📛 @{user['username'] or 'нет'}\n"
-            f"🆔 ID: {user_id_to_add}",
+            _blacklist_result_text(user, added=True),
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
+        state_manager.clear_state(update.effective_user.id)
         
-        # Очищаем состояние в обоих менеджерах
-        admin_state_manager.clear_state(update.effective_user.id)
-        state_manager.clear_admin_state(update.effective_user.id)
-        
-    except ValueError:
-        await update.message.reply_text(
-            "❌ <b>Неверный формат ID.</b> Отправьте числовой ID:",
-            parse_mode='HTML'
-        )
     except Exception as e:
         logger.error(f"Ошибка при добавлении в черный список: {e}")
         await update.message.reply_text(
-            f"❌ <b>Ошибка:</b> {str(e)}",
+            f"❌ <b>Ошибка:</b> {html.escape(str(e))}",
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
-        admin_state_manager.clear_state(update.effective_user.id)
-        state_manager.clear_admin_state(update.effective_user.id)
+        state_manager.clear_state(update.effective_user.id)
 
-async def _handle_blacklist_remove(update: Update, user_id_str: str):
-    """Обработка удаления из черного списка"""
+async def _handle_blacklist_remove(update: Update, text: str):
+    """Обработка удаления из черного списка: ID, @username или часть имени"""
     try:
-        user_id_to_remove = int(user_id_str)
-        db.remove_from_blacklist(user_id_to_remove)
+        # ID удаляется и без записи в users, как раньше
+        if text.strip().isdigit():
+            user_id_to_remove = int(text)
+            db.remove_from_blacklist(user_id_to_remove)
+            await update.message.reply_text(
+                f"✅ <b>Пользователь {user_id_to_remove} удален из черного списка</b>",
+                parse_mode='HTML',
+                reply_markup=get_admin_menu()
+            )
+            state_manager.clear_state(update.effective_user.id)
+            return
+        
+        users = [user for user in find_users(text) if db.is_user_blacklisted(user['user_id'])]
+        if not users:
+            await update.message.reply_text(
+                "❌ <b>В черном списке такого пользователя нет.</b>\n\n"
+                "Отправьте ID, @username или часть имени (от 3 букв):",
+                parse_mode='HTML'
+            )
+            return
         
+        if len(users) > 1 or not _is_exact_match(text, users[0]):
+            await _reply_user_choices(update, users, 'remove')
+            return
+        
+        db.remove_from_blacklist(users[0]['user_id'])
         await update.message.reply_text(
-            f"✅ <b>Пользователь {user_id_to_remove} удален из черного списка</b>",
+            _blacklist_result_text(users[0], added=False),
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
+        state_manager.clear_state(update.effective_user.id)
         
-        # Очищаем состояние в обоих менеджерах
-        admin_state_manager.clear_state(update.effective_user.id)
-        state_manager.clear_admin_state(update.effective_user.id)
-        
-    except ValueError:
-        await update.message.reply_text(
-            "❌ <b>Неверный формат ID.</b> Отправьте числовой ID:",
-            parse_mode='HTML'
-        )
     except Exception as e:
         logger.error(f"Ошибка при удалении из черного списка: {e}")
         await update.message.reply_text(
-            f"❌ <b>Ошибка:</b> {str(e)}",
+            f"❌ <b>Ошибка:</b> {html.escape(str(e))}",
             parse_mode='HTML',
             reply_markup=get_admin_menu()
         )
-        admin_state_manager.clear_state(update.effective_user.id)
-        state_manager.clear_admin_state(update.effective_user.id)
-
-# Функция для периодической очистки состояний
-def cleanup_admin_states():
+        state_manager.clear_state(update.effective_user.id)
 
-    """Очистка просроченных состояний администратора"""
-    admin_state_manager.cleanup_expired()
+async def handle_blacklist_pick(query, action: str, user_id: int):
+    """Выбор пользователя из найденных кнопкой"""
+    user = db.get_user(user_id)
+    if not user:
+        await safe_edit_message_text(query, "❌ Пользователь не найден.", reply_markup=get_blacklist_menu())
+        return
+    
+    if action == 'add':
+        if user_id in MODERATOR_IDS:
+            await safe_edit_message_text(query, PROTECTED_TEXT, parse_mode='HTML', reply_markup=get_blacklist_menu())
+            return
+        db.add_to_blacklist(user_id)
+    else:
+        db.remove_from_blacklist(user_id)
+    state_manager.clear_state(query.from_user.id)
+    
+    await safe_edit_message_text(
+        query,
+        _blacklist_result_text(user, added=action == 'add'),
+        parse_mode='HTML',
+        reply_markup=get_blacklist_menu()
+    )
@@ -0,0 +1,200 @@
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import CallbackQuery, Update
+from telegram.ext import ContextTypes
+
+from . import admin_handlers, content_edit_handlers, search_handlers, user_handlers
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable]
+Guard = Callable[[CallbackQuery], Awaitable[bool]]
+
+
+@dataclass(frozen=True)
+class CallbackRoute:
+    handler: Handler
+    guard: Optional[Guard] = None
+    # Число целых аргументов после префикса: card_3_0 -> 2
+    arity: int = 0
+    # False — обработчик сам отвечает на запрос (всплывающим текстом)
+    answer: bool = True
+
+
+class CallbackRouter:
+    """
+    Маршрутизация callback-запросов по таблице.
+
+    Кнопки без параметров ищутся в словаре по точному значению.
+    Кнопки с параметрами имеют вид префикс_число[_число...]: числа
+    отрезаются справа, пока остаток не совпадет с префиксом маршрута
+    с тем же числом аргументов. Обработчик получает уже разобранные
+    int-аргументы. Ответ на запрос и проверка прав выполняются здесь,
+    один раз для всех кнопок. Маршрут с answer=False отвечает сам:
+    Telegram принимает только один ответ на запрос, и пустой ответ
+    роутера съел бы всплывающее сообщение обработчика.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, CallbackRoute] = {}
+        self._prefixes: Dict[str, CallbackRoute] = {}
+        self._max_arity = 0
+
+    def exact(self, data: str, handler: Handler, guard: Optional[Guard] = None, answer: bool = True):
+        """Маршрут для кнопки без параметров"""
+        if data in self._exact:
+            raise ValueError(f"Маршрут '{data}' уже зарегистрирован")
+        self._exact[data] = CallbackRoute(handler, guard, answer=answer)
+
+    def prefix(self, prefix: str, handler: Handler, guard: Optional[Guard] = None, arity: int = 1,
+               answer: bool = True):
+        """Маршрут для кнопки вида prefix_<int>[_<int>...]"""
+        if prefix in self._prefixes:
+            raise ValueError(f"Префикс '{prefix}' уже зарегистрирован")
+        if arity < 1:
+            raise ValueError("У маршрута с префиксом должен быть хотя бы один аргумент")
+        self._prefixes[prefix] = CallbackRoute(handler, guard, arity, answer)
+        self._max_arity = max(self._max_arity, arity)
+
+    def resolve(self, data: str) -> Optional[Tuple[CallbackRoute, Tuple[int, ...]]]:
+        """Найти маршрут и аргументы для callback_data"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ()
+
+        head, args = data, []
+        while len(args) < self._max_arity:
+            head, sep, tail = head.rpartition('_')
+            if not sep or not (tail.isascii() and tail.isdigit()):
+                return None
+            args.append(int(tail))
+            route = self._prefixes.get(head)
+            if route is not None and route.arity == len(args):
+                return route, tuple(reversed(args))
+        return None
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Единый обработчик всех callback-запросов"""
+        query = update.callback_query
+        resolved = self.resolve(query.data or '')
+        if resolved is None:
+            await query.answer()
+            logger.warning(f"Неизвестный callback: {query.data}")
+            return
+
+        route, args = resolved
+        if route.answer:
+            await query.answer()
+        if route.guard is not None and not await route.guard(query):
+            if not route.answer:
+                await query.answer()
+            return
+        await route.handler(update, context, *args)
+
+
+async def _admin_guard(query: CallbackQuery) -> bool:
+    return await admin_handlers._validate_admin_access(query.from_user.id, query)
+
+
+async def _moderator_guard(query: CallbackQuery) -> bool:
+    return await admin_handlers._validate_moderator_access(query.from_user.id, query)
+
+
+async def _noop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки-заглушки (номер страницы, счетчик)"""
+
+
+def build_callback_router() -> CallbackRouter:
+    """Таблица маршрутов всех кнопок бота"""
+    router = CallbackRouter()
+    user_guard = user_handlers.check_not_blacklisted
+
+    # Главное меню пользователя
+    router.exact('main_menu', lambda update, context: user_handlers.show_main_menu(
+        update.callback_query, update.callback_query.from_user.id), user_guard)
+    router.exact('apply', lambda update, context: user_handlers.start_application(
+        update.callback_query, context), user_guard)
+    router.exact('about', lambda update, context: user_handlers.show_about(update.callback_query), user_guard)
+    router.exact('rules', lambda update, context: user_handlers.show_rules(update.callback_query), user_guard)
+    # Права админа проверяет сам обработчик: кнопка видна и в пользовательском меню
+    router.exact('admin_menu', lambda update, context: user_handlers.show_admin_menu(
+        update.callback_query), user_guard)
+
+    # Подача заявки: второй блок и отмена
+    for data in ('second_block_yes', 'second_block_no', 'cancel_application'):
+        router.exact(data, user_handlers.handle_second_block_choice)
+
+    # Админ-меню
+    admin_routes = {
+        'admin_statistics': lambda update, context: admin_handlers.show_statistics(update.callback_query),
+        'admin_program_length': lambda update, context: admin_handlers.show_program_length(
+            update.callback_query),
+        'admin_close_event': lambda update, context: admin_handlers.confirm_close_event(update.callback_query),
+        'confirm_close_event': lambda update, context: admin_handlers.close_event(update.callback_query, context),
+        'admin_blacklist': lambda update, context: admin_handlers.show_blacklist_menu(update.callback_query),
+        'admin_broadcast': lambda update, context: admin_handlers.handle_admin_broadcast_callback(
+            update.callback_query),
+        'admin_backup': lambda update, context: admin_handlers.run_backup_now(update.callback_query),
+        'admin_memory': lambda update, context: admin_handlers.show_memory_report(update.callback_query, context),
+        'admin_poem_search': lambda update, context: search_handlers.start_poem_search(update.callback_query),
+        'admin_moderation_stats': lambda update, context: admin_handlers.show_moderation_stats(
+            update.callback_query, context),
+        # Редактирование контента
+        'admin_rules': lambda update, context: content_edit_handlers.start_rules_editing(update.callback_query),
+        'admin_about': lambda update, context: content_edit_handlers.start_about_editing(update.callback_query),
+        'cancel_edit': lambda update, context: content_edit_handlers.cancel_editing(update.callback_query),
+    }
+    for action in ('blacklist_add', 'blacklist_remove', 'blacklist_view', 'blacklist_import', 'blacklist_export'):
+        admin_routes[action] = lambda update, context, action=action: admin_handlers.handle_blacklist_actions(
+            update.callback_query, action, context)
+    for data, handler in admin_routes.items():
+        router.exact(data, handler, _admin_guard)
+    # Выгрузки сами отвечают на нажатие: «Файл отправлен» или причина отказа
+    router.exact('admin_approved_poems', lambda update, context: admin_handlers.export_approved_poems(
+        update.callback_query, context), _admin_guard, answer=False)
+    router.exact('admin_second_block', lambda update, context: admin_handlers.export_second_block_speakers(
+        update.callback_query, context), _admin_guard, answer=False)
+
+    # Очередь модерации: доступна всем модераторам, не только организатору
+    router.exact('admin_pending_applications', lambda update, context: admin_handlers.show_pending_applications(
+        update.callback_query, context), _moderator_guard)
+    router.prefix('card', lambda update, context, application_id, page: admin_handlers.show_application_detail(
+        update.callback_query, application_id, context, page), _moderator_guard, arity=2)
+    router.prefix('skip', lambda update, context, application_id: admin_handlers.skip_application(
+        update.callback_query, application_id, context), _moderator_guard)
+    router.prefix('approve', lambda update, context, application_id: admin_handlers.handle_application_action(
+        update.callback_query, application_id, 'approve', context), _moderator_guard, answer=False)
+    router.prefix('reject', lambda update, context, application_id: admin_handlers.handle_application_action(
+        update.callback_query, application_id, 'reject', context), _moderator_guard, answer=False)
+
+    # Результаты поиска по стихам
+    router.prefix('psearch_page', lambda update, context, page: search_handlers.show_poem_search_page(
+        update.callback_query, context, page), _admin_guard)
+    router.prefix('psearch_status', lambda update, context, index: search_handlers.set_poem_search_filter(
+        update.callback_query, context, 'status', index), _admin_guard)
+    router.prefix('psearch_block', lambda update, context, index: search_handlers.set_poem_search_filter(
+        update.callback_query, context, 'block', index), _admin_guard)
+    router.prefix('psearch_source', lambda update, context, index: search_handlers.set_poem_search_filter(
+        update.callback_query, context, 'source', index), _admin_guard)
+
+    # Черный список: выбор найденного пользователя и страницы
+    router.prefix('blacklist_pick_add', lambda update, context, user_id: admin_handlers.handle_blacklist_pick(
+        update.callback_query, 'add', user_id), _admin_guard)
+    router.prefix('blacklist_pick_remove', lambda update, context, user_id: admin_handlers.handle_blacklist_pick(
+        update.callback_query, 'remove', user_id), _admin_guard)
+    router.prefix('blacklist_page', lambda update, context, page, after: admin_handlers.show_blacklist_details(
+        update.callback_query, page, after=after), _admin_guard, arity=2)
+    router.prefix('blacklist_back', lambda update, context, page, before: admin_handlers.show_blacklist_details(
+        update.callback_query, page, before=before), _admin_guard, arity=2)
+
+    # Кнопки-заглушки
+    router.exact('noop', _noop)
+    router.exact('count', _noop)
+
+    return router
+
+
+# Глобальный экземпляр
+callback_router = build_callback_router()
@@ -2,33 +2,12 @@ import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
-from models import Database
+from models import db
 from keyboards.admin_keyboards import get_admin_menu
 from config import ADMIN_ID
-from .state_manager import state_manager
+from .state_manager import state_manager, AdminState
 
 logger = logging.getLogger(__name__)
-db = Database()
-
-async def handle_content_edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Главный обработчик для редактуры контента"""
-    query = update.callback_query
-    await query.answer()
-    
-    user_id = query.from_user.id
-    if user_id != ADMIN_ID:
-        await query.edit_message_text("⛔ У вас нет прав доступа.")
-        return
-    
-    callback_data = query.data
-    logger.info(f"Редактирование контента: {callback_data}")
-    
-    if callback_data == "admin_rules":
-        await start_rules_editing(query)
-    elif callback_data == "admin_about":
-        await start_about_editing(query)
-    elif callback_data == "cancel_edit":
-        await cancel_editing(query)
 
 async def start_rules_editing(query):
     """Начало редактирования правил"""
@@ -44,7 +23,7 @@ async def start_rules_editing(query):
         ])
     )
     
-    state_manager.set_edit_state(query.from_user.id, 'editing_rules')
+    state_manager.set_state(query.from_user.id, AdminState.EDITING_RULES)
     logger.info(f"Админ {query.from_user.id} начал редактирование правил")
 
 async def start_about_editing(query):
@@ -61,13 +40,13 @@ async def start_about_editing(query):
         ])
     )
     
-    state_manager.set_edit_state(query.from_user.id, 'editing_about')
+    state_manager.set_state(query.from_user.id, AdminState.EDITING_ABOUT)
     logger.info(f"Админ {query.from_user.id} начал редактирование информации об организаторе")
 
 async def cancel_editing(query):
     """Отмена редактирования"""
     user_id = query.from_user.id
-    state_manager.clear_edit_state(user_id)
+    state_manager.clear_state(user_id)
     
     await query.edit_message_text(
         "❌ Редактирование отменено.",
@@ -83,14 +62,14 @@ async def handle_content_text_input(update: Update, context: ContextTypes.DEFAUL
     if user.id != ADMIN_ID:
         return
     
-    current_edit_state = state_manager.get_edit_state(user.id)
+    current_edit_state = state_manager.get_state(user.id)
     
     if not current_edit_state:
         # Если нет активного состояния редактирования, пропускаем
         return
     
     try:
-        if current_edit_state == 'editing_rules':
+        if current_edit_state == AdminState.EDITING_RULES:
             success = await save_rules(user.id, message_text, context)
             if success:
                 await update.message.reply_text(
@@ -105,7 +84,7 @@ async def handle_content_text_input(update: Update, context: ContextTypes.DEFAUL
                     reply_markup=get_admin_menu()
                 )
                 
-        elif current_edit_state == 'editing_about':
+        elif current_edit_state == AdminState.EDITING_ABOUT:
             success = await save_about(user.id, message_text, context)
             if success:
                 await update.message.reply_text(
@@ -122,7 +101,7 @@ async def handle_content_text_input(update: Update, context: ContextTypes.DEFAUL
                 
     except Exception as e:
         logger.error(f"Ошибка при сохранении контента: {e}")
-        state_manager.clear_edit_state(user.id)
+        state_manager.clear_state(user.id)
         await update.message.reply_text(
             f"❌ <b>Произошла ошибка:</b> {e}",
             parse_mode='HTML',
@@ -133,7 +112,7 @@ async def save_rules(user_id: int, new_rules: str, context: ContextTypes.DEFAULT
     """Сохранение новых правил"""
     try:
         db.update_content('rules', new_rules)
-        state_manager.clear_edit_state(user_id)
+        state_manager.clear_state(user_id)
         
         # Проверяем сохранение
         updated_rules = db.get_content('rules')
@@ -148,14 +127,14 @@ async def save_rules(user_id: int, new_rules: str, context: ContextTypes.DEFAULT
         
     except Exception as e:
         logger.error(f"Ошибка при сохранении правил: {e}")
-        state_manager.clear_edit_state(user_id)
+        state_manager.clear_state(user_id)
         return False
 
 async def save_about(user_id: int, new_about: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Сохранение новой информации об организаторе"""
     try:
         db.update_content('about_organizer', new_about)
-        state_manager.clear_edit_state(user_id)
+        state_manager.clear_state(user_id)
         
         # Проверяем сохранение
         updated_about = db.get_content('about_organizer')
@@ -170,5 +149,5 @@ async def save_about(user_id: int, new_about: str, context: ContextTypes.DEFAULT
         
     except Exception as e:
         logger.error(f"Ошибка при сохранении информации об организаторе: {e}")
-        state_manager.clear_edit_state(user_id)
+        state_manager.clear_state(user_id)
         return False
\ No newline at end of file
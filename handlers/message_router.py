@@ -3,10 +3,11 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from config import ADMIN_ID
-from .state_manager import state_manager
+from .state_manager import state_manager, AdminState
 from .user_handlers import handle_application_text
 from .content_edit_handlers import handle_content_text_input
-from .admin_handlers import handle_broadcast_message, handle_blacklist_message
+from .admin_handlers import handle_broadcast_message, handle_blacklist_message, handle_blacklist_file
+from .search_handlers import handle_poem_search_input
 
 logger = logging.getLogger(__name__)
 
@@ -29,28 +30,30 @@ async def route_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info("Админ в режиме пользователя - маршрутизируем в handle_application_text")
         return await handle_application_text(update, context)
     
-    # Проверяем состояния редактирования
-    edit_state = state_manager.get_edit_state(user.id)
-    admin_state = state_manager.get_admin_state(user.id)
-    
-    logger.info(f"Состояние редактирования: {edit_state}")
-    logger.info(f"Состояние админа: {admin_state}")
+    # Проверяем состояние ввода
+    state = state_manager.get_state(user.id)
+    logger.info(f"Состояние админа: {state}")
     
     # Приоритет 1: Редактирование контента
-    if edit_state in ['editing_rules', 'editing_about']:
-        logger.info(f"Маршрутизируем в handle_content_text_input (состояние: {edit_state})")
+    if state in (AdminState.EDITING_RULES, AdminState.EDITING_ABOUT):
+        logger.info(f"Маршрутизируем в handle_content_text_input (состояние: {state})")
         return await handle_content_text_input(update, context)
     
     # Приоритет 2: Рассылка
-    if admin_state == 'awaiting_broadcast':
+    if state == AdminState.AWAITING_BROADCAST:
         logger.info("Маршрутизируем в handle_broadcast_message")
         return await handle_broadcast_message(update, context)
     
     # Приоритет 3: Черный список
-    if admin_state in ['awaiting_blacklist_add', 'awaiting_blacklist_remove']:
+    if state in (AdminState.AWAITING_BLACKLIST_ADD, AdminState.AWAITING_BLACKLIST_REMOVE):
         logger.info("Маршрутизируем в handle_blacklist_message")
         return await handle_blacklist_message(update, context)
     
+    # Приоритет 4: Поиск по стихам
+    if state == AdminState.AWAITING_POEM_SEARCH:
+        logger.info("Маршрутизируем в handle_poem_search_input")
+        return await handle_poem_search_input(update, context)
+    
     # Если нет активных состояний - игнорируем сообщение
     logger.info("Админское сообщение без активного состояния - игнорируем")
     await update.message.reply_text(
@@ -58,6 +61,16 @@ async def route_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=await get_admin_main_menu()
     )
 
+async def route_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Файлы принимаются только от админа, который ждет импорта черного списка"""
+    user = update.effective_user
+    if user.id != ADMIN_ID or context.user_data.get('admin_as_user'):
+        return
+    
+    if state_manager.get_state(user.id) == AdminState.AWAITING_BLACKLIST_FILE:
+        logger.info("Маршрутизируем файл в handle_blacklist_file")
+        return await handle_blacklist_file(update, context)
+
 async def get_admin_main_menu():
     """Получение главного меню для админа"""
     from keyboards.admin_keyboards import get_admin_menu
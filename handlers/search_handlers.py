@@ -0,0 +1,129 @@
+import html
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+
+from models import db
+from keyboards.admin_keyboards import get_poem_search_keyboard
+from config import ADMIN_ID
+from utils.poem_search import build_match, highlight, mark_matches
+from .admin_handlers import safe_edit_message_text
+from .state_manager import state_manager, AdminState
+
+logger = logging.getLogger(__name__)
+
+RESULTS_PER_PAGE = 5
+
+# Фильтры переключаются по кругу кнопками под результатами
+STATUS_FILTERS = (
+    (None, "все статусы"),
+    ('pending', "ждут решения"),
+    ('approved', "приняты"),
+    ('rejected', "отклонены"),
+)
+BLOCK_FILTERS = (
+    (None, "любой блок"),
+    (True, "второй блок"),
+    (False, "без второго блока"),
+)
+SOURCE_FILTERS = (
+    (False, "текущий вечер"),
+    (True, "архив"),
+)
+STATUS_LABELS = {'pending': '⏳', 'approved': '✅', 'rejected': '❌'}
+
+
+async def start_poem_search(query):
+    """Начало поиска по стихам"""
+    await safe_edit_message_text(
+        query,
+        "🔎 <b>Поиск по стихам</b>\n\n"
+        "Отправьте слова из стихотворения (можно начало слова):",
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]
+        ])
+    )
+    state_manager.set_state(query.from_user.id, AdminState.AWAITING_POEM_SEARCH)
+
+
+async def handle_poem_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запрос поиска от админа (вызывается из message_router)"""
+    user = update.effective_user
+    if user.id != ADMIN_ID:
+        return
+
+    text = update.message.text.strip()
+    if build_match(text) is None:
+        await update.message.reply_text("❌ В запросе нет слов. Отправьте слова из стихотворения:")
+        return
+
+    # Фильтры сохраняются между запросами; состояние продлевается,
+    # чтобы можно было сразу уточнить запрос
+    search = context.user_data.get('poem_search') or {'status': 0, 'block': 0, 'source': 0}
+    context.user_data['poem_search'] = {**search, 'query': text}
+    state_manager.set_state(user.id, AdminState.AWAITING_POEM_SEARCH)
+
+    result_text, keyboard = _render_results(context.user_data['poem_search'], 0)
+    await update.message.reply_text(result_text, parse_mode='HTML', reply_markup=keyboard)
+
+
+async def show_poem_search_page(query, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Страница результатов последнего запроса"""
+    search = context.user_data.get('poem_search')
+    if not search or 'query' not in search:
+        await start_poem_search(query)
+        return
+
+    result_text, keyboard = _render_results(search, page)
+    await safe_edit_message_text(query, result_text, parse_mode='HTML', reply_markup=keyboard)
+
+
+FILTERS = {'status': STATUS_FILTERS, 'block': BLOCK_FILTERS, 'source': SOURCE_FILTERS}
+
+
+async def set_poem_search_filter(query, context: ContextTypes.DEFAULT_TYPE, name: str, index: int):
+    """Переключить фильтр (статус, второй блок, текущий вечер/архив) и показать первую страницу"""
+    search = context.user_data.get('poem_search')
+    if not search:
+        await start_poem_search(query)
+        return
+    search[name] = index % len(FILTERS[name])
+    await show_poem_search_page(query, context, 0)
+
+
+def _render_results(search: dict, page: int):
+    """Текст страницы результатов и клавиатура к ней"""
+    status, status_label = STATUS_FILTERS[search['status']]
+    second_block, block_label = BLOCK_FILTERS[search['block']]
+    archive, source_label = SOURCE_FILTERS[search.get('source', 0)]
+    search_method = db.search_archived_poems if archive else db.search_poems
+    rows, total = search_method(
+        build_match(search['query']), status, second_block,
+        limit=RESULTS_PER_PAGE, offset=page * RESULTS_PER_PAGE
+    )
+    total_pages = max(1, -(-total // RESULTS_PER_PAGE))
+
+    lines = [
+        f"🔎 <b>«{html.escape(search['query'])}»</b>: найдено {total}",
+        f"<i>{source_label}, {status_label}, {block_label}</i>\n",
+    ]
+    for row in rows:
+        snippet = mark_matches(row['poem_text'], search['query']) if archive else row['snippet']
+        event = f"вечер #{row['event_id']}, " if archive else ''
+        lines.append(
+            f"{STATUS_LABELS.get(row['status'], '•')} <b>#{row['application_id']}</b> "
+            f"{html.escape(row['first_name'])}{' · 🎭' if row['second_block'] else ''}, "
+            f"{event}{html.escape(str(row['created_at'])[:10])}\n"
+            f"{highlight(snippet)}\n"
+        )
+    if not rows:
+        lines.append("Ничего не найдено. Отправьте другой запрос или смените фильтры.")
+
+    keyboard = get_poem_search_keyboard(
+        page, total_pages,
+        status_label, (search['status'] + 1) % len(STATUS_FILTERS),
+        block_label, (search['block'] + 1) % len(BLOCK_FILTERS),
+        source_label, (search.get('source', 0) + 1) % len(SOURCE_FILTERS)
+    )
+    return '\n'.join(lines), keyboard
@@ -1,30 +1,181 @@
+import heapq
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+from config import DB_NAME, STATE_BACKEND, STATE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AdminState(str, Enum):
+    """Состояния ввода администратора"""
+    EDITING_RULES = 'editing_rules'
+    EDITING_ABOUT = 'editing_about'
+    AWAITING_BROADCAST = 'awaiting_broadcast'
+    AWAITING_BLACKLIST_ADD = 'awaiting_blacklist_add'
+    AWAITING_BLACKLIST_REMOVE = 'awaiting_blacklist_remove'
+    AWAITING_BLACKLIST_FILE = 'awaiting_blacklist_file'
+    AWAITING_POEM_SEARCH = 'awaiting_poem_search'
+
+
+@dataclass
+class StateEntry:
+    state: AdminState
+    expires_at: float
+    data: Dict = field(default_factory=dict)
+
+
+class MemoryStateBackend:
+    """Хранение только в памяти: состояния теряются при перезапуске"""
+
+    def load(self) -> Dict[int, StateEntry]:
+        return {}
+
+    def save(self, user_id: int, entry: StateEntry):
+        pass
+
+    def delete(self, user_id: int):
+        pass
+
+
+class SQLiteStateBackend:
+    """Хранение состояний в базе бота: начатое редактирование переживает перезапуск"""
+
+    def __init__(self, db_name: str = DB_NAME):
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_states (
+                user_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL,
+                data TEXT,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def load(self) -> Dict[int, StateEntry]:
+        now = time.time()
+        self.conn.execute('DELETE FROM user_states WHERE expires_at <= ?', (now,))
+        self.conn.commit()
+
+        entries = {}
+        for user_id, state, data, expires_at in self.conn.execute(
+            'SELECT user_id, state, data, expires_at FROM user_states'
+        ):
+            try:
+                entries[user_id] = StateEntry(AdminState(state), expires_at, json.loads(data or '{}'))
+            except ValueError:
+                logger.warning(f"Пропущено неизвестное состояние '{state}' пользователя {user_id}")
+        return entries
+
+    def save(self, user_id: int, entry: StateEntry):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO user_states (user_id, state, data, expires_at) VALUES (?, ?, ?, ?)',
+            (user_id, entry.state.value, json.dumps(entry.data, ensure_ascii=False), entry.expires_at)
+        )
+        self.conn.commit()
+
+    def delete(self, user_id: int):
+        self.conn.execute('DELETE FROM user_states WHERE user_id = ?', (user_id,))
+        self.conn.commit()
+
+
 class StateManager:
-    def __init__(self):
-        self.edit_states = {}
-        self.admin_states = {}
-    
-    def set_edit_state(self, user_id: int, state: str):
-        self.edit_states[user_id] = state
-    
-    def get_edit_state(self, user_id: int) -> str:
-        return self.edit_states.get(user_id)
-    
-    def clear_edit_state(self, user_id: int):
-        self.edit_states.pop(user_id, None)
-    
-    def set_admin_state(self, user_id: int, state: str):
-        self.admin_states[user_id] = state
-    
-    def get_admin_state(self, user_id: int) -> str:
-        return self.admin_states.get(user_id)
-    
-    def clear_admin_state(self, user_id: int):
-        self.admin_states.pop(user_id, None)
-    
-    def clear_all_states(self, user_id: int):
-        """Очистить все состояния пользователя"""
-        self.clear_edit_state(user_id)
-        self.clear_admin_state(user_id)
+    """
+    Единое хранилище состояний ввода с истечением по таймауту.
+
+    У пользователя одно состояние: новое заменяет предыдущее. Сроки
+    хранятся в куче, поэтому периодическая очистка снимает только
+    истекшие записи, не перебирая всех. Устаревшие записи кучи
+    (после замены или сброса состояния) отбрасываются лениво.
+    """
+
+    def __init__(self, ttl: float = STATE_TIMEOUT, backend=None, backend_factory=None):
+        self.ttl = ttl
+        self.backend = backend
+        # Хранилище открывается при первом обращении, а не при импорте
+        self._backend_factory = backend_factory or MemoryStateBackend
+        self._entries: Optional[Dict[int, StateEntry]] = None
+        self._heap: List[Tuple[float, int]] = []
+
+    def load(self):
+        """Загрузить сохраненные состояния, если это еще не сделано"""
+        if self._entries is not None:
+            return
+        if self.backend is None:
+            self.backend = self._backend_factory()
+        self._entries = self.backend.load()
+        self._heap = [(entry.expires_at, user_id) for user_id, entry in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def set_state(self, user_id: int, state: AdminState, data: Optional[Dict] = None, ttl: Optional[float] = None):
+        """Установить состояние пользователя"""
+        self.load()
+        entry = StateEntry(AdminState(state), time.time() + (ttl or self.ttl), data or {})
+        self._entries[user_id] = entry
+        heapq.heappush(self._heap, (entry.expires_at, user_id))
+        self.backend.save(user_id, entry)
+
+        # Если замен было много, куча копит устаревшие записи — пересобираем
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e.expires_at, uid) for uid, e in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def get_entry(self, user_id: int) -> Optional[StateEntry]:
+        """Получить состояние вместе с данными"""
+        self.load()
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self.clear_state(user_id)
+            return None
+        return entry
+
+    def get_state(self, user_id: int) -> Optional[AdminState]:
+        """Получить текущее состояние пользователя"""
+        entry = self.get_entry(user_id)
+        return entry.state if entry else None
+
+    def clear_state(self, user_id: int):
+        """Сбросить состояние пользователя"""
+        self.load()
+        if self._entries.pop(user_id, None) is not None:
+            self.backend.delete(user_id)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Удалить истекшие состояния; возвращает их количество"""
+        self.load()
+        now = now or time.time()
+        removed = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(self._heap)
+            entry = self._entries.get(user_id)
+            # Запись кучи могла устареть: состояние заменено или сброшено
+            if entry is not None and entry.expires_at == expires_at:
+                self.clear_state(user_id)
+                removed += 1
+        return removed
+
+    async def sweep_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Периодическая задача очистки истекших состояний"""
+        removed = self.sweep()
+        if removed:
+            logger.info(f"Очищено истекших состояний: {removed}")
+
+
+def _create_backend():
+    if STATE_BACKEND == 'sqlite':
+        return SQLiteStateBackend()
+    return MemoryStateBackend()
+
 
 # Глобальный экземпляр
-state_manager = StateManager()
+state_manager = StateManager(backend_factory=_create_backend)
@@ -1,14 +1,17 @@
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import ContextTypes
 
-from models import Database
+from models import db
 from keyboards.user_keyboards import get_main_menu, get_back_to_menu, get_second_block_keyboard
 from keyboards.admin_keyboards import get_admin_menu
-from config import ADMIN_ID
+from config import ADMIN_ID, MODERATOR_IDS
+from utils.concurrency import gather_calls
+from utils.duplicate_index import duplicate_index
+from utils.outbound_scheduler import PRIORITY_MODERATION
+from .state_manager import state_manager
 
 logger = logging.getLogger(__name__)
-db = Database()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
@@ -33,34 +36,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_main_menu(user.id)
     )
 
-async def handle_main_menu_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик callback-запросов главного меню"""
-    query = update.callback_query
-    await query.answer()
-    
+async def check_not_blacklisted(query) -> bool:
+    """Проверка черного списка для кнопок меню (админ не проверяется)"""
     user_id = query.from_user.id
-    
-    # Проверка черного списка (кроме админа)
-    if db.is_user_blacklisted(user_id) and user_id != ADMIN_ID:
+    if user_id != ADMIN_ID and db.is_user_blacklisted(user_id):
         await query.edit_message_text("Ошибка сервера.")
-        return
-    
-    callback_data = query.data
-    
-    if callback_data == "main_menu":
-        await show_main_menu(query, user_id)
-    
-    elif callback_data == "apply":
-        await start_application(query, context)
-    
-    elif callback_data == "about":
-        await show_about(query)
-    
-    elif callback_data == "rules":
-        await show_rules(query)
-    
-    elif callback_data == "admin_menu":
-        await show_admin_menu(query)
+        return False
+    return True
 
 async def show_main_menu(query, user_id):
     """Показать главное меню"""
@@ -129,8 +111,21 @@ async def show_admin_menu(query):
     if query.from_user.id != ADMIN_ID:
         await query.edit_message_text("⛔ У вас нет прав доступа.", reply_markup=get_back_to_menu())
         return
+    # Кнопки «Отмена» в редактировании ведут сюда: незавершенный ввод сбрасывается
+    state_manager.clear_state(query.from_user.id)
     await query.edit_message_text("⚙️ Меню организатора:", reply_markup=get_admin_menu())
 
+# Сообщения флоу подачи заявки, которые удаляются после ввода стиха или отмены
+FLOW_MESSAGE_KEYS = ('original_message_id', 'instruction_message_id')
+
+def _flow_message_deletes(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> dict:
+    """Вызовы удаления сообщений флоу для gather_calls"""
+    return {
+        key: context.bot.delete_message(chat_id=chat_id, message_id=context.user_data[key])
+        for key in FLOW_MESSAGE_KEYS
+        if context.user_data.get(key)
+    }
+
 async def handle_application_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текста стихотворения (только для заявок)"""
     user = update.effective_user
@@ -161,88 +156,33 @@ async def handle_application_text(update: Update, context: ContextTypes.DEFAULT_
         context.user_data['poem_text'] = message_text
         context.user_data['awaiting_poem'] = False
         
-        # УДАЛЯЕМ ОБА сообщения бота
-        deleted_count = 0
-        
-        # 1. Удаляем сообщение "Начата подача заявки..." (оригинальное сообщение)
-        original_message_id = context.user_data.get('original_message_id')
-        if original_message_id:
-            try:
-                await context.bot.delete_message(
-                    chat_id=user.id,
-                    message_id=original_message_id
-                )
-                logger.info(f"Оригинальное сообщение {original_message_id} удалено")
-                context.user_data.pop('original_message_id', None)
-                deleted_count += 1
-            except Exception as e:
-                logger.error(f"Не удалось удалить оригинальное сообщение: {e}")
-        
-        # 2. Удаляем сообщение с инструкцией
-        instruction_message_id = context.user_data.get('instruction_message_id')
-        if instruction_message_id:
-            try:
-                await context.bot.delete_message(
-                    chat_id=user.id,
-                    message_id=instruction_message_id
-                )
-                logger.info(f"Сообщение с инструкцией {instruction_message_id} удалено")
-                context.user_data.pop('instruction_message_id', None)
-                deleted_count += 1
-            except Exception as e:
-                logger.error(f"Не удалось удалить сообщение с инструкцией: {e}")
-        
-        logger.info(f"Удалено сообщений: {deleted_count}")
-        
-        # Отправляем новое сообщение с выбором второго блока
-        await update.message.reply_text(
-            "✅ Стихотворение получено!\n\n"
-            "Шаг 2/2. Хотите ли вы также выступить во втором блоке вечера?",
-            reply_markup=get_second_block_keyboard()
+        # Удаляем оба сообщения бота и отправляем следующий шаг одновременно
+        results = await gather_calls(
+            **_flow_message_deletes(context, user.id),
+            reply=update.message.reply_text(
+                "✅ Стихотворение получено!\n\n"
+                "Шаг 2/2. Хотите ли вы также выступить во втором блоке вечера?",
+                reply_markup=get_second_block_keyboard()
+            )
         )
+        deleted = [key for key in FLOW_MESSAGE_KEYS if key in results and results[key].ok]
+        for key in deleted:
+            context.user_data.pop(key, None)
+        logger.info(f"Удалено сообщений: {len(deleted)}")
     else:
         logger.info(f"Пользователь {user.id} не в состоянии подачи заявки - игнорируем текст")
 
 async def handle_second_block_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора участия во втором блоке"""
     query = update.callback_query
-    await query.answer()
     
     user_id = query.from_user.id
     choice = query.data
     
     # Обработка отмены заявки
     if choice == "cancel_application":
-        # УДАЛЯЕМ ОБА сообщения бота при отмене
-        deleted_count = 0
-        
-        # 1. Удаляем сообщение "Начата подача заявки..."
-        original_message_id = context.user_data.get('original_message_id')
-        if original_message_id:
-            try:
-                await context.bot.delete_message(
-                    chat_id=user_id,
-                    message_id=original_message_id
-                )
-                logger.info(f"Оригинальное сообщение {original_message_id} удалено при отмене")
-                deleted_count += 1
-            except Exception as e:
-                logger.error(f"Не удалось удалить оригинальное сообщение при отмене: {e}")
-        
-        # 2. Удаляем сообщение с инструкцией
-        instruction_message_id = context.user_data.get('instruction_message_id')
-        if instruction_message_id:
-            try:
-                await context.bot.delete_message(
-                    chat_id=user_id,
-                    message_id=instruction_message_id
-                )
-                logger.info(f"Сообщение с инструкцией {instruction_message_id} удалено при отмене")
-                deleted_count += 1
-            except Exception as e:
-                logger.error(f"Не удалось удалить сообщение с инструкцией при отмене: {e}")
-        
-        logger.info(f"Удалено сообщений при отмене: {deleted_count}")
+        # Сообщения флоу собираем до очистки user_data
+        deletes = _flow_message_deletes(context, user_id)
         
         # ДЛЯ АДМИНА: снимаем флаг режима пользователя
         if user_id == ADMIN_ID:
@@ -251,11 +191,15 @@ async def handle_second_block_choice(update: Update, context: ContextTypes.DEFAU
         
         context.user_data.clear()
         
-        # Отправляем новое сообщение с главным меню
-        await query.message.reply_text(
-            "❌ Подача заявки отменена.", 
-            reply_markup=get_main_menu(user_id)
+        # Удаляем оба сообщения бота и отправляем главное меню одновременно
+        results = await gather_calls(
+            **deletes,
+            reply=query.message.reply_text(
+                "❌ Подача заявки отменена.", 
+                reply_markup=get_main_menu(user_id)
+            )
         )
+        logger.info(f"Удалено сообщений при отмене: {sum(results[key].ok for key in deletes)}")
         return
     
     if choice == "second_block_yes":
@@ -269,6 +213,8 @@ async def handle_second_block_choice(update: Update, context: ContextTypes.DEFAU
     poem_text = context.user_data.get('poem_text')
     if poem_text:
         application_id = db.create_application(user_id, poem_text, second_block)
+        # Сразу сверяем с историей заявок: повторы видны модератору
+        duplicates = await duplicate_index.index_application(application_id, poem_text)
         
         # ДЛЯ АДМИНА: снимаем флаг режима пользователя после успешной подачи
         if user_id == ADMIN_ID:
@@ -278,11 +224,13 @@ async def handle_second_block_choice(update: Update, context: ContextTypes.DEFAU
         # Очищаем временные данные
         context.user_data.clear()
         
-        await query.edit_message_text(
-            f"✅ Ваша заявка {choice_text} принята на рассмотрение!\n\n"
-            f"Мы свяжемся с вами когда проверим ваше стихотворение.",
-            reply_markup=get_back_to_menu()
-        )
+        calls = {
+            'confirm': query.edit_message_text(
+                f"✅ Ваша заявка {choice_text} принята на рассмотрение!\n\n"
+                f"Мы свяжемся с вами когда проверим ваше стихотворение.",
+                reply_markup=get_back_to_menu()
+            )
+        }
         
         # Уведомление администратору о новой заявке (кроме случая когда заявку подает сам админ)
         if user_id != ADMIN_ID:
@@ -295,18 +243,26 @@ async def handle_second_block_choice(update: Update, context: ContextTypes.DEFAU
                 f"🎭 Второй блок: {'✅ Да' if second_block else '❌ Нет'}\n\n"
                 f"📝 Стихотворение:\n{poem_text[:500]}{'...' if len(poem_text) > 500 else ''}"
             )
-            
-            # Отправляем уведомление администратору
-            try:
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📨 Перейти к заявкам", callback_data="admin_pending_applications")]
-                ])
-                
-                await context.bot.send_message(chat_id=ADMIN_ID, text=admin_message, reply_markup=keyboard)
-            except Exception as e:
-                logger.error(f"Не удалось отправить уведомление администратору: {e}")
+            if duplicates:
+                admin_message += "\n\n⚠️ Похоже на заявки: " + ', '.join(
+                    f"#{match.application_id} ({match.similarity:.0%})" for match in duplicates[:5]
+                )
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton("📨 Перейти к заявкам", callback_data="admin_pending_applications")]
+            ])
+            # Уведомления идут в фоне: в очереди модерации они могут ждать
+            # паузы между сообщениями в чат модератора, подача заявки их не ждет
+            context.application.create_task(gather_calls(**{
+                f'notify_{moderator_id}': context.bot.send_message(
+                    chat_id=moderator_id, text=admin_message, reply_markup=keyboard,
+                    rate_limit_args={'priority': PRIORITY_MODERATION}
+                )
+                for moderator_id in MODERATOR_IDS if moderator_id != user_id
+            }), update=update)
         else:
             logger.info(f"Админ {user_id} подал заявку самостоятельно, уведомление не отправляется")
+        
+        await gather_calls(**calls)
     else:
         # ДЛЯ АДМИНА: снимаем флаг режима пользователя при ошибке
         if user_id == ADMIN_ID:
@@ -0,0 +1,24 @@
+# ./healthcheck.py
+# Проверка готовности для Docker HEALTHCHECK. Намеренно не импортирует
+# модули бота: проверка должна быть дешевой и не трогать базу.
+import os
+import sys
+import urllib.request
+
+
+def main():
+    # В режиме polling HTTP-сервера нет, проверять нечего
+    if os.getenv('BOT_MODE', 'polling').lower() != 'webhook':
+        return 0
+
+    port = os.getenv('WEBHOOK_PORT', '8443')
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=5) as response:
+            return 0 if response.status == 200 else 1
+    except Exception as e:
+        print(f"healthcheck: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,32 +4,45 @@ def get_admin_menu():
     """Меню администратора"""
     keyboard = [
         [InlineKeyboardButton("📨 Заявки в первый блок", callback_data="admin_pending_applications")],
+        [InlineKeyboardButton("📊 Статистика", callback_data="admin_statistics")],
+        [InlineKeyboardButton("🔎 Поиск по стихам", callback_data="admin_poem_search")],
         [InlineKeyboardButton("📄 Стихи первого блока", callback_data="admin_approved_poems")],
         [InlineKeyboardButton("👥 Список второго блока", callback_data="admin_second_block")],
-        [InlineKeyboardButton("🗑️ Удалить все заявки", callback_data="admin_delete_all")],
+        [InlineKeyboardButton("⏱ Длительность программы", callback_data="admin_program_length")],
+        [InlineKeyboardButton("📦 Закрыть вечер", callback_data="admin_close_event")],
         [InlineKeyboardButton("📋 Правила", callback_data="admin_rules")],
         [InlineKeyboardButton("🎭 Об организаторе", callback_data="admin_about")],
         [InlineKeyboardButton("🚫 Черный список", callback_data="admin_blacklist")],
         [InlineKeyboardButton("📢 Сделать рассылку", callback_data="admin_broadcast")],
+        [InlineKeyboardButton("🧠 Память бота", callback_data="admin_memory")],
+        [InlineKeyboardButton("💾 Резервная копия", callback_data="admin_backup")],
+        [InlineKeyboardButton("👥 Модераторы", callback_data="admin_moderation_stats")],
         [InlineKeyboardButton("🔙 В главное меню", callback_data="main_menu")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_blacklist_pagination_keyboard(current_page: int, total_pages: int) -> InlineKeyboardMarkup:
-    """Клавиатура пагинации для черного списка"""
-    buttons = []
+def get_blacklist_pagination_keyboard(current_page: int, total_pages: int,
+                                      first_user_id: int, last_user_id: int) -> InlineKeyboardMarkup:
+    """
+    Клавиатура пагинации для черного списка. Кнопки несут границу
+    страницы (ID первого или последнего пользователя) для keyset-запроса.
+    """
+    keyboard = []
     
-    if current_page > 0:
-        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"blacklist_page_{current_page-1}"))
+    if total_pages > 1:
+        buttons = []
+        if current_page > 0:
+            buttons.append(InlineKeyboardButton(
+                "◀️ Предыдущая", callback_data=f"blacklist_back_{current_page-1}_{first_user_id}"))
+        buttons.append(InlineKeyboardButton(f"{current_page+1}/{total_pages}", callback_data="noop"))
+        if current_page < total_pages - 1:
+            buttons.append(InlineKeyboardButton(
+                "Следующая ▶️", callback_data=f"blacklist_page_{current_page+1}_{last_user_id}"))
+        keyboard.append(buttons)
     
-    buttons.append(InlineKeyboardButton(f"{current_page+1}/{total_pages}", callback_data="noop"))
+    keyboard.append([InlineKeyboardButton("🔙 Назад в меню ЧС", callback_data="admin_blacklist")])
     
-    if current_page < total_pages - 1:
-        buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"blacklist_page_{current_page+1}"))
-    
-    buttons.append(InlineKeyboardButton("🔙 Назад", callback_data="admin_blacklist"))
-    
-    return InlineKeyboardMarkup([buttons])
+    return InlineKeyboardMarkup(keyboard)
 
 
 def get_blacklist_menu():
@@ -38,11 +51,14 @@ def get_blacklist_menu():
         [InlineKeyboardButton("➕ Добавить в ЧС", callback_data="blacklist_add")],
         [InlineKeyboardButton("➖ Удалить из ЧС", callback_data="blacklist_remove")],
         [InlineKeyboardButton("👁️ Просмотр ЧС", callback_data="blacklist_view")],
+        [InlineKeyboardButton("📥 Импорт из файла", callback_data="blacklist_import")],
+        [InlineKeyboardButton("📤 Выгрузить список", callback_data="blacklist_export")],
         [InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_application_moderation_keyboard(application_id: int, current_index: int, total_count: int):
+def get_application_moderation_keyboard(application_id: int, pending_count: int, page: int = 0,
+                                        page_count: int = 1, back_to: str = "admin_menu"):
     """Клавиатура для модерации заявки"""
     keyboard = [
         [
@@ -51,20 +67,45 @@ def get_application_moderation_keyboard(application_id: int, current_index: int,
         ]
     ]
     
-    # Кнопки навигации
-    nav_buttons = []
-    if current_index > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"nav_{current_index-1}"))
+    # Страницы длинной карточки
+    if page_count > 1:
+        page_buttons = []
+        if page > 0:
+            page_buttons.append(InlineKeyboardButton("⬆️ Выше", callback_data=f"card_{application_id}_{page-1}"))
+        page_buttons.append(InlineKeyboardButton(f"стр. {page+1}/{page_count}", callback_data="noop"))
+        if page < page_count - 1:
+            page_buttons.append(InlineKeyboardButton("Ниже ⬇️", callback_data=f"card_{application_id}_{page+1}"))
+        keyboard.append(page_buttons)
     
-    nav_buttons.append(InlineKeyboardButton(f"{current_index+1}/{total_count}", callback_data="count"))
+    # Пропуск возвращает заявку в общую очередь
+    keyboard.append([
+        InlineKeyboardButton("⏭ Пропустить", callback_data=f"skip_{application_id}"),
+        InlineKeyboardButton(f"В очереди: {pending_count}", callback_data="count")
+    ])
     
-    if current_index < total_count - 1:
-        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"nav_{current_index+1}"))
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=back_to)])
     
-    if nav_buttons:
-        keyboard.append(nav_buttons)
+    return InlineKeyboardMarkup(keyboard)
+
+def get_poem_search_keyboard(page: int, total_pages: int, status_label: str, next_status: int,
+                             block_label: str, next_block: int, source_label: str, next_source: int):
+    """Клавиатура результатов поиска: страницы и переключатели фильтров"""
+    keyboard = []
+    
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"psearch_page_{page-1}"))
+    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="noop"))
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"psearch_page_{page+1}"))
+    keyboard.append(nav_buttons)
     
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="admin_menu")])
+    keyboard.append([
+        InlineKeyboardButton(f"🏷 {status_label}", callback_data=f"psearch_status_{next_status}"),
+        InlineKeyboardButton(f"🎭 {block_label}", callback_data=f"psearch_block_{next_block}")
+    ])
+    keyboard.append([InlineKeyboardButton(f"🗄 {source_label}", callback_data=f"psearch_source_{next_source}")])
+    keyboard.append([InlineKeyboardButton("🔙 В меню", callback_data="admin_menu")])
     
     return InlineKeyboardMarkup(keyboard)
 
@@ -72,7 +113,7 @@ def get_confirmation_keyboard(action: str):
     """Клавиатура подтверждения для опасных действий"""
     keyboard = [
         [
-            InlineKeyboardButton("✅ Да, удалить все", callback_data="confirm_delete_all"),
+            InlineKeyboardButton("✅ Да, продолжить", callback_data=f"confirm_{action}"),
             InlineKeyboardButton("❌ Отмена", callback_data="admin_menu")
         ]
     ]
@@ -1,5 +1,5 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from config import ADMIN_ID
+from config import ADMIN_ID, MODERATOR_IDS
 
 def get_main_menu(user_id: int):
     """Главное меню"""
@@ -12,6 +12,8 @@ def get_main_menu(user_id: int):
     # Добавляем меню организатора только для админа
     if user_id == ADMIN_ID:
         keyboard.append([InlineKeyboardButton("⚙️ Меню Организатора", callback_data="admin_menu")])
+    elif user_id in MODERATOR_IDS:
+        keyboard.append([InlineKeyboardButton("📨 Модерация заявок", callback_data="admin_pending_applications")])
     
     return InlineKeyboardMarkup(keyboard)
 
@@ -1,87 +1,166 @@
 # ./main.py
+import time
+# Начало отсчета для замеров запуска: до импорта остальных модулей
+STARTED_AT = time.perf_counter()
+
+import asyncio
 import logging
 import os
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from config import BOT_TOKEN, ADMIN_ID
-from models import Database
+import signal
+from telegram import Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters
+from config import (
+    BOT_TOKEN, ADMIN_ID, UPDATES_RECORD_FILE, UPDATES_RECORD_SALT,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT,
+    WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS, UPDATE_QUEUE_SIZE, CONCURRENT_UPDATES,
+    FLOOD_REPORT_INTERVAL, STATE_SWEEP_INTERVAL, DB_NAME, PERSISTENCE_UPDATE_INTERVAL,
+    USER_DATA_EVICTION_INTERVAL, LOG_FILE, HTTP_POOL_REPORT_INTERVAL, OUTBOUND_REPORT_INTERVAL,
+    MODERATOR_IDS, MODERATION_REPORT_INTERVAL, DUPLICATE_BACKFILL_INTERVAL, POEM_SEARCH_BACKFILL_INTERVAL,
+    POEM_METRICS_BACKFILL_INTERVAL, USER_DIRECTORY_BACKFILL_INTERVAL, BACKUP_INTERVAL
+)
+from models import db, SQLitePersistence
+from utils.update_recorder import UpdateRecorder
+from utils.update_processor import KeyedUpdateProcessor
+from utils.flood_control import flood_controller
+from utils.memory_manager import user_data_evictor
+from utils.startup_profiler import StartupProfiler
+from utils import http_pools, poem_search, program_length, user_directory
+from utils.outbound_scheduler import outbound_scheduler
+from utils.render_cache import RenderTrackingBot
+from utils.moderation_queue import moderation_queue
+from utils.duplicate_index import duplicate_index
+from utils.backups import backup_manager
 
 # Импорты обработчиков
-from handlers.user_handlers import (
-    start, 
-    handle_main_menu_callbacks, 
-    handle_second_block_choice
-)
-from handlers.admin_handlers import handle_admin_callbacks
-from handlers.content_edit_handlers import handle_content_edit_callback
-from handlers.message_router import route_message
+from handlers.user_handlers import start
+from handlers.callback_router import callback_router
+from handlers.message_router import route_message, route_document
+from handlers.state_manager import state_manager
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('/app/logs/bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+startup_profiler = StartupProfiler(STARTED_AT)
+startup_profiler.mark('imports')
+
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+def setup_logging():
+    """Настройка логирования"""
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler('/app/logs/bot.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 def setup_handlers(application):
     """Настройка всех обработчиков в правильном порядке"""
     
-    # 1. Обработчики команд
-    application.add_handler(CommandHandler("start", start))
-    
-    # 2. Обработчики callback-запросов
-    
-    # Главное меню пользователя
-    application.add_handler(CallbackQueryHandler(
-        handle_main_menu_callbacks, 
-        pattern="^(main_menu|apply|about|rules|admin_menu)$"
-    ))
-    
-    # Заявки пользователей (второй блок и отмена)
-    application.add_handler(CallbackQueryHandler(
-        handle_second_block_choice, 
-        pattern="^(second_block_yes|second_block_no|cancel_application)$"
-    ))
+    # 0. Запись входящих апдейтов для офлайн-воспроизведения
+    if UPDATES_RECORD_FILE:
+        recorder = UpdateRecorder(UPDATES_RECORD_FILE, ADMIN_ID, UPDATES_RECORD_SALT)
+        application.add_handler(TypeHandler(Update, recorder.record), group=-1)
     
-    # Админ-меню (основные функции)
-    application.add_handler(CallbackQueryHandler(
-        handle_admin_callbacks, 
-        pattern="^admin_"
-    ))
+    # Отметка активности пользователей для вытеснения user_data
+    application.add_handler(TypeHandler(Update, user_data_evictor.touch), group=-2)
     
-    # Обработчик для кнопок принятия/отклонения:
-    application.add_handler(CallbackQueryHandler(
-        handle_admin_callbacks,
-        pattern="^(approve_|reject_|nav_)"
-    ))
-
-
-    # Черный список
-    application.add_handler(CallbackQueryHandler(
-        handle_admin_callbacks,
-        pattern="^(blacklist_add|blacklist_remove|blacklist_view)$"
-    ))
+    # Замер времени до первого апдейта
+    application.add_handler(TypeHandler(Update, startup_profiler.on_update), group=-3)
     
-    # Навигация по заявкам и модерация
-    application.add_handler(CallbackQueryHandler(
-        handle_admin_callbacks,
-        pattern="^(nav_|approve_|reject_|confirm_delete_all)$"
-    ))
+    # 1. Обработчики команд
+    application.add_handler(CommandHandler("start", start))
     
-    # Редактирование контента
-    application.add_handler(CallbackQueryHandler(
-        handle_content_edit_callback,
-        pattern="^(admin_rules|admin_about|cancel_edit)$"
-    ))
+    # 2. Единый маршрутизатор callback-запросов (таблица в handlers/callback_router.py)
+    application.add_handler(CallbackQueryHandler(callback_router.dispatch))
     
     # 3. Единый обработчик сообщений для всех
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND,
         route_message
     ))
+    
+    # 4. Файлы: импорт черного списка
+    application.add_handler(MessageHandler(filters.Document.ALL, route_document))
+
+async def on_startup(application):
+    """post_init: открытие хранилищ и прогрев кэшей"""
+    # База бота и сохраненные состояния админа открываются независимо
+    await asyncio.gather(
+        asyncio.to_thread(db.initialize, DB_NAME),
+        asyncio.to_thread(state_manager.load),
+    )
+    await asyncio.gather(
+        asyncio.to_thread(db.warm_content),
+        asyncio.to_thread(db.warm_blacklist),
+    )
+    startup_profiler.mark('storage_ready')
+
+def create_application(request=None, get_updates_request=None, concurrent_updates: int = CONCURRENT_UPDATES):
+    """Создание приложения бота с настройками из конфигурации"""
+    # Раздельные пулы для исходящих вызовов и getUpdates (реплей подставляет свои)
+    if request is None or get_updates_request is None:
+        outbound, get_updates = http_pools.build_requests()
+        request = request or outbound
+        get_updates_request = get_updates_request or get_updates
+    # Бот запоминает отпечатки редактирований, чтобы не повторять одинаковые
+    bot = RenderTrackingBot(
+        BOT_TOKEN, request=request, get_updates_request=get_updates_request, rate_limiter=outbound_scheduler
+    )
+    builder = (
+        Application.builder()
+        .bot(bot)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .concurrent_updates(KeyedUpdateProcessor(
+            concurrent_updates, UPDATE_QUEUE_SIZE, admission=flood_controller.admit
+        ))
+        .persistence(SQLitePersistence(DB_NAME, update_interval=PERSISTENCE_UPDATE_INTERVAL))
+        .post_init(on_startup)
+    )
+    
+    application = builder.build()
+    flood_controller.bind(application)
+    setup_handlers(application)
+    startup_profiler.mark('application_built')
+    
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            flood_controller.report_job, interval=FLOOD_REPORT_INTERVAL, first=FLOOD_REPORT_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            state_manager.sweep_job, interval=STATE_SWEEP_INTERVAL, first=STATE_SWEEP_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            user_data_evictor.evict_job, interval=USER_DATA_EVICTION_INTERVAL, first=USER_DATA_EVICTION_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            http_pools.report_job, interval=HTTP_POOL_REPORT_INTERVAL, first=HTTP_POOL_REPORT_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            outbound_scheduler.report_job, interval=OUTBOUND_REPORT_INTERVAL, first=OUTBOUND_REPORT_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            poem_search.backfill_job, interval=POEM_SEARCH_BACKFILL_INTERVAL, first=POEM_SEARCH_BACKFILL_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            program_length.backfill_job, interval=POEM_METRICS_BACKFILL_INTERVAL, first=POEM_METRICS_BACKFILL_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            user_directory.backfill_job, interval=USER_DIRECTORY_BACKFILL_INTERVAL,
+            first=USER_DIRECTORY_BACKFILL_INTERVAL
+        )
+        application.job_queue.run_repeating(
+            duplicate_index.backfill_job, interval=DUPLICATE_BACKFILL_INTERVAL, first=DUPLICATE_BACKFILL_INTERVAL
+        )
+        if BACKUP_INTERVAL > 0:
+            application.job_queue.run_repeating(
+                backup_manager.backup_job, interval=BACKUP_INTERVAL, first=BACKUP_INTERVAL
+            )
+        application.job_queue.run_repeating(
+            moderation_queue.report_job, interval=MODERATION_REPORT_INTERVAL, first=MODERATION_REPORT_INTERVAL
+        )
+    return application
 
 def check_environment():
     """Проверка необходимых переменных окружения"""
@@ -94,45 +173,79 @@ def check_environment():
         return False
     
     logger.info(f"Бот настроен для админа: {ADMIN_ID}")
+    logger.info(f"Модераторы заявок: {', '.join(map(str, sorted(MODERATOR_IDS)))}")
     return True
 
 def create_directories():
     """Создание необходимых директорий"""
-    directories = ['/app/data', '/app/logs']
+    directories = sorted({os.path.dirname(DB_NAME), os.path.dirname(LOG_FILE), '/app/logs'})
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
         logger.info(f"Директория создана/проверена: {directory}")
 
+async def run_webhook(application):
+    """Запуск бота в режиме webhook со встроенным HTTP-сервером"""
+    from utils.webhook_server import WebhookServer
+    
+    server = WebhookServer(
+        application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+        max_backlog=UPDATE_QUEUE_SIZE
+    )
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    async with application:
+        # post_init сам вызывается только в run_polling/run_webhook PTB
+        await application.post_init(application)
+        await application.start()
+        await server.start()
+        
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=True
+        )
+        server.webhook_set = True
+        logger.info(f"Webhook установлен: {WEBHOOK_URL}{WEBHOOK_PATH}")
+        
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+    
+    logger.info("Бот остановлен")
+
 def main():
     """Основная функция запуска бота"""
     try:
         # Создание директорий
         create_directories()
+        setup_logging()
         
         # Проверка переменных окружения
         if not check_environment():
             return
         
-        # Инициализация базы данных
-        db = Database()
-        logger.info("База данных инициализирована")
-        
-        # Создание приложения
-        application = Application.builder().token(BOT_TOKEN).build()
-        logger.info("Приложение бота создано")
-        
-        # Настройка обработчиков
-        setup_handlers(application)
-        logger.info("Обработчики настроены")
+        # Создание приложения и настройка обработчиков
+        application = create_application()
+        logger.info(f"Приложение бота создано (одновременно обрабатывается апдейтов: {CONCURRENT_UPDATES})")
         
         # Запуск бота
-        logger.info("Бот запускается...")
-        application.run_polling(
-            poll_interval=1.0,
-            timeout=20,
-            drop_pending_updates=True,
-            allowed_updates=['message', 'callback_query']
-        )
+        logger.info(f"Бот запускается в режиме {BOT_MODE}...")
+        if BOT_MODE == 'webhook':
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling(
+                poll_interval=1.0,
+                timeout=20,
+                drop_pending_updates=True,
+                allowed_updates=ALLOWED_UPDATES
+            )
         
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
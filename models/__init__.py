@@ -1 +1,2 @@
-from .database import Database
+from .database import Database, LazyDatabase, db
+from .persistence import SQLitePersistence
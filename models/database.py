@@ -1,18 +1,75 @@
 
 import sqlite3
-import datetime
 import logging
-from config import DB_NAME
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Set
+from config import DB_NAME, ARCHIVE_DB_NAME, ARCHIVE_COMPRESS
+from .poem_metrics import measure_poem
 
 logger = logging.getLogger(__name__)
 
+def archive_path(db_name: str) -> str:
+    """Файл архива для базы db_name: ARCHIVE_DB_NAME или <имя>_archive.db рядом"""
+    if db_name == ':memory:':
+        return ':memory:'
+    if ARCHIVE_DB_NAME and db_name == DB_NAME:
+        return ARCHIVE_DB_NAME
+    return os.path.splitext(db_name)[0] + '_archive.db'
+
+
+# unicode61 не сводит «ё» к «е»: текст попадает в поисковые индексы
+# уже с «е», а запрос сводится так же (utils.poem_search.build_match)
+def fold_yo(expression: str) -> str:
+    """SQL-выражение expression с «ё»/«Ё», замененными на «е»/«Е»"""
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _compress(text):
+    return zlib.compress(text.encode('utf-8')) if text is not None else None
+
+
+def _decompress(data):
+    return zlib.decompress(data).decode('utf-8') if data is not None else None
+
+
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    def __init__(self, db_name: str = DB_NAME):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        # Архив прошедших вечеров — отдельный файл в том же соединении:
+        # перенос заявок в него идет одной транзакцией
+        self.archive_name = archive_path(db_name)
+        self.conn.execute('ATTACH DATABASE ? AS archive', (self.archive_name,))
+        self.conn.create_function('zlib_compress', 1, _compress, deterministic=True)
+        self.conn.create_function('zlib_decompress', 1, _decompress, deterministic=True)
+        self._current_event_id: Optional[int] = None
+        # Кэши для запросов на каждое нажатие: текст правил и черный список
+        self._content_cache: Dict[str, str] = {}
+        self._blacklist_cache: Optional[Set[int]] = None
         self.create_tables()
         self.init_content()
     
+    def warm_content(self):
+        """Загрузка всего контента в кэш"""
+        rows = self.conn.execute('SELECT key, value FROM content').fetchall()
+        self._content_cache = {row['key']: row['value'] for row in rows}
+        logger.info(f"Кэш контента загружен: {len(self._content_cache)} ключей")
+    
+    def warm_blacklist(self):
+        """Загрузка черного списка в кэш"""
+        rows = self.conn.execute('SELECT user_id FROM blacklist').fetchall()
+        self._blacklist_cache = {row[0] for row in rows}
+        logger.info(f"Кэш черного списка загружен: {len(self._blacklist_cache)} записей")
+    
+    def reset_caches(self):
+        """Сброс кэшей после изменений в обход методов класса"""
+        self._content_cache = {}
+        self._blacklist_cache = None
+    
     def create_tables(self):
         """Создание всех необходимых таблиц"""
         cursor = self.conn.cursor()
@@ -59,9 +116,354 @@ class Database:
             )
         ''')
         
+        # Индекс похожих стихов: MinHash-подпись и LSH-корзины каждой заявки
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS poem_signatures (
+                application_id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS poem_lsh (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                application_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, application_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_poem_lsh_application ON poem_lsh (application_id)
+        ''')
+        # Подписи переживают перенос заявок в архив: похожие ищутся по всей
+        # истории. Удаление заявки удаляет подпись само (delete_application)
+        cursor.execute('DROP TRIGGER IF EXISTS trg_applications_delete_poem_index')
+        
+        # Служебные значения индексов (граница дозаполнения и т.п.)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS index_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        self._create_poem_search(cursor)
+        self._create_user_directory(cursor)
+        self._create_counters(cursor)
+        self._create_events(cursor)
+        
+        # Закрепление заявок за модераторами (колонки появились позже)
+        self._add_missing_columns(cursor, 'applications', {
+            'claimed_by': 'INTEGER',
+            'claim_expires_at': 'REAL',
+        })
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_status_created
+            ON applications (status, created_at)
+        ''')
+        
+        # Объем стихотворения считается один раз при подаче заявки
+        self._add_missing_columns(cursor, 'applications', {
+            'line_count': 'INTEGER',
+            'word_count': 'INTEGER',
+            'char_count': 'INTEGER',
+            'reading_seconds': 'INTEGER',
+        })
+        # Сумма длительности программы читается из индекса, без обхода таблицы
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_program_length
+            ON applications (status, second_block, reading_seconds)
+        ''')
+        # Небольшой частичный индекс еще не измеренных заявок для дозаполнения
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_unmeasured
+            ON applications (application_id) WHERE reading_seconds IS NULL
+        ''')
+        
         self.conn.commit()
         logger.info("Таблицы базы данных созданы/проверены")
     
+    @staticmethod
+    def _create_poem_search(cursor):
+        """
+        Полнотекстовый индекс FTS5 по стихам, синхронизируемый триггерами.
+        
+        Новые заявки попадают в индекс триггером сразу. Заявки, которые уже
+        были в базе при создании индекса (application_id <= poem_fts_target),
+        дозаполняются порциями (backfill_poem_search); poem_fts_done — до
+        какого application_id они уже проиндексированы. Триггеры удаления и
+        изменения трогают только проиндексированные строки.
+        
+        В индекс пишется текст со сведенной «ё» (fold_yo). Индекс, созданный
+        до этого, удаляется и заполняется заново тем же дозаполнением.
+        """
+        insert_trigger = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_applications_fts_insert'"
+        ).fetchone()
+        if insert_trigger and 'replace(' not in insert_trigger[0]:
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS trg_applications_fts_{trigger}')
+            cursor.execute('DROP TABLE IF EXISTS applications_fts')
+            logger.info("Поисковый индекс стихов будет перестроен со сведением «ё»")
+        
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applications_fts'"
+        ).fetchone()
+        if not exists:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE applications_fts USING fts5(
+                    poem_text,
+                    content = 'applications',
+                    content_rowid = 'application_id',
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            target = cursor.execute('SELECT COALESCE(MAX(application_id), 0) FROM applications').fetchone()[0]
+            cursor.executemany(
+                'INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)',
+                (('poem_fts_target', target), ('poem_fts_done', 0))
+            )
+            logger.info(f"Создан поисковый индекс стихов, к дозаполнению {target} заявок")
+        
+        indexed = '''(
+            {row}.application_id > (SELECT value FROM index_state WHERE key = 'poem_fts_target')
+            OR {row}.application_id <= (SELECT value FROM index_state WHERE key = 'poem_fts_done')
+        )'''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_fts_insert
+            AFTER INSERT ON applications
+            BEGIN
+                INSERT INTO applications_fts (rowid, poem_text)
+                VALUES (new.application_id, {fold_yo('new.poem_text')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_fts_delete
+            AFTER DELETE ON applications
+            WHEN {indexed.format(row='old')}
+            BEGIN
+                INSERT INTO applications_fts (applications_fts, rowid, poem_text)
+                VALUES ('delete', old.application_id, {fold_yo('old.poem_text')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_fts_update
+            AFTER UPDATE OF poem_text ON applications
+            WHEN {indexed.format(row='old')}
+            BEGIN
+                INSERT INTO applications_fts (applications_fts, rowid, poem_text)
+                VALUES ('delete', old.application_id, {fold_yo('old.poem_text')});
+                INSERT INTO applications_fts (rowid, poem_text)
+                VALUES (new.application_id, {fold_yo('new.poem_text')});
+            END
+        ''')
+    
+    @staticmethod
+    def _create_user_directory(cursor):
+        """
+        Поиск пользователей по имени и username: триграммный FTS5-индекс
+        (подстрока от 3 символов) и индексы для коротких префиксов.
+        
+        user_id — ID Telegram и не растет монотонно, поэтому уже
+        проиндексированные строки определяются по служебной таблице FTS5
+        users_fts_docsize (строка на каждый документ индекса). Ее же
+        используют триггеры и дозаполнение (backfill_user_directory).
+        """
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                username, first_name, last_name,
+                content = 'users',
+                content_rowid = 'user_id',
+                tokenize = 'trigram'
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON users (username COLLATE NOCASE)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_first_name ON users (first_name COLLATE NOCASE)')
+        
+        indexed = 'EXISTS (SELECT 1 FROM users_fts_docsize WHERE id = old.user_id)'
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_insert
+            AFTER INSERT ON users
+            BEGIN
+                INSERT INTO users_fts (rowid, username, first_name, last_name)
+                VALUES (new.user_id, new.username, new.first_name, new.last_name);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_delete
+            AFTER DELETE ON users
+            WHEN {indexed}
+            BEGIN
+                INSERT INTO users_fts (users_fts, rowid, username, first_name, last_name)
+                VALUES ('delete', old.user_id, old.username, old.first_name, old.last_name);
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_update
+            AFTER UPDATE OF username, first_name, last_name ON users
+            WHEN {indexed}
+            BEGIN
+                INSERT INTO users_fts (users_fts, rowid, username, first_name, last_name)
+                VALUES ('delete', old.user_id, old.username, old.first_name, old.last_name);
+                INSERT INTO users_fts (rowid, username, first_name, last_name)
+                VALUES (new.user_id, new.username, new.first_name, new.last_name);
+            END
+        ''')
+    
+    @staticmethod
+    def _create_counters(cursor):
+        """
+        Счетчики для статистики, которые ведут триггеры в той же
+        транзакции, что и изменение строк: чтение не зависит от размера
+        таблиц. Имена: users, blacklist, applications:<статус>,
+        second_block:<статус>. daily_submissions — поданные заявки по дням
+        (UTC); удаление заявок их не уменьшает.
+        
+        При первом создании счетчики заполняются подсчетом по таблицам.
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counters'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_submissions (
+                day TEXT PRIMARY KEY,
+                submitted INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        if not exists:
+            cursor.execute('''
+                INSERT INTO counters (name, value)
+                SELECT 'users', COUNT(*) FROM users
+                UNION ALL SELECT 'blacklist', COUNT(*) FROM blacklist
+                UNION ALL SELECT 'applications:' || status, COUNT(*) FROM applications GROUP BY status
+                UNION ALL SELECT 'second_block:' || status, COUNT(*) FROM applications
+                          WHERE second_block GROUP BY status
+            ''')
+            cursor.execute('''
+                INSERT INTO daily_submissions (day, submitted)
+                SELECT date(created_at), COUNT(*) FROM applications GROUP BY date(created_at)
+            ''')
+            logger.info("Созданы счетчики статистики")
+        
+        def bump(name: str, delta: int, condition: str = 'true') -> str:
+            return (
+                f"INSERT INTO counters (name, value) SELECT {name}, {delta} WHERE {condition} "
+                f"ON CONFLICT (name) DO UPDATE SET value = value + ({delta});"
+            )
+        
+        triggers = {
+            'trg_users_count_insert': ('AFTER INSERT ON users', bump("'users'", 1)),
+            'trg_users_count_delete': ('AFTER DELETE ON users', bump("'users'", -1)),
+            'trg_blacklist_count_insert': ('AFTER INSERT ON blacklist', bump("'blacklist'", 1)),
+            'trg_blacklist_count_delete': ('AFTER DELETE ON blacklist', bump("'blacklist'", -1)),
+            'trg_applications_count_insert': (
+                'AFTER INSERT ON applications',
+                bump("'applications:' || new.status", 1)
+                + bump("'second_block:' || new.status", 1, 'new.second_block')
+                + "INSERT INTO daily_submissions (day, submitted) VALUES (date(new.created_at), 1) "
+                  "ON CONFLICT (day) DO UPDATE SET submitted = submitted + 1;"
+            ),
+            'trg_applications_count_delete': (
+                'AFTER DELETE ON applications',
+                bump("'applications:' || old.status", -1)
+                + bump("'second_block:' || old.status", -1, 'old.second_block')
+            ),
+            'trg_applications_count_update': (
+                'AFTER UPDATE OF status, second_block ON applications '
+                'WHEN old.status IS NOT new.status OR old.second_block IS NOT new.second_block',
+                bump("'applications:' || old.status", -1)
+                + bump("'second_block:' || old.status", -1, 'old.second_block')
+                + bump("'applications:' || new.status", 1)
+                + bump("'second_block:' || new.status", 1, 'new.second_block')
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+    
+    def _create_events(self, cursor):
+        """
+        Вечера и архив заявок.
+        
+        Заявки принадлежат вечеру (event_id); открыт всегда ровно один.
+        В основной таблице лежат только заявки открытого вечера: при
+        закрытии (close_event) они переносятся в архив, поэтому рабочие
+        запросы не замедляются с ростом истории. Заявки, поданные до
+        появления вечеров, относятся к первому.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                opened_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                closed_at DATETIME,
+                applications INTEGER
+            )
+        ''')
+        row = cursor.execute('SELECT event_id FROM events WHERE closed_at IS NULL').fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO events DEFAULT VALUES')
+            row = (cursor.lastrowid,)
+            logger.info(f"Открыт вечер #{row[0]}")
+        self._current_event_id = row[0]
+        
+        if 'event_id' not in {column[1] for column in cursor.execute('PRAGMA table_info(applications)')}:
+            self._add_missing_columns(cursor, 'applications', {'event_id': 'INTEGER'})
+            cursor.execute('UPDATE applications SET event_id = ?', (self._current_event_id,))
+        
+        # Архив: заявки закрытых вечеров; текст хранится как есть (poem_text)
+        # или сжатым zlib (poem_zlib). Поиск — по собственному FTS5-индексу
+        # без копии текста (contentless)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive.archived_applications (
+                application_id INTEGER PRIMARY KEY,
+                event_id INTEGER NOT NULL,
+                user_id INTEGER,
+                poem_text TEXT,
+                poem_zlib BLOB,
+                second_block BOOLEAN,
+                status TEXT,
+                created_at DATETIME,
+                updated_at DATETIME,
+                line_count INTEGER,
+                word_count INTEGER,
+                char_count INTEGER,
+                reading_seconds INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archived_applications_event
+            ON archived_applications (event_id, status)
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS archive.archived_fts USING fts5(
+                poem_text,
+                content = '',
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        # Версия 1: в индексе архива «ё» сведена к «е» (fold_yo). Архив,
+        # записанный раньше, переиндексируется один раз из своих же текстов
+        if cursor.execute('PRAGMA archive.user_version').fetchone()[0] < 1:
+            cursor.execute("INSERT INTO archive.archived_fts (archived_fts) VALUES ('delete-all')")
+            cursor.execute(f'''
+                INSERT INTO archive.archived_fts (rowid, poem_text)
+                SELECT application_id, {fold_yo('COALESCE(poem_text, zlib_decompress(poem_zlib))')}
+                FROM archive.archived_applications
+            ''')
+            cursor.execute('PRAGMA archive.user_version = 1')
+    
+    @staticmethod
+    def _add_missing_columns(cursor, table: str, columns: Dict[str, str]):
+        """Добавить в существующую таблицу недостающие колонки"""
+        existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                logger.info(f"В таблицу {table} добавлена колонка {name}")
+    
     def init_content(self):
         """Инициализация базового контента"""
         cursor = self.conn.cursor()
@@ -82,9 +484,19 @@ class Database:
     def add_user(self, user_id: int, username: str, first_name: str, last_name: str):
         """Добавление/обновление пользователя"""
         cursor = self.conn.cursor()
+        # UPSERT, а не INSERT OR REPLACE: REPLACE удаляет строку без
+        # триггеров удаления (поисковый индекс) и сбрасывает created_at;
+        # неизменившиеся данные не перезаписываются
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
+            INSERT INTO users (user_id, username, first_name, last_name)
             VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name
+            WHERE username IS NOT excluded.username
+               OR first_name IS NOT excluded.first_name
+               OR last_name IS NOT excluded.last_name
         ''', (user_id, username, first_name, last_name))
         self.conn.commit()
     
@@ -94,24 +506,68 @@ class Database:
         cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
         return cursor.fetchone()
     
+    # Справочник пользователей
+    def backfill_user_directory(self, batch: int) -> int:
+        """Добавить в индекс пользователей следующую порцию непроиндексированных; 0 — все готово"""
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO users_fts (rowid, username, first_name, last_name)
+                SELECT user_id, username, first_name, last_name FROM users
+                WHERE NOT EXISTS (SELECT 1 FROM users_fts_docsize d WHERE d.id = users.user_id)
+                LIMIT ?
+            ''', (batch,))
+        return cursor.rowcount
+    
+    def search_users(self, terms: List[str], limit: int = 10):
+        """
+        Пользователи, у которых каждое слово из terms (от 3 символов) входит
+        в username, имя или фамилию: подстрочный поиск по триграммному
+        индексу. Точное совпадение username идет первым.
+        """
+        if not terms:
+            return []
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        cursor = self.conn.execute('''
+            SELECT user_id, username, first_name, last_name FROM users
+            WHERE user_id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?)
+            ORDER BY username = ? COLLATE NOCASE DESC, first_name COLLATE NOCASE, user_id
+            LIMIT ?
+        ''', (match, ' '.join(terms), limit))
+        return cursor.fetchall()
+    
+    def search_users_by_username_prefix(self, prefix: str, limit: int = 10):
+        """Пользователи, чей username начинается с prefix (по индексу, без учета регистра)"""
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        cursor = self.conn.execute('''
+            SELECT user_id, username, first_name, last_name FROM users
+            WHERE username LIKE ? ESCAPE '\\'
+            ORDER BY username COLLATE NOCASE
+            LIMIT ?
+        ''', (pattern, limit))
+        return cursor.fetchall()
+    
     # Методы для работы с черным списком
     def is_user_blacklisted(self, user_id: int) -> bool:
         """Проверка, находится ли пользователь в черном списке"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT 1 FROM blacklist WHERE user_id = ?', (user_id,))
-        return cursor.fetchone() is not None
+        if self._blacklist_cache is None:
+            self.warm_blacklist()
+        return user_id in self._blacklist_cache
     
     def add_to_blacklist(self, user_id: int):
         """Добавление пользователя в черный список"""
         cursor = self.conn.cursor()
         cursor.execute('INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)', (user_id,))
         self.conn.commit()
+        if self._blacklist_cache is not None:
+            self._blacklist_cache.add(user_id)
     
     def remove_from_blacklist(self, user_id: int):
         """Удаление пользователя из черного списка"""
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM blacklist WHERE user_id = ?', (user_id,))
         self.conn.commit()
+        if self._blacklist_cache is not None:
+            self._blacklist_cache.discard(user_id)
     
     def get_blacklist(self):
         """Получение всего черного списка"""
@@ -119,16 +575,81 @@ class Database:
         cursor.execute('SELECT user_id FROM blacklist')
         return [row[0] for row in cursor.fetchall()]
     
+    def match_import_usernames(self, usernames: Set[str]) -> Dict[str, int]:
+        """
+        Каким пользователям принадлежат usernames (без учета регистра).
+        Записи кладутся во временную таблицу и сверяются одним запросом
+        по индексу. Возвращает {username в нижнем регистре: user_id}.
+        """
+        with self.conn:
+            self.conn.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS import_usernames (username TEXT PRIMARY KEY COLLATE NOCASE)'
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO temp.import_usernames VALUES (?)', ((name,) for name in usernames)
+            )
+            by_username = {row['username'].lower(): row['user_id'] for row in self.conn.execute(
+                'SELECT u.user_id, u.username FROM temp.import_usernames n '
+                'JOIN users u ON u.username = n.username COLLATE NOCASE'
+            )}
+            self.conn.execute('DELETE FROM temp.import_usernames')
+        return by_username
+    
+    def add_many_to_blacklist(self, user_ids: List[int]) -> int:
+        """Добавить пользователей в черный список одной транзакцией; возвращает число новых записей"""
+        with self.conn:
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)', ((user_id,) for user_id in user_ids)
+            )
+        if self._blacklist_cache is not None:
+            self._blacklist_cache.update(user_ids)
+        return cursor.rowcount
+    
+    def iter_blacklist_export(self):
+        """Весь черный список с данными пользователей для выгрузки (курсор, без загрузки в память)"""
+        return self.conn.execute('''
+            SELECT b.user_id, u.username, u.first_name, u.last_name, b.created_at
+            FROM blacklist b
+            LEFT JOIN users u ON u.user_id = b.user_id
+            ORDER BY b.user_id
+        ''')
+    
+    def get_blacklist_page(self, limit: int, after: Optional[int] = None, before: Optional[int] = None):
+        """
+        Страница черного списка вместе с данными пользователей одним запросом.
+        
+        Keyset-пагинация по user_id: after — последний ID предыдущей
+        страницы, before — первый ID следующей (переход назад). Запрос идет
+        по первичному ключу, поэтому стоимость страницы не зависит от
+        размера списка. Для пользователей, которых нет в users, known = 0.
+        """
+        query = '''
+            SELECT b.user_id, u.user_id IS NOT NULL AS known, u.username, u.first_name, u.last_name
+            FROM blacklist b
+            LEFT JOIN users u ON u.user_id = b.user_id
+            WHERE b.user_id {op} ?
+            ORDER BY b.user_id {order}
+            LIMIT ?
+        '''
+        if before is not None:
+            rows = self.conn.execute(query.format(op='<', order='DESC'), (before, limit)).fetchall()
+            return rows[::-1]
+        start = after if after is not None else -(1 << 63)
+        return self.conn.execute(query.format(op='>', order='ASC'), (start, limit)).fetchall()
+    
     # Методы для работы с контентом
     def get_content(self, key: str):
         """Получение контента по ключу"""
+        if key in self._content_cache:
+            return self._content_cache[key]
+        
         cursor = self.conn.cursor()
         cursor.execute('SELECT value FROM content WHERE key = ?', (key,))
         result = cursor.fetchone()
         
-        # Добавляем логирование для отладки
         if result:
             logger.info(f"Найден контент для ключа '{key}': {result[0][:100]}...")
+            self._content_cache[key] = result[0]
         else:
             logger.warning(f"Контент для ключа '{key}' не найден")
         
@@ -142,6 +663,7 @@ class Database:
             VALUES (?, ?, CURRENT_TIMESTAMP)
         ''', (key, value))
         self.conn.commit()
+        self._content_cache[key] = value
     
     # Методы для работы с заявками
     def get_user_application(self, user_id: int):
@@ -155,15 +677,58 @@ class Database:
         return cursor.fetchone()
     
     def create_application(self, user_id: int, poem_text: str, second_block: bool = False):
-        """Создание новой заявки"""
+        """Создание новой заявки (вместе с объемом стихотворения)"""
+        metrics = measure_poem(poem_text)
         cursor = self.conn.cursor()
         cursor.execute('''
-            INSERT INTO applications (user_id, poem_text, second_block, status)
-            VALUES (?, ?, ?, 'pending')
-        ''', (user_id, poem_text, second_block))
+            INSERT INTO applications (
+                user_id, poem_text, second_block, status, event_id,
+                line_count, word_count, char_count, reading_seconds
+            )
+            VALUES (?, ?, ?, 'pending', ?, ?, ?, ?, ?)
+        ''', (user_id, poem_text, second_block, self._current_event_id, metrics.line_count,
+              metrics.word_count, metrics.char_count, metrics.reading_seconds))
         self.conn.commit()
         return cursor.lastrowid
     
+    def backfill_poem_metrics(self, batch: int) -> int:
+        """Посчитать объем следующей порции старых заявок; 0 — все измерены"""
+        rows = self.conn.execute('''
+            SELECT application_id, poem_text FROM applications
+            WHERE reading_seconds IS NULL
+            ORDER BY application_id
+            LIMIT ?
+        ''', (batch,)).fetchall()
+        if not rows:
+            return 0
+        updates = []
+        for row in rows:
+            metrics = measure_poem(row['poem_text'])
+            updates.append((metrics.line_count, metrics.word_count, metrics.char_count,
+                            metrics.reading_seconds, row['application_id']))
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE applications
+                SET line_count = ?, word_count = ?, char_count = ?, reading_seconds = ?
+                WHERE application_id = ?
+            ''', updates)
+        return len(rows)
+    
+    def get_program_length(self):
+        """
+        Число заявок и суммарное время чтения по статусу и второму блоку.
+        unmeasured — заявки, объем которых еще не посчитан.
+        """
+        cursor = self.conn.execute('''
+            SELECT status, second_block,
+                   COUNT(*) AS applications,
+                   COALESCE(SUM(reading_seconds), 0) AS reading_seconds,
+                   COUNT(*) - COUNT(reading_seconds) AS unmeasured
+            FROM applications
+            GROUP BY status, second_block
+        ''')
+        return cursor.fetchall()
+    
     def get_all_users(self):
         """Получение всех пользователей для рассылки"""
         cursor = self.conn.cursor()
@@ -235,24 +800,288 @@ class Database:
     
 
 
-    def get_applications_count(self):
-        """Получение количества заявок"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM applications')
-        return cursor.fetchone()[0]
+    # Очередь модерации
+    def claim_next_application(self, moderator_id: int, lease_seconds: float, exclude: Optional[int] = None):
+        """
+        Закрепить за модератором следующую свободную заявку.
+        
+        Одним UPDATE ... RETURNING, поэтому два модератора не получат одну
+        заявку. Своя незавершенная заявка выдается повторно, чужая — только
+        после истечения аренды. Возвращает application_id или None.
+        """
+        now = time.time()
+        row = self.conn.execute('''
+            UPDATE applications
+            SET claimed_by = ?, claim_expires_at = ?
+            WHERE application_id = (
+                SELECT application_id FROM applications
+                WHERE status = 'pending'
+                  AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires_at <= ?)
+                  AND application_id IS NOT ?
+                ORDER BY claimed_by IS ? DESC, created_at ASC, application_id ASC
+                LIMIT 1
+            )
+            RETURNING application_id
+        ''', (moderator_id, now + lease_seconds, moderator_id, now, exclude, moderator_id)).fetchone()
+        self.conn.commit()
+        return row[0] if row else None
     
-    def delete_all_applications(self):
-        """Удаление всех заявок"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM applications')
+    def release_application_claim(self, application_id: int, moderator_id: int):
+        """Снять закрепление заявки за модератором"""
+        self.conn.execute('''
+            UPDATE applications SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE application_id = ? AND claimed_by = ?
+        ''', (application_id, moderator_id))
         self.conn.commit()
-        return cursor.rowcount
     
-    def delete_application(self, application_id: int):
-        """Удаление заявки"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM applications WHERE application_id = ?', (application_id,))
+    def decide_application(self, application_id: int, status: str, moderator_id: int) -> bool:
+        """
+        Сменить статус заявки, если она еще ждет решения и не закреплена
+        за другим модератором. Возвращает False, если решение опоздало.
+        """
+        cursor = self.conn.execute('''
+            UPDATE applications
+            SET status = ?, updated_at = CURRENT_TIMESTAMP, claimed_by = NULL, claim_expires_at = NULL
+            WHERE application_id = ? AND status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires_at <= ?)
+        ''', (status, application_id, moderator_id, time.time()))
         self.conn.commit()
+        return cursor.rowcount == 1
+    
+    def get_pending_queue_counts(self) -> Dict[str, int]:
+        """Сколько заявок ждет решения и сколько из них сейчас закреплено"""
+        row = self.conn.execute('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(claimed_by IS NOT NULL AND claim_expires_at > ?), 0)
+            FROM applications WHERE status = 'pending'
+        ''', (time.time(),)).fetchone()
+        return {'pending': row[0], 'claimed': row[1]}
+    
+    # Индекс похожих стихов
+    def add_poem_signature(self, application_id: int, signature: bytes, buckets: List[int]):
+        """Сохранить подпись заявки и ее LSH-корзины (по одной на полосу)"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO poem_signatures (application_id, signature) VALUES (?, ?)',
+                (application_id, signature)
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO poem_lsh (band, bucket, application_id) VALUES (?, ?, ?)',
+                ((band, bucket, application_id) for band, bucket in enumerate(buckets))
+            )
+    
+    def get_poem_candidates(self, buckets: List[int], exclude: int):
+        """
+        Заявки открытого вечера и архива, совпавшие хотя бы в одной
+        LSH-корзине, с подписями и статусом
+        """
+        if not buckets:
+            return []
+        pairs = ' OR '.join('(band = ? AND bucket = ?)' for _ in buckets)
+        params = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+        cursor = self.conn.execute(f'''
+            SELECT s.application_id, s.signature, COALESCE(a.status, r.status) as status
+            FROM poem_signatures s
+            LEFT JOIN applications a ON a.application_id = s.application_id
+            LEFT JOIN archive.archived_applications r ON r.application_id = s.application_id
+            WHERE s.application_id IN (SELECT DISTINCT application_id FROM poem_lsh WHERE {pairs})
+              AND s.application_id != ?
+              AND (a.application_id IS NOT NULL OR r.application_id IS NOT NULL)
+        ''', (*params, exclude))
+        return cursor.fetchall()
+    
+    def get_poem_signature(self, application_id: int) -> Optional[bytes]:
+        row = self.conn.execute(
+            'SELECT signature FROM poem_signatures WHERE application_id = ?', (application_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def get_unindexed_applications(self, limit: int) -> List[Dict]:
+        """
+        Заявки без подписи в индексе похожих стихов: поданные до появления
+        индекса и архивные, чьи подписи удалялись при закрытии вечера
+        """
+        cursor = self.conn.execute('''
+            SELECT application_id, poem_text, poem_zlib FROM (
+                SELECT application_id, poem_text, NULL as poem_zlib FROM applications
+                UNION ALL
+                SELECT application_id, poem_text, poem_zlib FROM archive.archived_applications
+            ) AS all_applications
+            WHERE NOT EXISTS (
+                SELECT 1 FROM poem_signatures s WHERE s.application_id = all_applications.application_id
+            )
+            ORDER BY application_id
+            LIMIT ?
+        ''', (limit,))
+        rows = []
+        for row in cursor.fetchall():
+            text = row['poem_text'] if row['poem_zlib'] is None else _decompress(row['poem_zlib'])
+            rows.append({'application_id': row['application_id'], 'poem_text': text})
+        return rows
+    
+    # Полнотекстовый поиск по стихам
+    def backfill_poem_search(self, batch: int) -> int:
+        """Добавить в поисковый индекс следующую порцию старых заявок; 0 — все готово"""
+        with self.conn:
+            state = dict(self.conn.execute(
+                "SELECT key, value FROM index_state WHERE key IN ('poem_fts_target', 'poem_fts_done')"
+            ).fetchall())
+            done, target = state.get('poem_fts_done', 0), state.get('poem_fts_target', 0)
+            if done >= target:
+                return 0
+            upper = self.conn.execute('''
+                SELECT MAX(application_id) FROM (
+                    SELECT application_id FROM applications
+                    WHERE application_id > ? AND application_id <= ?
+                    ORDER BY application_id LIMIT ?
+                )
+            ''', (done, target, batch)).fetchone()[0] or target
+            cursor = self.conn.execute(f'''
+                INSERT INTO applications_fts (rowid, poem_text)
+                SELECT application_id, {fold_yo('poem_text')} FROM applications
+                WHERE application_id > ? AND application_id <= ?
+            ''', (done, upper))
+            self.conn.execute(
+                "UPDATE index_state SET value = ? WHERE key = 'poem_fts_done'", (upper,)
+            )
+        return max(cursor.rowcount, 1)
+    
+    def search_poems(self, match: str, status: Optional[str] = None, second_block: Optional[bool] = None,
+                     limit: int = 5, offset: int = 0):
+        """
+        Заявки, подходящие под FTS5-запрос match, по релевантности (bm25).
+        Совпадения во фрагменте отмечены символами STX ... ETX (char(2), char(3)).
+        Возвращает (строки страницы, общее число найденных).
+        """
+        filters = '''
+            FROM applications_fts
+            JOIN applications a ON a.application_id = applications_fts.rowid
+            WHERE applications_fts MATCH ?
+              AND (? IS NULL OR a.status = ?)
+              AND (? IS NULL OR a.second_block = ?)
+        '''
+        params = (match, status, status, second_block, second_block)
+        total = self.conn.execute(f'SELECT COUNT(*) {filters}', params).fetchone()[0]
+        rows = self.conn.execute(f'''
+            SELECT
+                a.application_id, a.status, a.second_block, a.created_at,
+                COALESCE(u.first_name, 'Неизвестный') as first_name,
+                snippet(applications_fts, 0, char(2), char(3), '…', 16) as snippet
+            {filters.replace('WHERE', 'LEFT JOIN users u ON u.user_id = a.user_id WHERE', 1)}
+            ORDER BY bm25(applications_fts)
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset)).fetchall()
+        return rows, total
+    
+    def get_applications_count(self):
+        """Получение количества заявок (по счетчикам, без обхода таблицы)"""
+        return sum(self.get_counters('applications:').values())
+    
+    # Статистика по счетчикам, которые ведут триггеры
+    def get_counters(self, prefix: str = '') -> Dict[str, int]:
+        """Счетчики, чьи имена начинаются с prefix (поиск по первичному ключу)"""
+        cursor = self.conn.execute('''
+            SELECT name, value FROM counters
+            WHERE name >= ? AND name < ? || char(1114111)
+        ''', (prefix, prefix))
+        return {row['name']: row['value'] for row in cursor.fetchall()}
+    
+    def get_blacklist_count(self) -> int:
+        """Размер черного списка"""
+        return self.get_counters('blacklist').get('blacklist', 0)
+    
+    def get_daily_submissions(self, days: int):
+        """Поданные заявки за последние days дней (UTC), по дням по возрастанию"""
+        cursor = self.conn.execute('''
+            SELECT day, submitted FROM daily_submissions
+            WHERE day > date('now', ?)
+            ORDER BY day
+        ''', (f'-{days} days',))
+        return cursor.fetchall()
+    
+    # Вечера и архив
+    def get_current_event(self):
+        """Открытый вечер: event_id и opened_at"""
+        return self.conn.execute(
+            'SELECT event_id, opened_at FROM events WHERE event_id = ?', (self._current_event_id,)
+        ).fetchone()
+    
+    def close_event(self) -> Dict[str, int]:
+        """
+        Закрыть текущий вечер: все его заявки одной транзакцией переносятся
+        в архив (текст сжимается, если включен ARCHIVE_COMPRESS) и
+        удаляются из основной таблицы, затем открывается следующий вечер.
+        В основной таблице только заявки открытого вечера, поэтому
+        переносится она целиком; строки без event_id (вставленные в обход
+        create_application) тоже относятся к нему. Подписи похожих стихов
+        остаются на месте: новые заявки сравниваются и с архивом.
+        """
+        event_id = self._current_event_id
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO archive.archived_applications (
+                    application_id, event_id, user_id, poem_text, poem_zlib, second_block, status,
+                    created_at, updated_at, line_count, word_count, char_count, reading_seconds
+                )
+                SELECT
+                    application_id, COALESCE(event_id, :event_id), user_id,
+                    CASE WHEN :compress THEN NULL ELSE poem_text END,
+                    CASE WHEN :compress THEN zlib_compress(poem_text) END,
+                    second_block, status, created_at, updated_at,
+                    line_count, word_count, char_count, reading_seconds
+                FROM applications
+            ''', {'compress': ARCHIVE_COMPRESS, 'event_id': event_id})
+            self.conn.execute(f'''
+                INSERT INTO archive.archived_fts (rowid, poem_text)
+                SELECT application_id, {fold_yo('poem_text')} FROM applications
+            ''')
+            archived = self.conn.execute('DELETE FROM applications').rowcount
+            self.conn.execute('''
+                UPDATE events SET closed_at = CURRENT_TIMESTAMP, applications = ? WHERE event_id = ?
+            ''', (archived, event_id))
+            next_event_id = self.conn.execute('INSERT INTO events DEFAULT VALUES').lastrowid
+        self._current_event_id = next_event_id
+        logger.info(f"Вечер #{event_id} закрыт, в архив перенесено заявок: {archived}; открыт вечер #{next_event_id}")
+        return {'event_id': event_id, 'archived': archived, 'next_event_id': next_event_id}
+    
+    def search_archived_poems(self, match: str, status: Optional[str] = None, second_block: Optional[bool] = None,
+                              limit: int = 5, offset: int = 0):
+        """
+        Заявки прошедших вечеров под FTS5-запрос match, по релевантности.
+        Возвращает (словари с расжатым poem_text, общее число найденных).
+        """
+        filters = '''
+            FROM archive.archived_fts
+            JOIN archive.archived_applications a ON a.application_id = archived_fts.rowid
+            WHERE archived_fts MATCH ?
+              AND (? IS NULL OR a.status = ?)
+              AND (? IS NULL OR a.second_block = ?)
+        '''
+        params = (match, status, status, second_block, second_block)
+        total = self.conn.execute(f'SELECT COUNT(*) {filters}', params).fetchone()[0]
+        rows = self.conn.execute(f'''
+            SELECT
+                a.application_id, a.event_id, a.status, a.second_block, a.created_at,
+                a.poem_text, a.poem_zlib,
+                COALESCE(u.first_name, 'Неизвестный') as first_name
+            {filters.replace('WHERE', 'LEFT JOIN users u ON u.user_id = a.user_id WHERE', 1)}
+            ORDER BY bm25(archived_fts)
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset)).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            if result.pop('poem_zlib') is not None:
+                result['poem_text'] = zlib.decompress(row['poem_zlib']).decode('utf-8')
+            results.append(result)
+        return results, total
+    
+    def delete_application(self, application_id: int):
+        """Удаление заявки вместе с ее подписью в индексе похожих стихов"""
+        with self.conn:
+            self.conn.execute('DELETE FROM applications WHERE application_id = ?', (application_id,))
+            self.conn.execute('DELETE FROM poem_signatures WHERE application_id = ?', (application_id,))
+            self.conn.execute('DELETE FROM poem_lsh WHERE application_id = ?', (application_id,))
     
     def get_approved_applications(self):
         """Получение всех принятых заявок - ИСПРАВЛЕННЫЙ ЗАПРОС"""
@@ -284,4 +1113,44 @@ class Database:
             WHERE a.status = 'approved' AND a.second_block = 1
             ORDER BY a.created_at ASC
         ''')
-        return cursor.fetchall()
\ No newline at end of file
+        return cursor.fetchall()
+
+
+class LazyDatabase:
+    """
+    Общий экземпляр Database, создаваемый один раз.
+
+    Модули обработчиков импортируют этот объект вместо создания своих
+    Database: при импорте база не открывается. Экземпляр создается
+    в post_init приложения (initialize), а если к базе обратились
+    раньше (скрипты, бенчмарки) — при первом обращении.
+    """
+
+    def __init__(self):
+        self._instance: Optional[Database] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def initialize(self, db_name: str = DB_NAME) -> Database:
+        """Открыть базу, если она еще не открыта"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = Database(db_name)
+                    logger.info(f"База данных инициализирована: {db_name}")
+        return self._instance
+
+    def bind(self, instance: Database):
+        """Подменить экземпляр (бенчмарки на отдельной базе)"""
+        with self._lock:
+            self._instance = instance
+
+    def __getattr__(self, name):
+        return getattr(self.initialize(), name)
+
+
+# Глобальный экземпляр
+db = LazyDatabase()
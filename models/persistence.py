@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from typing import Dict, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import DB_NAME
+
+logger = logging.getLogger(__name__)
+
+# Кэши, которые обработчики сами перечитывают из базы — их не храним
+TRANSIENT_KEYS = frozenset({'admin_applications', 'admin_applications_timestamp'})
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранение context.user_data в базе бота.
+
+    В отличие от PicklePersistence, данные лежат построчно (пользователь,
+    ключ, значение в JSON): записываются только изменившиеся ключи,
+    все изменения одного прохода сохранения уходят одной транзакцией.
+    При старте ничего не загружается — данные пользователя читаются
+    при первом его апдейте, так что стоимость перезапуска зависит от
+    числа активных пользователей, а не от всех, кто когда-либо писал боту.
+    """
+
+    def __init__(self, db_name: str = DB_NAME, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_name = db_name
+        self._conn = None
+
+        # Последние сохраненные значения: по ним вычисляются измененные ключи
+        self._snapshots: Dict[int, Dict[str, str]] = {}
+        self._loaded: Set[int] = set()
+        self._pending_upserts: Dict[Tuple[int, str], str] = {}
+        self._pending_deletes: Set[Tuple[int, str]] = set()
+        self._flush_scheduled = False
+
+    def connect(self) -> sqlite3.Connection:
+        """Открыть соединение (при инициализации приложения, а не при сборке)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_data (
+                    user_id INTEGER NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (user_id, key)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.commit()
+        return self._conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self.connect()
+
+    # Загрузка
+    async def get_user_data(self) -> Dict[int, dict]:
+        # Ленивая загрузка: данные читаются в refresh_user_data
+        self.connect()
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+
+        snapshot = {}
+        for key, value in self.conn.execute('SELECT key, value FROM user_data WHERE user_id = ?', (user_id,)):
+            snapshot[key] = value
+            user_data.setdefault(key, json.loads(value))
+        if snapshot:
+            self._snapshots[user_id] = snapshot
+            logger.info(f"Загружены данные пользователя {user_id}: {len(snapshot)} ключей")
+
+    # Сохранение
+    async def update_user_data(self, user_id: int, data: dict):
+        snapshot = self._snapshots.setdefault(user_id, {})
+        current = {}
+        for key, value in data.items():
+            if key in TRANSIENT_KEYS:
+                continue
+            try:
+                current[key] = json.dumps(value, ensure_ascii=False)
+            except (TypeError, ValueError):
+                logger.debug(f"Ключ '{key}' пользователя {user_id} не сериализуется — не сохраняем")
+
+        for key, value in current.items():
+            if snapshot.get(key) != value:
+                snapshot[key] = value
+                self._pending_upserts[(user_id, key)] = value
+                self._pending_deletes.discard((user_id, key))
+        for key in [key for key in snapshot if key not in current]:
+            del snapshot[key]
+            self._pending_upserts.pop((user_id, key), None)
+            self._pending_deletes.add((user_id, key))
+
+        if not snapshot:
+            del self._snapshots[user_id]
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int):
+        for key in self._snapshots.pop(user_id, {}):
+            self._pending_upserts.pop((user_id, key), None)
+        self._loaded.discard(user_id)
+        self.conn.execute('DELETE FROM user_data WHERE user_id = ?', (user_id,))
+        self.conn.commit()
+
+    def is_loaded(self, user_id: int) -> bool:
+        """Загружены ли данные пользователя в память"""
+        return user_id in self._loaded
+
+    def forget(self, user_id: int):
+        """Выгрузка из памяти без удаления из базы: при следующем апдейте данные прочитаются снова"""
+        self._loaded.discard(user_id)
+        self._snapshots.pop(user_id, None)
+
+    def _schedule_flush(self):
+        # Все update_user_data одного прохода выполняются в одной итерации
+        # цикла событий; запись откладывается до ее конца и идет одной транзакцией
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._write_pending)
+
+    def _write_pending(self):
+        self._flush_scheduled = False
+        if not self._pending_upserts and not self._pending_deletes:
+            return
+
+        upserts = [(user_id, key, value) for (user_id, key), value in self._pending_upserts.items()]
+        deletes = list(self._pending_deletes)
+        self._pending_upserts = {}
+        self._pending_deletes = set()
+
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO user_data (user_id, key, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id, key) DO UPDATE SET value = excluded.value',
+                    upserts
+                )
+                self.conn.executemany('DELETE FROM user_data WHERE user_id = ? AND key = ?', deletes)
+            logger.debug(f"Сохранено ключей user_data: {len(upserts)}, удалено: {len(deletes)}")
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка сохранения user_data: {e}")
+            # Снимки сбрасываем, чтобы при следующем проходе ключи записались заново
+            for user_id, _, _ in upserts:
+                self._snapshots.pop(user_id, None)
+            for user_id, _ in deletes:
+                self._snapshots.pop(user_id, None)
+
+    async def flush(self):
+        self._write_pending()
+
+    # Остальные виды данных бот не хранит
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
@@ -0,0 +1,40 @@
+import math
+import re
+from dataclasses import dataclass
+
+from config import READING_WORDS_PER_MINUTE
+
+# Пауза на каждой строке при чтении со сцены, секунды
+LINE_PAUSE_SECONDS = 0.5
+
+_WORD = re.compile(r"\w+(?:[-'’]\w+)*")
+
+
+@dataclass(frozen=True)
+class PoemMetrics:
+    """Объем стихотворения; хранится в заявке, чтобы не пересчитывать текст"""
+    line_count: int
+    word_count: int
+    char_count: int
+    reading_seconds: int
+
+
+def measure_poem(text: str) -> PoemMetrics:
+    """
+    Строки (непустые), слова, знаки и оценка времени чтения вслух:
+    READING_WORDS_PER_MINUTE слов в минуту плюс короткая пауза на строку.
+    """
+    text = text or ''
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    words = len(_WORD.findall(text))
+    seconds = math.ceil(words * 60 / READING_WORDS_PER_MINUTE + lines * LINE_PAUSE_SECONDS)
+    return PoemMetrics(lines, words, len(text), seconds)
+
+
+def format_duration(seconds: int) -> str:
+    """Длительность вида «3 мин 05 с»"""
+    minutes, seconds = divmod(int(seconds or 0), 60)
+    if minutes >= 60:
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours} ч {minutes:02d} мин"
+    return f"{minutes} мин {seconds:02d} с" if minutes else f"{seconds} с"
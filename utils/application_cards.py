@@ -0,0 +1,154 @@
+import html
+import logging
+from collections import OrderedDict
+from typing import List, Tuple
+
+from config import CARD_CACHE_SIZE, READING_LIMIT_MINUTES
+from models.poem_metrics import format_duration
+
+logger = logging.getLogger(__name__)
+
+# Предел длины сообщения Telegram (символы UTF-16 после разбора HTML)
+MESSAGE_LIMIT = 4096
+# Запас под подпись страницы "(часть 2/3)"
+PAGE_LABEL_RESERVE = 32
+
+
+def visible_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: в единицах UTF-16"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _split_text(text: str, budget: int) -> List[str]:
+    """Разбить текст на части не длиннее budget, по возможности по строкам"""
+    pieces = []
+    for line in text.splitlines(keepends=True):
+        # Строку длиннее бюджета режем посимвольно
+        while visible_length(line) > budget:
+            cut = budget
+            while visible_length(line[:cut]) > budget:
+                cut -= visible_length(line[:cut]) - budget
+            pieces.append(line[:cut])
+            line = line[cut:]
+        pieces.append(line)
+
+    parts, current, current_length = [], '', 0
+    for piece in pieces:
+        length = visible_length(piece)
+        if current and current_length + length > budget:
+            parts.append(current)
+            current, current_length = '', 0
+        current += piece
+        current_length += length
+    if current or not parts:
+        parts.append(current)
+    return parts
+
+
+# Сколько похожих заявок перечислять в карточке
+MAX_DUPLICATES_SHOWN = 5
+
+STATUS_LABELS = {'pending': 'ждет', 'approved': 'принята', 'rejected': 'отклонена'}
+
+
+def _duplicates_line(duplicates) -> str:
+    if not duplicates:
+        return ''
+    shown = ', '.join(
+        f"#{match.application_id} ({match.similarity:.0%}, {STATUS_LABELS.get(match.status, match.status)})"
+        for match in duplicates[:MAX_DUPLICATES_SHOWN]
+    )
+    more = f" и еще {len(duplicates) - MAX_DUPLICATES_SHOWN}" if len(duplicates) > MAX_DUPLICATES_SHOWN else ''
+    return f"⚠️ <b>Похоже на заявки:</b> {shown}{more}\n\n"
+
+
+def metrics_line(application) -> str:
+    """Объем стихотворения из заявки; пусто, пока старая заявка не измерена"""
+    if application['reading_seconds'] is None:
+        return ''
+    too_long = application['reading_seconds'] > READING_LIMIT_MINUTES * 60
+    return (
+        f"📏 <b>Объем:</b> {application['line_count']} стр. · {application['word_count']} сл. · "
+        f"{application['char_count']} зн. · ~{format_duration(application['reading_seconds'])}"
+        f"{' ⚠️ дольше регламента' if too_long else ''}\n"
+    )
+
+
+def render_application_card(application, duplicates=()) -> Tuple[str, ...]:
+    """
+    HTML-карточка заявки для модерации.
+
+    Пользовательские поля и текст стихотворения экранируются. Если
+    карточка не помещается в одно сообщение, стихотворение делится
+    на страницы; каждая страница повторяет заголовок заявки.
+    duplicates — похожие заявки из индекса, они отмечаются в заголовке.
+    """
+    header = (
+        f"📨 <b>Заявка #{application['application_id']}</b>\n\n"
+        f"👤 <b>Автор:</b> {html.escape(application['first_name'] or '')} "
+        f"{html.escape(application['last_name'] or '')}\n"
+        f"📛 <b>Username:</b> @{html.escape(application['username'] or 'нет')}\n"
+        f"🆔 <b>ID:</b> {application['user_id']}\n"
+        f"🎭 <b>Второй блок:</b> {'✅ Да' if application['second_block'] else '❌ Нет'}\n"
+        f"📅 <b>Дата:</b> {html.escape(str(application['created_at']))}\n"
+        f"{metrics_line(application)}\n"
+        f"{_duplicates_line(duplicates)}"
+    )
+    poem = application['poem_text'] or ''
+    visible_header = visible_length(html.unescape(header.replace('<b>', '').replace('</b>', '')))
+
+    single = "📝 <b>Стихотворение:</b>\n"
+    if visible_header + visible_length(single) + visible_length(poem) <= MESSAGE_LIMIT:
+        return (header + single + html.escape(poem),)
+
+    budget = MESSAGE_LIMIT - visible_header - visible_length(single) - PAGE_LABEL_RESERVE
+    parts = _split_text(poem, budget)
+    return tuple(
+        f"{header}📝 <b>Стихотворение (часть {number}/{len(parts)}):</b>\n{html.escape(part)}"
+        for number, part in enumerate(parts, 1)
+    )
+
+
+class ApplicationCardCache:
+    """
+    Ограниченный кэш отрисованных карточек заявок.
+
+    Ключ — (application_id, updated_at, объем, похожие заявки): любое
+    изменение заявки в базе меняет updated_at, дозаполнение объема —
+    reading_seconds, а новая похожая заявка — список похожих, и карточка
+    отрисовывается заново. Хранится не более max_entries карточек,
+    вытесняются давно не показанные.
+    """
+
+    def __init__(self, max_entries: int = CARD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cards: 'OrderedDict[tuple, Tuple[str, ...]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def pages(self, application, duplicates=()) -> Tuple[str, ...]:
+        """Страницы карточки заявки (одна, если она помещается в сообщение)"""
+        key = (application['application_id'], application['updated_at'],
+               application['reading_seconds'], tuple(duplicates))
+        pages = self._cards.get(key)
+        if pages is not None:
+            self._cards.move_to_end(key)
+            self.hits += 1
+            return pages
+
+        self.misses += 1
+        pages = render_application_card(application, duplicates)
+        self._cards[key] = pages
+        while len(self._cards) > self.max_entries:
+            self._cards.popitem(last=False)
+        return pages
+
+    def clear(self):
+        self._cards.clear()
+
+    def stats(self) -> dict:
+        return {'cards': len(self._cards), 'hits': self.hits, 'misses': self.misses}
+
+
+# Глобальный экземпляр
+card_cache = ApplicationCardCache()
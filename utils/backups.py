@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import datetime
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+from config import BACKUP_DIR, BACKUP_KEEP, BACKUP_PAGES_PER_STEP, BACKUP_STEP_PAUSE
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Копируются основная база и подключенный к ней архив вечеров
+SCHEMAS = ('main', 'archive')
+SUFFIX = '.db.gz'
+
+
+@dataclass(frozen=True)
+class BackupResult:
+    files: Tuple[str, ...]
+    size: int
+    pages: int
+    seconds: float
+
+
+def check_integrity(path: str) -> str:
+    """Результат PRAGMA integrity_check для файла базы ('ok', если все в порядке)"""
+    conn = sqlite3.connect(path)
+    try:
+        return '\n'.join(row[0] for row in conn.execute('PRAGMA integrity_check'))
+    finally:
+        conn.close()
+
+
+def _gzip(source: str, target: str):
+    with open(source, 'rb') as src, gzip.open(target + '.part', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(target + '.part', target)
+
+
+def restore_backup(path: str, target: str) -> str:
+    """
+    Распаковать копию рядом с target, проверить целостность и только
+    потом заменить target. Бот в это время должен быть остановлен.
+    """
+    unpacked = target + '.restore'
+    try:
+        with gzip.open(path, 'rb') as src, open(unpacked, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        result = check_integrity(unpacked)
+        if result != 'ok':
+            raise ValueError(f"Копия {path} повреждена: {result}")
+        os.replace(unpacked, target)
+    finally:
+        if os.path.exists(unpacked):
+            os.remove(unpacked)
+    return result
+
+
+class BackupManager:
+    """
+    Резервные копии без остановки бота через SQLite backup API.
+
+    Копия снимается с того же соединения, через которое пишут
+    обработчики: SQLite сам переносит в нее их изменения, и копирование
+    не начинается заново. Страницы копируются порциями по pages_per_step
+    с паузой step_pause между ними, поэтому база блокируется только на
+    время одной порции; незавершенная транзакция соединения просто
+    откладывает следующую порцию. Работа идет в отдельном потоке.
+
+    Каждая копия проверяется integrity_check, сжимается gzip и
+    хранится в directory; остаются keep последних.
+    """
+
+    def __init__(self, directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+                 pages_per_step: int = BACKUP_PAGES_PER_STEP, step_pause: float = BACKUP_STEP_PAUSE):
+        self.directory = directory
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self._lock = asyncio.Lock()
+        self.last: Optional[BackupResult] = None
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _prefix(self) -> str:
+        return os.path.splitext(os.path.basename(db.db_name))[0] + '-'
+
+    def _copy(self, schema: str, target: str) -> int:
+        """Скопировать схему в файл target порциями; возвращает число страниц"""
+        pages = 0
+
+        # Пауза между порциями — здесь: sleep у backup() — это ожидание
+        # перед повтором занятой порции, а не пауза между порциями
+        def progress(status, remaining, total):
+            nonlocal pages
+            pages = total
+            if remaining:
+                time.sleep(self.step_pause)
+
+        dst = sqlite3.connect(target)
+        try:
+            db.conn.backup(dst, pages=self.pages_per_step, progress=progress, name=schema)
+        finally:
+            dst.close()
+        result = check_integrity(target)
+        if result != 'ok':
+            raise RuntimeError(f"Копия схемы {schema} не прошла проверку: {result}")
+        return pages
+
+    def _run(self) -> BackupResult:
+        started = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        files, pages = [], 0
+        for schema in SCHEMAS:
+            unpacked = os.path.join(self.directory, f'.{self._prefix()}{stamp}-{schema}.db')
+            try:
+                pages += self._copy(schema, unpacked)
+                target = os.path.join(self.directory, f'{self._prefix()}{stamp}-{schema}{SUFFIX}')
+                _gzip(unpacked, target)
+                files.append(target)
+            finally:
+                if os.path.exists(unpacked):
+                    os.remove(unpacked)
+        self._rotate()
+        return BackupResult(
+            tuple(files), sum(os.path.getsize(path) for path in files), pages, time.monotonic() - started
+        )
+
+    def _rotate(self):
+        """Удалить копии старше keep последних"""
+        prefix = self._prefix()
+        stamps = sorted({
+            name[len(prefix):len(prefix) + len('YYYYmmdd-HHMMSS')]
+            for name in os.listdir(self.directory)
+            if name.startswith(prefix) and name.endswith(SUFFIX)
+        })
+        for stamp in stamps[:-self.keep]:
+            for schema in SCHEMAS:
+                path = os.path.join(self.directory, f'{prefix}{stamp}-{schema}{SUFFIX}')
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info(f"Удалена старая резервная копия {stamp}")
+
+    async def backup(self) -> Optional[BackupResult]:
+        """Снять копию; None, если копия уже снимается"""
+        if self._lock.locked():
+            return None
+        async with self._lock:
+            try:
+                result = await asyncio.to_thread(self._run)
+            except Exception:
+                self.failures += 1
+                raise
+        self.last = result
+        logger.info(
+            f"Резервная копия готова: {', '.join(os.path.basename(path) for path in result.files)}, "
+            f"{result.pages} страниц, {result.size // 1024} КБ, {result.seconds:.1f} с"
+        )
+        return result
+
+    async def backup_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Резервная копия по расписанию"""
+        try:
+            await self.backup()
+        except Exception as e:
+            logger.error(f"Не удалось создать резервную копию: {e}")
+
+
+# Глобальный экземпляр
+backup_manager = BackupManager()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и восстановление резервных копий")
+    commands = parser.add_subparsers(dest='command', required=True)
+    verify = commands.add_parser('verify', help="распаковать во временный файл и проверить целостность")
+    verify.add_argument('backup')
+    restore = commands.add_parser('restore', help="проверить копию и заменить ею файл базы (бот остановлен)")
+    restore.add_argument('backup')
+    restore.add_argument('target')
+    args = parser.parse_args()
+
+    if args.command == 'verify':
+        target = os.path.join(os.path.dirname(os.path.abspath(args.backup)), '.verify.db')
+        try:
+            print(restore_backup(args.backup, target))
+        finally:
+            if os.path.exists(target):
+                os.remove(target)
+    else:
+        print(restore_backup(args.backup, args.target))
+
+
+if __name__ == '__main__':
+    main()
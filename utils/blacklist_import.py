@@ -0,0 +1,78 @@
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Set
+
+from models import db
+
+# Username Telegram: 5–32 символа, латиница, цифры и подчеркивание
+_USERNAME = re.compile(r'@?([A-Za-z][A-Za-z0-9_]{4,31})')
+_FIRST_FIELD = re.compile(r'[,;\t ]')
+# Названия первого столбца в строке заголовка CSV
+HEADER_FIELDS = {'user_id', 'id', 'username'}
+# Сколько нераспознанных записей показывать в отчете
+MAX_EXAMPLES = 10
+
+
+@dataclass
+class ParsedImport:
+    """Записи из файла: ID и username без повторов"""
+    lines: int = 0
+    user_ids: Set[int] = field(default_factory=set)
+    usernames: Set[str] = field(default_factory=set)
+    invalid: int = 0
+
+
+@dataclass
+class ImportReport:
+    parsed: ParsedImport
+    added: int
+    already: int
+    protected: int
+    unknown_usernames: List[str]
+
+
+def parse_entries(lines: Iterable[str]) -> ParsedImport:
+    """
+    Разбор файла построчно, без чтения целиком: одна запись на строку,
+    в CSV берется первый столбец (так читается и выгрузка черного
+    списка). Число — ID, остальное — username с @ или без. Пустые строки
+    и строки с # пропускаются, как и заголовок CSV в первой строке.
+    """
+    parsed = ParsedImport()
+    for line in lines:
+        parsed.lines += 1
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        entry = _FIRST_FIELD.split(line, 1)[0].strip('"\'')
+        if parsed.lines == 1 and entry.lower() in HEADER_FIELDS:
+            continue
+        if entry.isascii() and entry.isdigit():
+            parsed.user_ids.add(int(entry))
+            continue
+        match = _USERNAME.fullmatch(entry)
+        if match:
+            parsed.usernames.add(match.group(1).lower())
+        else:
+            parsed.invalid += 1
+    return parsed
+
+
+def import_blacklist(parsed: ParsedImport, protected: Set[int]) -> ImportReport:
+    """
+    Добавить записи в черный список одной транзакцией. ID добавляются
+    как есть, даже без записи в users — как и при вводе ID вручную;
+    username сверяются с users одним запросом. protected (организатор,
+    модераторы) не добавляются.
+    """
+    by_username = db.match_import_usernames(parsed.usernames)
+    resolved = parsed.user_ids | set(by_username.values())
+    skipped = resolved & protected
+    added = db.add_many_to_blacklist(sorted(resolved - skipped))
+    return ImportReport(
+        parsed=parsed,
+        added=added,
+        already=len(resolved) - len(skipped) - added,
+        protected=len(skipped),
+        unknown_usernames=sorted(parsed.usernames - set(by_username)),
+    )
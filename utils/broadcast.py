@@ -1,10 +1,9 @@
 import logging
-import asyncio
 from telegram.error import TelegramError
-from models import Database
+from models import db
+from .outbound_scheduler import PRIORITY_BULK
 
 logger = logging.getLogger(__name__)
-db = Database()
 
 async def send_broadcast(context, broadcast_text: str) -> dict:
     """
@@ -24,15 +23,15 @@ async def send_broadcast(context, broadcast_text: str) -> dict:
     
     for user_id in users_to_send:
         try:
+            # Темп отправки задает планировщик исходящих сообщений: рассылка
+            # идет с низшим приоритетом и не задерживает ответы пользователям
             await context.bot.send_message(
                 chat_id=user_id,
-                text=broadcast_text
+                text=broadcast_text,
+                rate_limit_args={'priority': PRIORITY_BULK}
             )
             success += 1
             
-            # Небольшая задержка чтобы не превысить лимиты Telegram
-            await asyncio.sleep(0.1)
-            
         except TelegramError as e:
             logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
             failed += 1
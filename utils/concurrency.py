@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Optional
+
+from config import API_CALL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CallResult:
+    """Итог одного вызова из gather_calls"""
+    value: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def _guarded(name: str, call: Awaitable, timeout: Optional[float]) -> CallResult:
+    try:
+        return CallResult(value=await asyncio.wait_for(call, timeout))
+    except asyncio.TimeoutError as e:
+        logger.error(f"Вызов '{name}' не уложился в {timeout} с")
+        return CallResult(error=e)
+    except Exception as e:
+        logger.error(f"Вызов '{name}' завершился ошибкой: {e}")
+        return CallResult(error=e)
+
+
+async def gather_calls(timeout: Optional[float] = API_CALL_TIMEOUT, **calls: Awaitable) -> Dict[str, CallResult]:
+    """
+    Выполнить независимые вызовы (обычно Bot API) одновременно.
+
+    Ошибка или таймаут одного вызова не отменяет остальные: они
+    логируются и возвращаются в CallResult.error под именем вызова.
+    Отмена самого gather_calls отменяет все вызовы.
+    """
+    names = list(calls)
+    results = await asyncio.gather(*(_guarded(name, calls[name], timeout) for name in names))
+    return dict(zip(names, results))
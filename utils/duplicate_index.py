@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import logging
+import random
+import re
+from array import array
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from telegram.ext import ContextTypes
+
+from config import DUPLICATE_THRESHOLD, DUPLICATE_BACKFILL_BATCH
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Параметры MinHash/LSH. Меняются только вместе с пересборкой индекса:
+# подписи в базе посчитаны именно с ними
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240501)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text: str) -> str:
+    """Регистр, ё/е, пунктуация и пробелы не влияют на сходство"""
+    return _NON_WORD.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def shingles(text: str) -> set:
+    """Множество символьных k-грамм нормализованного текста"""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'little')
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash-подпись текста из NUM_PERM значений"""
+    hashes = [_hash64(shingle.encode('utf-8')) for shingle in shingles(text)]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def lsh_buckets(signature: Sequence[int]) -> List[int]:
+    """Номер корзины для каждой из BANDS полос подписи (знаковый 64-бит для SQLite)"""
+    buckets = []
+    for band in range(BANDS):
+        rows = array('Q', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        buckets.append(int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'little', signed=True))
+    return buckets
+
+
+def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Оценка коэффициента Жаккара по доле совпавших значений подписи"""
+    return sum(a == b for a, b in zip(left, right)) / NUM_PERM
+
+
+@dataclass(frozen=True)
+class SimilarApplication:
+    application_id: int
+    similarity: float
+    status: str
+
+
+class DuplicateIndex:
+    """
+    Индекс похожих стихов на MinHash/LSH.
+
+    Для каждой заявки хранится MinHash-подпись по символьным 5-граммам
+    и номера LSH-корзин. Кандидаты ищутся по совпадению хотя бы одной
+    корзины (индексный поиск, без попарного сравнения со всей историей),
+    затем сходство уточняется по подписям. При 16 полосах по 4 строки
+    пары со сходством от ~0.5 находятся почти всегда.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+
+    def _similar(self, application_id: int, signature: Sequence[int]) -> List[SimilarApplication]:
+        matches = []
+        for row in db.get_poem_candidates(lsh_buckets(signature), exclude=application_id):
+            score = similarity(signature, array('Q', row['signature']))
+            if score >= self.threshold:
+                matches.append(SimilarApplication(row['application_id'], score, row['status']))
+        matches.sort(key=lambda match: (-match.similarity, match.application_id))
+        return matches
+
+    def add(self, application_id: int, signature: Sequence[int]) -> List[SimilarApplication]:
+        """Добавить заявку в индекс; возвращает уже известные похожие заявки"""
+        matches = self._similar(application_id, signature)
+        db.add_poem_signature(application_id, array('Q', signature).tobytes(), lsh_buckets(signature))
+        return matches
+
+    async def index_application(self, application_id: int, poem_text: str) -> List[SimilarApplication]:
+        """Посчитать подпись новой заявки вне цикла событий и добавить ее в индекс"""
+        signature = await asyncio.to_thread(minhash, poem_text)
+        matches = self.add(application_id, signature)
+        if matches:
+            logger.info(
+                f"Заявка {application_id} похожа на "
+                f"{', '.join(f'#{m.application_id} ({m.similarity:.0%})' for m in matches)}"
+            )
+        return matches
+
+    def similar_to(self, application_id: int) -> List[SimilarApplication]:
+        """Похожие заявки для карточки; пусто, если заявка еще не в индексе"""
+        raw = db.get_poem_signature(application_id)
+        return self._similar(application_id, array('Q', raw)) if raw else []
+
+    async def backfill_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Порциями индексирует заявки, поданные до появления индекса"""
+        rows = db.get_unindexed_applications(DUPLICATE_BACKFILL_BATCH)
+        if not rows:
+            context.job.schedule_removal()
+            logger.info("Индекс похожих стихов охватывает все заявки")
+            return
+
+        signatures = await asyncio.to_thread(lambda: [minhash(row['poem_text'] or '') for row in rows])
+        for row, signature in zip(rows, signatures):
+            db.add_poem_signature(row['application_id'], array('Q', signature).tobytes(), lsh_buckets(signature))
+        logger.info(f"В индекс похожих стихов добавлено {len(rows)} старых заявок")
+
+
+# Глобальный экземпляр
+duplicate_index = DuplicateIndex()
@@ -1,9 +1,19 @@
+import csv
 import io
 import logging
-from models import Database
+from models import db
+from models.poem_metrics import format_duration
 
 logger = logging.getLogger(__name__)
-db = Database()
+
+def _metrics_line(app) -> str:
+    """Объем стиха из заявки (пусто, если старая заявка еще не измерена)"""
+    if app['reading_seconds'] is None:
+        return ''
+    return (
+        f"Строк: {app['line_count']}, слов: {app['word_count']}, "
+        f"чтение ~{format_duration(app['reading_seconds'])}\n"
+    )
 
 def export_approved_poems_to_file():
     """Экспорт принятых стихотворений в файл"""
@@ -13,12 +23,14 @@ def export_approved_poems_to_file():
         return None
     
     # Формируем текстовый файл
-    file_content = "Стихи первого блока:\n\n"
+    total_seconds = sum(app['reading_seconds'] or 0 for app in approved_applications)
+    file_content = f"Стихи первого блока (~{format_duration(total_seconds)}):\n\n"
     
     for i, app in enumerate(approved_applications, 1):
         file_content += f"{i}. {app['first_name']} {app['last_name'] or ''} (@{app['username'] or 'нет'})\n"
         file_content += f"ID заявки: {app['application_id']}\n"
         file_content += f"Участие во втором блоке: {'Да' if app['second_block'] else 'Нет'}\n"
+        file_content += _metrics_line(app)
         file_content += f"Стих:\n{app['poem_text']}\n"
         file_content += "=" * 50 + "\n\n"
     
@@ -36,11 +48,13 @@ def export_second_block_speakers_to_file():
         return None
     
     # Формируем текстовый файл
-    file_content = "Список выступающих второго блока:\n\n"
+    total_seconds = sum(speaker['reading_seconds'] or 0 for speaker in second_block_speakers)
+    file_content = f"Список выступающих второго блока (~{format_duration(total_seconds)}):\n\n"
     
     for i, speaker in enumerate(second_block_speakers, 1):
         file_content += f"{i}. {speaker['first_name']} {speaker['last_name'] or ''} (@{speaker['username'] or 'нет'})\n"
         file_content += f"ID заявки: {speaker['application_id']}\n"
+        file_content += _metrics_line(speaker)
         file_content += f"Стих: {speaker['poem_text'][:100]}{'...' if len(speaker['poem_text']) > 100 else ''}\n"
         file_content += "-" * 30 + "\n"
     
@@ -49,3 +63,24 @@ def export_second_block_speakers_to_file():
     file.name = "список_второго_блока.txt"
     
     return file
+
+def export_blacklist_to_file():
+    """Выгрузка черного списка в CSV (первый столбец — ID, файл можно загрузить обратно)"""
+    rows = db.iter_blacklist_export()
+    first = rows.fetchone()
+    if first is None:
+        return None
+    
+    file = io.BytesIO()
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(('user_id', 'username', 'first_name', 'last_name', 'added_at'))
+    writer.writerow(tuple(first))
+    for row in rows:
+        writer.writerow(tuple(row))
+    text.detach()
+    
+    file.seek(0)
+    file.name = "черный_список.csv"
+    
+    return file
@@ -0,0 +1,194 @@
+import logging
+import time
+from collections import Counter
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from telegram import CallbackQuery, Update
+from telegram.ext import Application, ContextTypes
+
+from config import MODERATOR_IDS, FLOOD_RATE, FLOOD_BURST, OVERLOAD_BACKLOG
+from .update_processor import update_backlog
+
+logger = logging.getLogger(__name__)
+
+# Кнопки флоу подачи заявки — обслуживаются всегда
+FLOW_CALLBACKS = frozenset({'apply', 'second_block_yes', 'second_block_no', 'cancel_application'})
+# Статичные экраны: повторный просмотр — низкий приоритет
+VIEW_CALLBACKS = frozenset({'rules', 'about'})
+# Окно, в котором просмотр того же экрана считается повторным
+REPEAT_VIEW_WINDOW = 60
+
+PRIORITY_ADMIN = 'admin'
+PRIORITY_FLOW = 'flow'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+
+
+class TokenBucket:
+    """Классическое ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now: float, cost: float = 1.0) -> bool:
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class FloodController:
+    """
+    Допуск апдейтов до обработчиков.
+
+    Вызывается из KeyedUpdateProcessor до ожидания очереди пользователя
+    и до любых запросов к базе. У каждого пользователя свое ведро токенов;
+    организатор и модераторы не ограничиваются. Если необработанный хвост
+    апдейтов больше порога, включается режим перегрузки: низкоприоритетные
+    апдейты (повторные просмотры правил/информации, тексты вне подачи
+    заявки) отбрасываются, а команда и флоу подачи заявки обслуживаются
+    всегда. На отброшенную кнопку бот отвечает пустым answerCallbackQuery,
+    чтобы у пользователя не крутились часики.
+    """
+
+    def __init__(self, rate: float, burst: float, overload_backlog: int, priority_ids: FrozenSet[int]):
+        self.rate = rate
+        self.burst = burst
+        self.overload_backlog = overload_backlog
+        self.priority_ids = priority_ids
+        self.application: Optional[Application] = None
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._last_views: Dict[int, Tuple[str, float]] = {}
+        self.admitted = Counter()
+        self.flooded = Counter()
+        self.shed = Counter()
+        self.overloaded = False
+
+    def bind(self, application: Application):
+        """Привязка к приложению: нужна для очереди и user_data"""
+        self.application = application
+
+    def classify(self, update: Update, now: float) -> str:
+        """Приоритет апдейта без обращения к базе"""
+        user_id = update.effective_user.id
+        if user_id in self.priority_ids:
+            return PRIORITY_ADMIN
+
+        if update.callback_query:
+            data = update.callback_query.data
+            if data in FLOW_CALLBACKS:
+                return PRIORITY_FLOW
+            if data in VIEW_CALLBACKS:
+                last_view = self._last_views.get(user_id)
+                self._last_views[user_id] = (data, now)
+                if last_view and last_view[0] == data and now - last_view[1] < REPEAT_VIEW_WINDOW:
+                    return PRIORITY_LOW
+            return PRIORITY_NORMAL
+
+        message = update.message
+        if message and message.text and not message.text.startswith('/'):
+            user_data = self.application.user_data.get(user_id) if self.application else None
+            if user_data and user_data.get('awaiting_poem'):
+                return PRIORITY_FLOW
+            # Данные еще не загружены из базы (перезапуск, выгрузка) — не рискуем
+            persistence = self.application.persistence if self.application else None
+            if persistence is not None and hasattr(persistence, 'is_loaded') and not persistence.is_loaded(user_id):
+                return PRIORITY_NORMAL
+            # Такой текст обработчик все равно проигнорирует
+            return PRIORITY_LOW
+        return PRIORITY_NORMAL
+
+    def admit(self, update: object) -> bool:
+        """Решение о допуске апдейта к обработке"""
+        if not isinstance(update, Update) or not update.effective_user:
+            return True
+
+        now = time.monotonic()
+        priority = self.classify(update, now)
+        if priority == PRIORITY_ADMIN:
+            self.admitted[priority] += 1
+            return True
+
+        user_id = update.effective_user.id
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst, now)
+        if not bucket.consume(now):
+            self.flooded[priority] += 1
+            logger.debug(f"Флуд от пользователя {user_id}: апдейт {update.update_id} отброшен")
+            self._answer_dropped(update)
+            return False
+
+        backlog = update_backlog(self.application) if self.application else 0
+        overloaded = backlog >= self.overload_backlog
+        if overloaded != self.overloaded:
+            self.overloaded = overloaded
+            if overloaded:
+                logger.warning(f"Режим перегрузки включен: необработанных апдейтов {backlog}")
+            else:
+                logger.info("Режим перегрузки выключен")
+
+        if overloaded and priority == PRIORITY_LOW:
+            self.shed[priority] += 1
+            self._answer_dropped(update)
+            return False
+
+        self.admitted[priority] += 1
+        return True
+
+    def _answer_dropped(self, update: Update):
+        """Пустой ответ на отброшенную кнопку, без обработчиков и базы"""
+        if update.callback_query and self.application is not None:
+            self.application.create_task(_answer_quietly(update.callback_query))
+
+    def sweep(self):
+        """Удаление полных ведер и старых просмотров, чтобы словари не росли"""
+        now = time.monotonic()
+        for user_id in [uid for uid, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[user_id]
+        for user_id in [uid for uid, (_, seen) in self._last_views.items() if now - seen >= REPEAT_VIEW_WINDOW]:
+            del self._last_views[user_id]
+
+    def get_stats(self) -> dict:
+        return {
+            'admitted': dict(self.admitted),
+            'flooded': dict(self.flooded),
+            'shed': dict(self.shed),
+            'overloaded': self.overloaded,
+            'tracked_users': len(self._buckets),
+        }
+
+    async def report_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Периодическая задача: очистка и отчет о допуске"""
+        self.sweep()
+        stats = self.get_stats()
+        logger.info(
+            f"Допуск апдейтов: принято {sum(self.admitted.values())}, "
+            f"флуд {sum(self.flooded.values())} {stats['flooded']}, "
+            f"сброшено при перегрузке {sum(self.shed.values())}, "
+            f"ведер {stats['tracked_users']}"
+        )
+
+
+async def _answer_quietly(query: CallbackQuery):
+    try:
+        await query.answer()
+    except Exception as e:
+        logger.debug(f"Не удалось ответить на отброшенную кнопку: {e}")
+
+
+# Глобальный экземпляр
+flood_controller = FloodController(FLOOD_RATE, FLOOD_BURST, OVERLOAD_BACKLOG, MODERATOR_IDS)
@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from telegram.error import TimedOut
+from telegram.ext import ContextTypes
+from telegram.request import BaseRequest, HTTPXRequest
+
+from config import (
+    HTTP_POOL_SIZE, HTTP_INTERACTIVE_RESERVE, HTTP_KEEPALIVE_EXPIRY, HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT, HTTP_VERSION
+)
+
+logger = logging.getLogger(__name__)
+
+# Помечает запросы массовых операций (рассылка) в текущей задаче
+_bulk_traffic = contextvars.ContextVar('bulk_traffic', default=False)
+
+
+@contextmanager
+def bulk_traffic():
+    """Запросы внутри блока считаются массовыми и не занимают резерв интерактивных"""
+    token = _bulk_traffic.set(True)
+    try:
+        yield
+    finally:
+        _bulk_traffic.reset(token)
+
+
+class TimedSemaphore(asyncio.Semaphore):
+    """Семафор со статистикой ожидания свободного слота"""
+
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.size = value
+        self.acquired = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def acquire(self):
+        if not self.locked():
+            self.acquired += 1
+            return await super().acquire()
+
+        started = time.perf_counter()
+        result = await super().acquire()
+        wait = time.perf_counter() - started
+        self.acquired += 1
+        self.waited += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'in_use': self.size - self._value,
+            'acquired': self.acquired,
+            'waited': self.waited,
+            'wait_avg_ms': round(self.wait_total / self.waited * 1000, 1) if self.waited else 0.0,
+            'wait_max_ms': round(self.wait_max * 1000, 1),
+        }
+
+
+class PooledRequest(HTTPXRequest):
+    """
+    HTTPXRequest с настраиваемым keep-alive и учетом ожидания пула.
+
+    Соединения выдаются через TimedSemaphore размером с пул httpx,
+    поэтому ожидание свободного соединения видно в статистике.
+    Массовые запросы (bulk_traffic) дополнительно проходят через
+    меньший семафор: последние reserve соединений им недоступны
+    и остаются для ответов пользователям.
+
+    Размер пула и таймауты передаются публичными параметрами
+    HTTPXRequest. keepalive_expiry в PTB 20.7 публично не задается,
+    поэтому он подставляется в закрытые _client_kwargs; версия PTB
+    закреплена в requirements.txt. Если после обновления PTB этих
+    атрибутов нет, пул работает с keep-alive httpx по умолчанию
+    и пишет предупреждение в лог.
+    """
+
+    def __init__(self, name: str, pool_size: int, reserve: int = 0, keepalive_expiry: Optional[float] = None,
+                 pool_timeout: Optional[float] = None, **kwargs):
+        if reserve >= pool_size:
+            raise ValueError(f"Резерв пула '{name}' ({reserve}) должен быть меньше его размера ({pool_size})")
+        super().__init__(connection_pool_size=pool_size, pool_timeout=pool_timeout, **kwargs)
+        self.name = name
+        self.pool_timeout = pool_timeout
+        self.slots = TimedSemaphore(pool_size)
+        self.bulk_slots = TimedSemaphore(pool_size - reserve) if reserve else None
+
+        if keepalive_expiry is not None:
+            self._set_keepalive_expiry(pool_size, keepalive_expiry)
+
+    def _set_keepalive_expiry(self, pool_size: int, keepalive_expiry: float):
+        client_kwargs = getattr(self, '_client_kwargs', None)
+        if not isinstance(client_kwargs, dict) or not callable(getattr(self, '_build_client', None)):
+            logger.warning(f"Пул '{self.name}': эта версия PTB не дает задать keep-alive, используется значение httpx")
+            return
+        client_kwargs['limits'] = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client = self._build_client()
+
+    async def _acquire(self, semaphore: TimedSemaphore, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError as e:
+            raise TimedOut(f"Пул '{self.name}': нет свободного соединения за {timeout} с") from e
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        timeout = self.pool_timeout if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout
+        bulk = self.bulk_slots if _bulk_traffic.get() else None
+
+        if bulk is not None:
+            await self._acquire(bulk, timeout)
+        try:
+            await self._acquire(self.slots, timeout)
+            try:
+                return await super().do_request(
+                    url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout
+                )
+            finally:
+                self.slots.release()
+        finally:
+            if bulk is not None:
+                bulk.release()
+
+    def stats(self) -> dict:
+        stats = {'pool': self.slots.stats()}
+        if self.bulk_slots is not None:
+            stats['bulk'] = self.bulk_slots.stats()
+        return stats
+
+
+def build_requests():
+    """Запросы для исходящих вызовов и для getUpdates с раздельными пулами"""
+    common = dict(
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        write_timeout=HTTP_WRITE_TIMEOUT,
+        pool_timeout=HTTP_POOL_TIMEOUT,
+        http_version=HTTP_VERSION,
+    )
+    outbound = PooledRequest('outbound', HTTP_POOL_SIZE, reserve=HTTP_INTERACTIVE_RESERVE, **common)
+    # getUpdates — один долгий запрос за раз
+    get_updates = PooledRequest('get_updates', 1, **common)
+    return outbound, get_updates
+
+
+def pool_stats(application) -> dict:
+    """Статистика пула исходящих вызовов (пусто, если запрос не PooledRequest)"""
+    request = application.bot.request
+    return {request.name: request.stats()} if isinstance(request, PooledRequest) else {}
+
+
+async def report_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодический отчет об ожидании соединений"""
+    for name, stats in pool_stats(context.application).items():
+        pool = stats['pool']
+        logger.info(
+            f"HTTP-пул {name}: занято {pool['in_use']}/{pool['size']}, запросов {pool['acquired']}, "
+            f"ждали {pool['waited']} (в среднем {pool['wait_avg_ms']} мс, максимум {pool['wait_max_ms']} мс)"
+        )
@@ -0,0 +1,166 @@
+import logging
+import sys
+import time
+from copy import deepcopy
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from config import USER_DATA_IDLE_TTL, ABANDONED_FLOW_TTL, USER_DATA_MEMORY_BUDGET
+from models.persistence import TRANSIENT_KEYS
+from .update_processor import KeyedUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def approximate_size(obj, _seen: Optional[set] = None) -> int:
+    """Приблизительный размер объекта в байтах вместе с вложенными"""
+    _seen = _seen if _seen is not None else set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(k, _seen) + approximate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, _seen) for item in obj)
+    elif hasattr(obj, 'keys') and hasattr(obj, '__getitem__'):
+        # sqlite3.Row
+        size += sum(approximate_size(obj[key], _seen) for key in obj.keys())
+    return size
+
+
+class UserDataEvictor:
+    """
+    Ограничение памяти, занятой context.user_data.
+
+    Периодическая задача:
+    1. у пользователей, молчащих дольше idle_ttl, удаляет кэши, которые
+       обработчики перечитают из базы (список заявок админа);
+    2. заявки, брошенные дольше abandoned_ttl назад, очищает целиком;
+    3. пустые записи удаляет из приложения;
+    4. если после этого user_data все еще больше бюджета, выгружает
+       данные давно молчащих пользователей в базу (через persistence)
+       и освобождает память; при следующем апдейте они загрузятся снова.
+    Пользователи, чьи апдейты сейчас обрабатываются, не трогаются.
+    """
+
+    def __init__(self, idle_ttl: float, abandoned_ttl: float, memory_budget: int):
+        self.idle_ttl = idle_ttl
+        self.abandoned_ttl = abandoned_ttl
+        self.memory_budget = memory_budget
+        self.last_seen: Dict[int, float] = {}
+        self.started = time.monotonic()
+        self.evicted_caches = 0
+        self.abandoned_flows = 0
+        self.offloaded = 0
+
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик TypeHandler: отметка активности пользователя"""
+        if update.effective_user:
+            self.last_seen[update.effective_user.id] = time.monotonic()
+
+    def _idle(self, user_id: int, now: float) -> float:
+        return now - self.last_seen.get(user_id, self.started)
+
+    @staticmethod
+    def _is_busy(application: Application, user_id: int) -> bool:
+        processor = application.update_processor
+        return isinstance(processor, KeyedUpdateProcessor) and processor.is_busy(('user', user_id))
+
+    @staticmethod
+    def _drop(application: Application, user_id: int):
+        """
+        Удалить пустую запись из приложения. Если данные пользователя
+        выгружены в базу, убираем запись только из памяти: drop_user_data
+        удалил бы при сохранении и строки в базе
+        """
+        persistence = application.persistence
+        if hasattr(persistence, 'is_loaded') and not persistence.is_loaded(user_id):
+            application._user_data.pop(user_id, None)
+        else:
+            application.drop_user_data(user_id)
+
+    def report(self, application: Application, top: int = 5) -> dict:
+        """Отчет о памяти user_data: записи, объем, крупнейшие держатели"""
+        now = time.monotonic()
+        sizes = [
+            (approximate_size(data), user_id, sorted(data.keys()), self._idle(user_id, now))
+            for user_id, data in application.user_data.items()
+        ]
+        sizes.sort(reverse=True)
+        return {
+            'entries': len(sizes),
+            'non_empty': sum(1 for _, _, keys, _ in sizes if keys),
+            'bytes': sum(size for size, _, _, _ in sizes),
+            'budget': self.memory_budget,
+            'largest': [
+                {'user_id': user_id, 'bytes': size, 'keys': keys, 'idle_seconds': int(idle)}
+                for size, user_id, keys, idle in sizes[:top]
+            ],
+            'evicted_caches': self.evicted_caches,
+            'abandoned_flows': self.abandoned_flows,
+            'offloaded': self.offloaded,
+        }
+
+    async def evict(self, application: Application):
+        """Один проход вытеснения"""
+        now = time.monotonic()
+        sizes = {}
+
+        for user_id, data in list(application.user_data.items()):
+            if self._is_busy(application, user_id):
+                continue
+            idle = self._idle(user_id, now)
+
+            if idle > self.abandoned_ttl and data:
+                if data.get('awaiting_poem') or data.get('poem_text'):
+                    self.abandoned_flows += 1
+                    logger.info(f"Брошенная заявка пользователя {user_id} очищена (простой {int(idle)} с)")
+                data.clear()
+            elif idle > self.idle_ttl:
+                for key in TRANSIENT_KEYS & data.keys():
+                    del data[key]
+                    self.evicted_caches += 1
+
+            if not data and idle > self.idle_ttl:
+                self._drop(application, user_id)
+                self.last_seen.pop(user_id, None)
+            elif data:
+                sizes[user_id] = approximate_size(data)
+
+        total = sum(sizes.values())
+        if total <= self.memory_budget:
+            return
+
+        # Бюджет превышен: выгружаем самых давно молчащих
+        persistence = application.persistence
+        if persistence is None or not hasattr(persistence, 'forget'):
+            logger.warning(f"user_data занимает {total} байт при бюджете {self.memory_budget}, выгрузка недоступна")
+            return
+
+        for user_id in sorted(sizes, key=lambda uid: self.last_seen.get(uid, self.started)):
+            if total <= self.memory_budget:
+                break
+            data = application.user_data[user_id]
+            await persistence.update_user_data(user_id, deepcopy(data))
+            await persistence.flush()
+            persistence.forget(user_id)
+            data.clear()
+            total -= sizes[user_id]
+            self.offloaded += 1
+
+        logger.info(f"user_data после выгрузки: ~{total} байт (бюджет {self.memory_budget})")
+
+    async def evict_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Периодическая задача вытеснения"""
+        try:
+            await self.evict(context.application)
+        except Exception as e:
+            logger.error(f"Ошибка при вытеснении user_data: {e}", exc_info=True)
+
+
+# Глобальный экземпляр
+user_data_evictor = UserDataEvictor(USER_DATA_IDLE_TTL, ABANDONED_FLOW_TTL, USER_DATA_MEMORY_BUDGET)
@@ -0,0 +1,135 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from telegram.ext import ContextTypes
+
+from config import CLAIM_LEASE_SECONDS
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class ModeratorStats:
+    """Счетчики одного модератора"""
+
+    def __init__(self):
+        self.claimed = 0
+        self.approved = 0
+        self.rejected = 0
+        self.decision_total = 0.0
+
+    @property
+    def decided(self) -> int:
+        return self.approved + self.rejected
+
+    def as_dict(self) -> dict:
+        return {
+            'claimed': self.claimed,
+            'approved': self.approved,
+            'rejected': self.rejected,
+            'decision_avg_s': round(self.decision_total / self.decided, 1) if self.decided else 0.0,
+        }
+
+
+class ModerationQueue:
+    """
+    Общая очередь заявок для нескольких модераторов.
+
+    Модератор не листает список, а берет следующую свободную заявку:
+    она закрепляется за ним в базе на lease_seconds. Пока аренда
+    действует, другие модераторы эту заявку не видят; брошенная
+    заявка возвращается в очередь сама. Решение по заявке, аренда
+    которой уже перешла к другому, отклоняется.
+
+    Конкуренция считается так: blocked — открыл очередь, а все
+    ожидающие заявки закреплены за другими; conflicts — решение
+    опоздало, заявку уже обработал или взял другой модератор.
+    """
+
+    def __init__(self, lease_seconds: float = CLAIM_LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        self._moderators: Dict[int, ModeratorStats] = {}
+        # application_id -> (moderator_id, время закрепления) для времени решения
+        self._claimed_at: Dict[int, Tuple[int, float]] = {}
+        self.blocked = 0
+        self.conflicts = 0
+
+    def _stats(self, moderator_id: int) -> ModeratorStats:
+        return self._moderators.setdefault(moderator_id, ModeratorStats())
+
+    def claim_next(self, moderator_id: int, skip: Optional[int] = None):
+        """Заявка, закрепленная за модератором, или None, если свободных нет"""
+        application_id = db.claim_next_application(moderator_id, self.lease_seconds, exclude=skip)
+        if application_id is None and skip is not None:
+            # Пропущенная заявка — единственная свободная: показываем ее снова
+            application_id = db.claim_next_application(moderator_id, self.lease_seconds)
+        if application_id is None:
+            if db.get_pending_queue_counts()['pending']:
+                self.blocked += 1
+            return None
+
+        previous = self._claimed_at.get(application_id)
+        if previous is None or previous[0] != moderator_id:
+            self._claimed_at[application_id] = (moderator_id, time.monotonic())
+            self._stats(moderator_id).claimed += 1
+        return db.get_application_by_id(application_id)
+
+    def holds(self, application_id: int, moderator_id: int) -> bool:
+        """Заявка все еще ждет решения и закреплена за этим модератором"""
+        application = db.get_application_by_id(application_id)
+        return (
+            application is not None
+            and application['status'] == 'pending'
+            and application['claimed_by'] == moderator_id
+            and (application['claim_expires_at'] or 0) > time.time()
+        )
+
+    def release(self, application_id: int, moderator_id: int):
+        """Вернуть заявку в очередь (модератор пропустил ее)"""
+        db.release_application_claim(application_id, moderator_id)
+        self._claimed_at.pop(application_id, None)
+
+    def decide(self, application_id: int, moderator_id: int, status: str) -> bool:
+        """Записать решение; False, если заявку уже обработал или взял другой"""
+        if not db.decide_application(application_id, status, moderator_id):
+            self.conflicts += 1
+            logger.info(f"Модератор {moderator_id} опоздал с решением по заявке {application_id}")
+            return False
+
+        stats = self._stats(moderator_id)
+        if status == 'approved':
+            stats.approved += 1
+        else:
+            stats.rejected += 1
+        claimed = self._claimed_at.pop(application_id, None)
+        if claimed is not None and claimed[0] == moderator_id:
+            stats.decision_total += time.monotonic() - claimed[1]
+        return True
+
+    def stats(self) -> dict:
+        return {
+            **db.get_pending_queue_counts(),
+            'blocked': self.blocked,
+            'conflicts': self.conflicts,
+            'moderators': {moderator_id: stats.as_dict() for moderator_id, stats in self._moderators.items()},
+        }
+
+    async def report_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Периодический отчет об очереди модерации"""
+        if not self._moderators:
+            return
+        stats = self.stats()
+        per_moderator = ', '.join(
+            f"{moderator_id}: решено {m['approved'] + m['rejected']} (~{m['decision_avg_s']} с)"
+            for moderator_id, m in stats['moderators'].items()
+        )
+        logger.info(
+            f"Очередь модерации: ждут {stats['pending']}, закреплено {stats['claimed']}, "
+            f"упирались в занятую очередь {stats['blocked']}, опоздавших решений {stats['conflicts']}; "
+            f"{per_moderator}"
+        )
+
+
+# Глобальный экземпляр
+moderation_queue = ModerationQueue()
@@ -0,0 +1,241 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ContextTypes
+
+from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_INTERVAL, OUTBOUND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета исходящих сообщений: меньше — раньше
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_MODERATION = 'moderation'
+PRIORITY_BULK = 'bulk'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_MODERATION, PRIORITY_BULK)
+
+# Сколько ожидающих одного класса просматривается в поиске чата без паузы
+SCAN_LIMIT = 64
+
+# Вызовы, которые отправляют новые сообщения и подпадают под лимиты Telegram
+FORWARD_ENDPOINTS = frozenset({'copyMessage', 'copyMessages', 'forwardMessage', 'forwardMessages'})
+
+
+def is_limited(endpoint: str) -> bool:
+    return endpoint.startswith('send') or endpoint in FORWARD_ENDPOINTS
+
+
+class _Waiter:
+    __slots__ = ('chat_id', 'future', 'enqueued_at')
+
+    def __init__(self, chat_id, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class ClassStats:
+    """Счетчики одного класса приоритета"""
+
+    def __init__(self):
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float):
+        self.sent += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """
+    Единый планировщик исходящих сообщений бота.
+
+    Подключается к Application как rate limiter, поэтому через него
+    проходят все вызовы Bot API. Вызовы, отправляющие сообщения
+    (send*, copy/forward), получают разрешение по очереди:
+    - не чаще global_rate в секунду на весь бот;
+    - в один чат не чаще раза в chat_interval секунд;
+    - сначала ответы пользователям, затем уведомления модерации,
+      затем рассылка; класс задается rate_limit_args={'priority': ...},
+      по умолчанию interactive.
+    На RetryAfter все исходящие вызовы приостанавливаются на указанное
+    Telegram время, после чего запрос повторяется (до max_retries раз).
+    """
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_interval: float = OUTBOUND_CHAT_INTERVAL,
+                 max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+
+        self._queues: Dict[str, Deque[_Waiter]] = {priority: deque() for priority in PRIORITIES}
+        self._stats: Dict[str, ClassStats] = {priority: ClassStats() for priority in PRIORITIES}
+        self._chat_next: Dict[Any, float] = {}
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self.retry_after_events = 0
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def initialize(self):
+        # PTB вызывает initialize дважды (Application и Updater): второй
+        # вызов не должен запускать еще один цикл раздачи
+        if self._dispatcher is not None and not self._dispatcher.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self._queues.values():
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.future.done():
+                    waiter.future.set_exception(RuntimeError("Планировщик исходящих сообщений остановлен"))
+
+    async def process_request(self, callback: Callable, args: Any, kwargs: Dict[str, Any], endpoint: str,
+                              data: Dict[str, Any], rate_limit_args: Optional[Dict[str, Any]]):
+        priority = (rate_limit_args or {}).get('priority', PRIORITY_INTERACTIVE)
+        if priority not in self._queues:
+            logger.warning(f"Неизвестный приоритет '{priority}', используется {PRIORITY_INTERACTIVE}")
+            priority = PRIORITY_INTERACTIVE
+        limited = is_limited(endpoint)
+
+        for attempt in range(self.max_retries + 1):
+            if limited and self._dispatcher is not None:
+                await self._acquire(priority, data.get('chat_id'))
+            else:
+                await self._wait_pause()
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._pause(e.retry_after, endpoint)
+                if attempt == self.max_retries:
+                    raise
+
+    # Очередь разрешений
+    async def _acquire(self, priority: str, chat_id):
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(str(chat_id) if chat_id is not None else None, future)
+        self._queues[priority].append(waiter)
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Вызывающий отменен до разрешения — убираем из очереди
+            if waiter in self._queues[priority]:
+                self._queues[priority].remove(waiter)
+            raise
+        self._stats[priority].record(time.monotonic() - waiter.enqueued_at)
+
+    async def _wait_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _pause(self, retry_after, endpoint: str):
+        seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.retry_after_events += 1
+        logger.warning(f"RetryAfter на {endpoint}: исходящие вызовы приостановлены на {seconds} с")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _pick(self, now: float) -> Optional[_Waiter]:
+        """Первый ожидающий с наивысшим приоритетом, чей чат не на паузе"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            for index, waiter in enumerate(itertools.islice(queue, SCAN_LIMIT)):
+                if waiter.chat_id is None or self._chat_next.get(waiter.chat_id, 0.0) <= now:
+                    del queue[index]
+                    return waiter
+        return None
+
+    def _next_chat_ready(self) -> Optional[float]:
+        times = [
+            self._chat_next.get(waiter.chat_id, 0.0)
+            for queue in self._queues.values()
+            for waiter in itertools.islice(queue, SCAN_LIMIT)
+            if waiter.chat_id is not None
+        ]
+        return min(times) if times else None
+
+    async def _sleep_or_wakeup(self, delay: Optional[float]):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch_loop(self):
+        while True:
+            if not any(self._queues.values()):
+                await self._sleep_or_wakeup(None)
+                continue
+
+            now = time.monotonic()
+            wait = max(self._paused_until, self._next_slot) - now
+            if wait > 0:
+                await self._sleep_or_wakeup(wait)
+                continue
+
+            waiter = self._pick(now)
+            if waiter is None:
+                ready_at = self._next_chat_ready()
+                await self._sleep_or_wakeup(max(0.0, ready_at - now) if ready_at is not None else None)
+                continue
+            if waiter.future.done():
+                continue
+
+            self._next_slot = now + 1 / self.global_rate if self.global_rate > 0 else now
+            if waiter.chat_id is not None:
+                self._chat_next[waiter.chat_id] = now + self.chat_interval
+            waiter.future.set_result(None)
+
+            # Записи о давно свободных чатах не нужны
+            if len(self._chat_next) > 10_000:
+                self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+
+    # Отчеты
+    def stats(self) -> dict:
+        classes = {}
+        for priority in PRIORITIES:
+            stats = self._stats[priority]
+            classes[priority] = {
+                'queued': len(self._queues[priority]),
+                'sent': stats.sent,
+                'wait_avg_ms': round(stats.wait_total / stats.sent * 1000, 1) if stats.sent else 0.0,
+                'wait_max_ms': round(stats.wait_max * 1000, 1),
+            }
+        return {
+            'classes': classes,
+            'paused_for': round(max(0.0, self._paused_until - time.monotonic()), 1),
+            'retry_after_events': self.retry_after_events,
+        }
+
+    async def report_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Периодический отчет об очередях исходящих сообщений"""
+        stats = self.stats()
+        summary = ', '.join(
+            f"{priority}: в очереди {c['queued']}, отправлено {c['sent']}, ожидание ~{c['wait_avg_ms']} мс"
+            for priority, c in stats['classes'].items()
+        )
+        logger.info(f"Исходящие сообщения — {summary}; RetryAfter: {stats['retry_after_events']}")
+
+
+# Глобальный экземпляр
+outbound_scheduler = OutboundScheduler()
@@ -0,0 +1,62 @@
+import html
+import logging
+import re
+from typing import Optional
+
+from telegram.ext import ContextTypes
+
+from config import POEM_SEARCH_BACKFILL_BATCH
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Сколько слов запроса учитывать
+MAX_QUERY_TERMS = 10
+
+_TERM = re.compile(r'\w+')
+
+
+def build_match(text: str) -> Optional[str]:
+    """
+    FTS5-запрос из введенного текста: все слова должны встретиться,
+    каждое ищется и как начало слова ("мор" найдет "море" и "моря").
+    Операторы FTS5 из ввода не интерпретируются.
+    """
+    terms = _TERM.findall(text.lower().replace('ё', 'е'))[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms) or None
+
+
+def mark_matches(text: str, query: str, max_lines: int = 2) -> str:
+    """
+    Фрагмент для заявок из архива (его индекс не хранит текст, snippet()
+    недоступен): первые строки с совпадениями, совпавшие слова отмечены
+    как в search_poems.
+    """
+    terms = _TERM.findall(query.lower().replace('ё', 'е'))[:MAX_QUERY_TERMS]
+
+    def mark(word: re.Match) -> str:
+        normalized = word.group().lower().replace('ё', 'е')
+        if any(normalized.startswith(term) for term in terms):
+            return f'\x02{word.group()}\x03'
+        return word.group()
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    marked = [_TERM.sub(mark, line) for line in lines]
+    matched = [line for line in marked if '\x02' in line][:max_lines]
+    return '\n'.join(matched or marked[:max_lines])
+
+
+def highlight(snippet: str) -> str:
+    """Фрагмент из search_poems в HTML: совпадения жирным, остальное экранировано"""
+    text = html.escape(' / '.join(line.strip() for line in snippet.splitlines() if line.strip()))
+    return text.replace('\x02', '<b>').replace('\x03', '</b>')
+
+
+async def backfill_job(context: ContextTypes.DEFAULT_TYPE):
+    """Порциями добавляет в поисковый индекс заявки, поданные до его создания"""
+    added = db.backfill_poem_search(POEM_SEARCH_BACKFILL_BATCH)
+    if not added:
+        context.job.schedule_removal()
+        logger.info("Поисковый индекс стихов охватывает все заявки")
+        return
+    logger.info(f"В поисковый индекс стихов добавлено {added} старых заявок")
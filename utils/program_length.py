@@ -0,0 +1,64 @@
+import logging
+
+from telegram.ext import ContextTypes
+
+from config import POEM_METRICS_BACKFILL_BATCH, READING_LIMIT_MINUTES
+from models import db
+from models.poem_metrics import format_duration
+
+logger = logging.getLogger(__name__)
+
+
+def program_length() -> dict:
+    """
+    Длительность программы по сохраненному объему заявок: принятые
+    (первый блок и второй блок отдельно) и ожидающие решения.
+    """
+    summary = {
+        'approved': 0, 'approved_seconds': 0,
+        'second_block': 0, 'second_block_seconds': 0,
+        'pending': 0, 'pending_seconds': 0,
+        'unmeasured': 0,
+    }
+    for row in db.get_program_length():
+        if row['status'] == 'approved':
+            summary['approved'] += row['applications']
+            summary['approved_seconds'] += row['reading_seconds']
+            if row['second_block']:
+                summary['second_block'] += row['applications']
+                summary['second_block_seconds'] += row['reading_seconds']
+        elif row['status'] == 'pending':
+            summary['pending'] += row['applications']
+            summary['pending_seconds'] += row['reading_seconds']
+        else:
+            continue
+        summary['unmeasured'] += row['unmeasured']
+    return summary
+
+
+def render_program_length() -> str:
+    """HTML-сводка длительности программы для меню организатора"""
+    summary = program_length()
+    lines = [
+        "⏱ <b>Длительность программы</b>\n",
+        f"Первый блок (принято {summary['approved']}): ~{format_duration(summary['approved_seconds'])}",
+        f"Из них во втором блоке ({summary['second_block']}): "
+        f"~{format_duration(summary['second_block_seconds'])}",
+        f"Ждут решения ({summary['pending']}): ~{format_duration(summary['pending_seconds'])}",
+        f"\nЕсли принять все ожидающие: "
+        f"~{format_duration(summary['approved_seconds'] + summary['pending_seconds'])}",
+        f"<i>Оценка по темпу чтения вслух; регламент — до {READING_LIMIT_MINUTES:g} мин на стих.</i>",
+    ]
+    if summary['unmeasured']:
+        lines.append(f"\n⏳ Еще не измерено старых заявок: {summary['unmeasured']}")
+    return '\n'.join(lines)
+
+
+async def backfill_job(context: ContextTypes.DEFAULT_TYPE):
+    """Порциями считает объем заявок, поданных до появления метрик"""
+    measured = db.backfill_poem_metrics(POEM_METRICS_BACKFILL_BATCH)
+    if not measured:
+        context.job.schedule_removal()
+        logger.info("Объем посчитан для всех заявок")
+        return
+    logger.info(f"Посчитан объем {measured} старых заявок")
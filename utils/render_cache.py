@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from telegram.error import BadRequest
+from telegram.ext import ExtBot
+
+from config import EDIT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Параметры edit_message_text, от которых зависит вид сообщения
+RENDER_PARAMS = ('parse_mode', 'reply_markup', 'disable_web_page_preview', 'entities')
+
+
+def is_not_modified(error: Exception) -> bool:
+    """Telegram отказал в редактировании, потому что содержимое не изменилось"""
+    return isinstance(error, BadRequest) and 'message is not modified' in str(error).lower()
+
+
+def _plain(value: Any) -> Any:
+    """Значение параметра для отпечатка: DefaultValue и объекты Telegram — в простые типы"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    # DefaultValue: бот без Defaults подставит None
+    return None
+
+
+class EditFingerprintCache:
+    """
+    Отпечатки последнего отрисованного содержимого сообщений.
+
+    Ключ — (chat_id, message_id) или inline_message_id, значение — хэш
+    текста, parse_mode и клавиатуры. Хранится не более max_entries
+    записей, вытесняются давно не редактированные.
+    """
+
+    def __init__(self, max_entries: int = EDIT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self.skipped = 0
+
+    @staticmethod
+    def key(chat_id=None, message_id=None, inline_message_id=None) -> Optional[Hashable]:
+        if inline_message_id is not None:
+            return inline_message_id
+        if chat_id is None or message_id is None:
+            return None
+        return (str(chat_id), message_id)
+
+    @staticmethod
+    def fingerprint(text: str, *args, **kwargs) -> str:
+        """Хэш параметров edit_message_text, влияющих на вид сообщения"""
+        payload = {
+            'text': text,
+            'args': _plain(args),
+            **{name: _plain(kwargs.get(name)) for name in RENDER_PARAMS},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def is_current(self, key: Optional[Hashable], fingerprint: str) -> bool:
+        """Сообщение уже показывает это содержимое; совпадение считается пропущенным редактированием"""
+        if key is None or self._entries.get(key) != fingerprint:
+            return False
+        self._entries.move_to_end(key)
+        self.skipped += 1
+        return True
+
+    def remember(self, key: Optional[Hashable], fingerprint: str):
+        if key is None:
+            return
+        self._entries[key] = fingerprint
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, key: Optional[Hashable]):
+        if key is not None:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'skipped': self.skipped}
+
+
+class RenderTrackingBot(ExtBot):
+    """
+    ExtBot, который запоминает отпечаток каждого успешного редактирования.
+
+    Через него проходят все edit_message_text (в том числе из
+    query.edit_message_text), поэтому кэш знает, что сейчас показано
+    в сообщении, даже если его редактировал не safe_edit_message_text.
+    Остальные изменения сообщения сбрасывают запись. Отпечатки
+    хранятся в глобальном edit_cache.
+    """
+
+    async def edit_message_text(self, text: str, chat_id=None, message_id=None, inline_message_id=None,
+                                *args, **kwargs):
+        key = edit_cache.key(chat_id, message_id, inline_message_id)
+        fingerprint = edit_cache.fingerprint(text, *args, **kwargs)
+        try:
+            result = await super().edit_message_text(text, chat_id, message_id, inline_message_id, *args, **kwargs)
+        except BadRequest as e:
+            if is_not_modified(e):
+                edit_cache.remember(key, fingerprint)
+            else:
+                edit_cache.forget(key)
+            raise
+        except Exception:
+            # Неизвестно, дошло ли редактирование до Telegram
+            edit_cache.forget(key)
+            raise
+        edit_cache.remember(key, fingerprint)
+        return result
+
+    async def edit_message_reply_markup(self, chat_id=None, message_id=None, inline_message_id=None, *args, **kwargs):
+        edit_cache.forget(edit_cache.key(chat_id, message_id, inline_message_id))
+        return await super().edit_message_reply_markup(chat_id, message_id, inline_message_id, *args, **kwargs)
+
+    async def edit_message_caption(self, chat_id=None, message_id=None, inline_message_id=None, *args, **kwargs):
+        edit_cache.forget(edit_cache.key(chat_id, message_id, inline_message_id))
+        return await super().edit_message_caption(chat_id, message_id, inline_message_id, *args, **kwargs)
+
+    async def delete_message(self, chat_id, message_id, *args, **kwargs):
+        edit_cache.forget(edit_cache.key(chat_id, message_id))
+        return await super().delete_message(chat_id, message_id, *args, **kwargs)
+
+
+# Глобальный экземпляр
+edit_cache = EditFingerprintCache()
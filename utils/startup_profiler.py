@@ -0,0 +1,40 @@
+import logging
+import time
+from typing import Dict
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """
+    Замеры запуска бота от начала импорта main.py.
+
+    Отметки: imports (модули загружены), application_built (приложение
+    собрано), storage_ready (база открыта, кэши прогреты), first_update
+    (первый апдейт дошел до обработчиков). Повторная отметка с тем же
+    именем игнорируется, итог пишется в лог при первом апдейте.
+    """
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str):
+        """Отметить этап запуска"""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.started_at
+
+    def report(self) -> Dict[str, float]:
+        """Отметки в миллисекундах от начала импорта"""
+        return {name: round(seconds * 1000, 1) for name, seconds in self.marks.items()}
+
+    async def on_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик TypeHandler: отметка первого апдейта"""
+        if 'first_update' in self.marks:
+            return
+        self.mark('first_update')
+        summary = ', '.join(f"{name} {ms} мс" for name, ms in self.report().items())
+        logger.info(f"Запуск: {summary}")
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update: object) -> Optional[Hashable]:
+    """Ключ сериализации: пользователь, а для апдейтов без пользователя — чат"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return ('user', update.effective_user.id)
+    if update.effective_chat:
+        return ('chat', update.effective_chat.id)
+    return None
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Конкурентная обработка апдейтов с сохранением порядка внутри ключа.
+
+    Апдейты разных пользователей обрабатываются параллельно (не более
+    max_concurrent_updates одновременно), апдейты одного пользователя —
+    строго по очереди, в порядке поступления. Так флоу подачи заявки
+    и состояния админа не видят гонок.
+
+    Ожидание своей очереди не занимает слот обработки: иначе один
+    пользователь, нажавший кнопку двадцать раз, занял бы все слоты.
+    Одновременно ждут очереди или обрабатываются не более
+    max_pending_updates апдейтов; остальные задачи Application ждут
+    семафора базового класса. in_flight считает все апдейты с момента
+    создания задачи, поэтому update_backlog видит и их.
+
+    admission вызывается до ожидания очереди: если он вернул False,
+    апдейт отбрасывается, не занимая ни очередь пользователя, ни слот.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_updates: int,
+        max_pending_updates: int = 1000,
+        admission: Optional[Callable[[object], bool]] = None
+    ):
+        # Свойство max_concurrent_updates читается уже в базовом __init__
+        self._concurrency = max_concurrent_updates
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._workers = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.admission = admission
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._holders: Dict[Hashable, int] = {}
+        self.active = 0
+        self.waiting = 0
+        self.in_flight = 0
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._concurrency
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]):
+        self.in_flight += 1
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.in_flight -= 1
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        self.waiting += 1
+        try:
+            await self._workers.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            await coroutine
+        finally:
+            self.active -= 1
+            self._workers.release()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        if self.admission is not None and not self.admission(update):
+            coroutine.close()
+            return
+
+        key = update_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._holders[key] = self._holders.get(key, 0) + 1
+
+        try:
+            self.waiting += 1
+            try:
+                await lock.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                await self._run(coroutine)
+            finally:
+                lock.release()
+        finally:
+            # Замок больше никому не нужен — удаляем, чтобы словарь не рос
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key]
+                del self._locks[key]
+
+    @property
+    def keys_in_flight(self) -> int:
+        return len(self._locks)
+
+    def is_busy(self, key: Hashable) -> bool:
+        """Есть ли у ключа апдейты в работе или в ожидании"""
+        return key in self._locks
+
+
+def update_backlog(application: Application) -> int:
+    """Число апдейтов, принятых, но еще не взятых в обработку"""
+    backlog = application.update_queue.qsize()
+    processor = application.update_processor
+    if isinstance(processor, KeyedUpdateProcessor):
+        backlog += processor.in_flight - processor.active
+    return backlog
@@ -0,0 +1,95 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Псевдоним администратора фиксирован: при воспроизведении бот
+# запускается с ADMIN_ID=1 и узнает админа в записанных апдейтах
+ADMIN_PSEUDO_ID = 1
+
+# Объекты Telegram, в которых поле id — это пользователь или чат
+_IDENTITY_KEYS = ('from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat')
+# Кнопки, последний аргумент которых — ID пользователя (blacklist_page_<n>_<id>)
+_USER_ID_CALLBACKS = ('blacklist_pick_add_', 'blacklist_pick_remove_', 'blacklist_page_', 'blacklist_back_')
+
+
+class UpdateRecorder:
+    """Запись входящих Update в JSONL с псевдонимизацией пользователей"""
+
+    def __init__(self, path: str, admin_id: int, salt: Optional[str] = None):
+        self.path = path
+        self.admin_id = admin_id
+        # Без явной соли псевдонимы стабильны только в пределах одного запуска
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self.recorded = 0
+        logger.info(f"Запись апдейтов включена: {path}")
+
+    def pseudonymize_id(self, real_id: int) -> int:
+        """Стабильный псевдоним для ID пользователя или чата"""
+        if abs(real_id) == self.admin_id:
+            return ADMIN_PSEUDO_ID if real_id > 0 else -ADMIN_PSEUDO_ID
+        digest = hmac.new(self._salt, str(abs(real_id)).encode(), hashlib.sha256).digest()
+        pseudo_id = 10**9 + int.from_bytes(digest[:5], 'big')
+        return pseudo_id if real_id > 0 else -pseudo_id
+
+    def _pseudonymize_identity(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        pseudo_id = self.pseudonymize_id(obj['id']) if isinstance(obj.get('id'), int) else obj.get('id')
+        suffix = abs(pseudo_id) % 100000 if isinstance(pseudo_id, int) else 0
+        result = dict(obj, id=pseudo_id)
+        if result.get('first_name'):
+            result['first_name'] = f"Имя{suffix}"
+        if result.get('last_name'):
+            result['last_name'] = f"Фамилия{suffix}"
+        if result.get('username'):
+            result['username'] = f"user{suffix}"
+        if result.get('title'):
+            result['title'] = f"Чат{suffix}"
+        return result
+
+    def pseudonymize(self, data: Any, key: Optional[str] = None) -> Any:
+        """Рекурсивная замена ID и имен в словаре апдейта"""
+        if isinstance(data, dict):
+            if key in _IDENTITY_KEYS and 'id' in data:
+                data = self._pseudonymize_identity(data)
+            return {k: self.pseudonymize(v, k) for k, v in data.items()}
+        if isinstance(data, list):
+            return [self.pseudonymize(item, key) for item in data]
+        # Админ отправляет числовые ID в черный список — заменяем их тем же псевдонимом
+        if key == 'text' and isinstance(data, str) and data.strip().lstrip('-').isdigit():
+            return str(self.pseudonymize_id(int(data.strip())))
+        # ID в callback_data кнопок черного списка — тот же псевдоним, что и в from
+        if key == 'data' and isinstance(data, str) and data.startswith(_USER_ID_CALLBACKS):
+            head, _, tail = data.rpartition('_')
+            if tail.isascii() and tail.isdigit():
+                return f"{head}_{self.pseudonymize_id(int(tail))}"
+        return data
+
+    async def record(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик TypeHandler: пишет апдейт и не мешает дальнейшей обработке"""
+        try:
+            line = json.dumps(
+                {'ts': time.time(), 'update': self.pseudonymize(update.to_dict())},
+                ensure_ascii=False
+            )
+            with self._lock:
+                self._file.write(line + '\n')
+                self._file.flush()
+                self.recorded += 1
+        except Exception as e:
+            logger.error(f"Не удалось записать апдейт {update.update_id}: {e}")
+
+    def close(self):
+        """Закрыть файл записи"""
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,64 @@
+import logging
+import re
+from typing import List
+
+from telegram.ext import ContextTypes
+
+from config import USER_DIRECTORY_BACKFILL_BATCH
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Сколько найденных пользователей показывать
+MAX_RESULTS = 10
+# Во сколько раз больше кандидатов брать, если короткие слова уточняют выдачу
+CANDIDATES_FACTOR = 20
+
+_TERM = re.compile(r'[\w.]+')
+
+
+def _starts_any_word(user, term: str) -> bool:
+    words = ' '.join(filter(None, (user['username'], user['first_name'], user['last_name']))).lower()
+    return any(word.startswith(term) for word in _TERM.findall(words))
+
+
+def find_users(text: str, limit: int = MAX_RESULTS) -> List:
+    """
+    Пользователи по ID, @username или части имени/фамилии.
+
+    Число ищется только как ID. Слова от 3 символов ищутся подстрокой
+    по триграммному индексу, более короткие уточняют найденное (как
+    начало слова). Одно короткое слово ищется как начало username.
+    """
+    text = text.strip()
+    if text.isdigit():
+        user = db.get_user(int(text))
+        return [user] if user else []
+    terms = [term.lower() for term in _TERM.findall(text.lstrip('@'))]
+    long_terms = [term for term in terms if len(term) >= 3]
+    short_terms = [term for term in terms if len(term) < 3]
+
+    if not long_terms:
+        return db.search_users_by_username_prefix(terms[0], limit) if len(terms) == 1 else []
+    if not short_terms:
+        return db.search_users(long_terms, limit)
+
+    candidates = db.search_users(long_terms, limit * CANDIDATES_FACTOR)
+    return [user for user in candidates if all(_starts_any_word(user, term) for term in short_terms)][:limit]
+
+
+def describe_user(user) -> str:
+    """Строка о пользователе для списков (без HTML)"""
+    name = f"{user['first_name'] or ''} {user['last_name'] or ''}".strip() or 'без имени'
+    username = f"@{user['username']}" if user['username'] else 'без username'
+    return f"{name} ({username}) · {user['user_id']}"
+
+
+async def backfill_job(context: ContextTypes.DEFAULT_TYPE):
+    """Порциями добавляет в индекс пользователей тех, кто был в базе до его создания"""
+    added = db.backfill_user_directory(USER_DIRECTORY_BACKFILL_BATCH)
+    if not added:
+        context.job.schedule_removal()
+        logger.info("Индекс пользователей охватывает всю базу")
+        return
+    logger.info(f"В индекс пользователей добавлено {added} записей")
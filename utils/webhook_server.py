@@ -0,0 +1,135 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Optional
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+from telegram.ext import Application
+
+from .http_pools import pool_stats
+from .outbound_scheduler import outbound_scheduler
+from .render_cache import edit_cache
+from .update_processor import update_backlog
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Прием апдейтов от Telegram"""
+
+    def initialize(self, server: 'WebhookServer'):
+        self.server = server
+
+    async def post(self):
+        server = self.server
+
+        # Секрет сравнивается за постоянное время
+        token = self.request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not hmac.compare_digest(token.encode(), server.secret_token.encode()):
+            server.rejected += 1
+            logger.warning(f"Webhook: неверный секрет от {self.request.remote_ip}")
+            raise tornado.web.HTTPError(403)
+
+        try:
+            data = json.loads(self.request.body)
+            update = Update.de_json(data, server.application.bot)
+        except Exception as e:
+            logger.error(f"Webhook: некорректный апдейт: {e}")
+            raise tornado.web.HTTPError(400)
+
+        # Очередь ограничена: при переполнении Telegram повторит доставку позже.
+        # При конкурентной обработке очередь сразу разбирается в задачи,
+        # поэтому смотрим на весь необработанный хвост
+        if update_backlog(server.application) >= server.max_backlog:
+            server.overflowed += 1
+            logger.warning(f"Webhook: очередь апдейтов заполнена, апдейт {update.update_id} отклонен")
+            raise tornado.web.HTTPError(503)
+
+        try:
+            server.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            server.overflowed += 1
+            logger.warning(f"Webhook: очередь апдейтов заполнена, апдейт {update.update_id} отклонен")
+            raise tornado.web.HTTPError(503)
+
+        server.accepted += 1
+        self.set_status(200)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    """Проверка готовности для Docker healthcheck"""
+
+    def initialize(self, server: 'WebhookServer'):
+        self.server = server
+
+    def get(self):
+        status = self.server.status()
+        self.set_status(200 if status['ready'] else 503)
+        self.write(status)
+
+
+class WebhookServer:
+    """Встроенный HTTP-сервер для приема апдейтов в режиме webhook"""
+
+    def __init__(
+        self,
+        application: Application,
+        listen: str,
+        port: int,
+        path: str,
+        secret_token: str,
+        max_backlog: int
+    ):
+        self.application = application
+        self.max_backlog = max_backlog
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.webhook_set = False
+        self.accepted = 0
+        self.rejected = 0
+        self.overflowed = 0
+        self._http_server: Optional[HTTPServer] = None
+
+    def make_app(self) -> tornado.web.Application:
+        return tornado.web.Application([
+            (self.path, TelegramWebhookHandler, {'server': self}),
+            (r'/healthz', HealthHandler, {'server': self}),
+        ])
+
+    @property
+    def ready(self) -> bool:
+        return self._http_server is not None and self.webhook_set and self.application.running
+
+    def status(self) -> dict:
+        queue = self.application.update_queue
+        return {
+            'ready': self.ready,
+            'queue_size': queue.qsize(),
+            'backlog': update_backlog(self.application),
+            'backlog_limit': self.max_backlog,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'overflowed': self.overflowed,
+            'http_pools': pool_stats(self.application),
+            'outbound': outbound_scheduler.stats(),
+            'edit_cache': edit_cache.stats(),
+        }
+
+    async def start(self):
+        self._http_server = HTTPServer(self.make_app(), xheaders=True)
+        self._http_server.listen(self.port, address=self.listen)
+        logger.info(f"Webhook-сервер слушает {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._http_server is not None:
+            self._http_server.stop()
+            await self._http_server.close_all_connections()
+            self._http_server = None
+            logger.info("Webhook-сервер остановлен")